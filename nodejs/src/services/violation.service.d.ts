@@ -20,6 +20,8 @@ export interface Detect {
     height: number;
   };
   created_at: number;
+  predicted?: boolean;
+  track_epoch?: string | null;
   vehicle_count: {
     total_up: number;
     total_down: number;
@@ -144,11 +144,14 @@ export async function handleCarDetectedEvent(this: Socket, data: any) {
       data,
       camera
     );
-    const laneViolations = await violationService.laneEncroachment(
-      data.detections,
-      data.image_dimensions,
-      camera
-    );
+    // Predicted boxes (inference skipped on a static frame) are not evidence of a violation
+    const laneViolations = data.predicted
+      ? []
+      : await violationService.laneEncroachment(
+          data.detections,
+          data.image_dimensions,
+          camera
+        );
 
     const carDetectionResult = await carDetectionModel
       .create({
@@ -186,6 +189,8 @@ export async function handleCarDetectedEvent(this: Socket, data: any) {
         violations,
         buffer: imageBuffer.image,
         detections: data.detections,
+        // Track ids restart with a new epoch; the plate service keys its cache on both
+        track_epoch: data.track_epoch,
       });
     }
 
@@ -0,0 +1,225 @@
+"""Cross-camera batched inference scheduling.
+
+A single scheduler thread gathers the newest pending frame from every camera
+queue, runs them through the model as one batch and hands each result back to
+the owning camera's post-processing. A batch is dispatched as soon as it is
+full, every known camera has contributed a frame, or the oldest frame in it has
+waited for the configured latency budget.
+"""
+import math
+import queue
+import threading
+import time
+from collections import Counter, deque
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a sequence (0 for an empty sequence)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class BatchStats:
+    """Rolling batch-size and wait-time statistics for tuning the latency budget"""
+
+    def __init__(self, window=1000):
+        self.lock = threading.Lock()
+        self.batch_sizes = deque(maxlen=window)
+        self.wait_times = deque(maxlen=window)  # ms from first frame arriving to dispatch
+        self.inference_times = deque(maxlen=window)  # ms per batched forward pass
+        self.total_batches = 0
+        self.total_frames = 0
+        self.superseded_frames = 0  # older frames replaced by a newer one from the same camera
+
+    def record_batch(self, batch_size, wait_ms, inference_ms):
+        with self.lock:
+            self.batch_sizes.append(batch_size)
+            self.wait_times.append(wait_ms)
+            self.inference_times.append(inference_ms)
+            self.total_batches += 1
+            self.total_frames += batch_size
+
+    def record_superseded(self, count):
+        with self.lock:
+            self.superseded_frames += count
+
+    def snapshot(self):
+        """Return a plain dict summary of the current window"""
+        with self.lock:
+            sizes = list(self.batch_sizes)
+            waits = list(self.wait_times)
+            inferences = list(self.inference_times)
+            totals = (self.total_batches, self.total_frames, self.superseded_frames)
+
+        return {
+            'total_batches': totals[0],
+            'total_frames': totals[1],
+            'superseded_frames': totals[2],
+            'batch_size_mean': sum(sizes) / len(sizes) if sizes else 0.0,
+            'batch_size_histogram': dict(sorted(Counter(sizes).items())),
+            'wait_ms_p50': percentile(waits, 50),
+            'wait_ms_p95': percentile(waits, 95),
+            'wait_ms_max': max(waits) if waits else 0.0,
+            'inference_ms_mean': sum(inferences) / len(inferences) if inferences else 0.0,
+            'inference_ms_per_frame': sum(inferences) / sum(sizes) if sizes else 0.0,
+        }
+
+
+class BatchScheduler:
+    """Central scheduler running one batched forward pass over all cameras
+
+    Args:
+        camera_queues: Dict of camera_id -> queue.Queue or FrameMailbox holding frame tuples
+        infer_fn: Called as infer_fn(camera_ids, items) and must return one result per item
+        dispatch_fn: Called as dispatch_fn(camera_id, item, result, inference_ms) for every item
+        max_batch_size: Maximum number of frames (one per camera) per forward pass
+        max_wait_ms: Latency budget for filling a batch after its first frame arrives
+        stats_interval: Seconds between printed statistics summaries (0 disables)
+        discard_fn: Optional discard_fn(item) for every frame taken but never dispatched (superseded
+            within a batch, or lost to an inference error)
+    """
+
+    def __init__(self, camera_queues, infer_fn, dispatch_fn, max_batch_size=8, max_wait_ms=10,
+                 stats_interval=30.0, discard_fn=None):
+        self.camera_queues = camera_queues
+        self.infer_fn = infer_fn
+        self.dispatch_fn = dispatch_fn
+        self.discard_fn = discard_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms / 1000.0)
+        self.stats_interval = stats_interval
+        self.stats = BatchStats()
+        self.frame_ready = threading.Event()
+        self.running = False
+        self.thread = None
+        self._next_camera = 0  # round-robin start so no camera starves when cameras > batch size
+
+    def notify(self):
+        """Wake the scheduler after a frame was put on a camera queue"""
+        self.frame_ready.set()
+
+    def start(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=2):
+        self.running = False
+        self.frame_ready.set()
+        if self.thread is not None:
+            self.thread.join(timeout=timeout)
+
+    def _take_newest(self, camera_queue):
+        """Drain a camera queue and return its newest frame and the number of older frames skipped"""
+        newest = None
+        skipped = 0
+        while True:
+            try:
+                item = camera_queue.get(block=False)
+            except queue.Empty:
+                break
+            if item is None:
+                continue
+            if newest is not None:
+                skipped += 1
+                self._discard(newest)
+            newest = item
+        return newest, skipped
+
+    def _discard(self, item):
+        if self.discard_fn is not None:
+            self.discard_fn(item)
+
+    def _collect(self):
+        """Gather at most one (the newest) frame per camera within the latency budget"""
+        batch = {}
+        first_arrival = None
+
+        while self.running:
+            self.frame_ready.clear()
+
+            camera_ids = list(self.camera_queues.keys())
+            if camera_ids:
+                start = self._next_camera % len(camera_ids)
+                camera_ids = camera_ids[start:] + camera_ids[:start]
+
+            skipped = 0
+            for camera_id in camera_ids:
+                if camera_id not in batch and len(batch) >= self.max_batch_size:
+                    continue
+                mailbox = self.camera_queues.get(camera_id)
+                if mailbox is None:
+                    continue  # Camera reclaimed since the keys were listed
+                item, dropped = self._take_newest(mailbox)
+                skipped += dropped
+                if item is None:
+                    continue
+                if camera_id in batch:
+                    skipped += 1
+                    self._discard(batch[camera_id])
+                batch[camera_id] = item
+                if first_arrival is None:
+                    first_arrival = time.time()
+            if skipped:
+                self.stats.record_superseded(skipped)
+
+            if not batch:
+                self.frame_ready.wait()  # notify() or stop()
+                continue
+
+            remaining = self.max_wait - (time.time() - first_arrival)
+            if len(batch) >= self.max_batch_size or len(batch) >= len(self.camera_queues) or remaining <= 0:
+                break
+            self.frame_ready.wait(timeout=remaining)
+
+        self._next_camera += 1
+        return batch, first_arrival
+
+    def _run(self):
+        print(f"[BatchScheduler] Started (max batch size: {self.max_batch_size}, "
+              f"max wait: {self.max_wait * 1000:.1f}ms)")
+        last_report = time.time()
+
+        while self.running:
+            batch = {}
+            try:
+                batch, first_arrival = self._collect()
+                if not batch:
+                    continue
+
+                wait_ms = (time.time() - first_arrival) * 1000
+                camera_ids = list(batch.keys())
+                items = [batch[camera_id] for camera_id in camera_ids]
+
+                start_time = time.time()
+                results = self.infer_fn(camera_ids, items)
+                inference_ms = (time.time() - start_time) * 1000
+                self.stats.record_batch(len(items), wait_ms, inference_ms)
+
+                for camera_id, item, result in zip(camera_ids, items, results):
+                    del batch[camera_id]
+                    self.dispatch_fn(camera_id, item, result, inference_ms)
+
+                if self.stats_interval and time.time() - last_report >= self.stats_interval:
+                    last_report = time.time()
+                    self.print_stats()
+            except Exception as e:
+                print(f"[BatchScheduler] Error in scheduler thread: {e}")
+                for item in batch.values():
+                    self._discard(item)  # Frames this batch never handed on
+                time.sleep(0.1)  # Prevent tight loop if there's an error
+
+        print("[BatchScheduler] Stopped")
+
+    def print_stats(self):
+        s = self.stats.snapshot()
+        print(f"[BatchScheduler] batches: {s['total_batches']}, frames: {s['total_frames']}, "
+              f"superseded: {s['superseded_frames']}, mean batch: {s['batch_size_mean']:.2f}, "
+              f"sizes: {s['batch_size_histogram']}, wait p50/p95/max: "
+              f"{s['wait_ms_p50']:.1f}/{s['wait_ms_p95']:.1f}/{s['wait_ms_max']:.1f}ms, "
+              f"inference: {s['inference_ms_mean']:.1f}ms/batch ({s['inference_ms_per_frame']:.1f}ms/frame)")
@@ -0,0 +1,107 @@
+"""Micro-benchmark of the old and new 'image' event decode paths.
+
+Old path: PIL.Image.open -> np.array -> cv2.cvtColor(RGB2BGR) -> frame.copy()
+New path: frame_decode.decode_frame (cv2.imdecode, DCT-reduced for large JPEGs)
+
+Reports milliseconds and bytes allocated per frame. Allocation is measured with
+tracemalloc, which sees NumPy/OpenCV output arrays but not PIL's internal
+decode buffer, so the old path's figure is a lower bound.
+
+Usage:
+    python bench_decode.py [--image path.jpg] [--width 1920 --height 1080] [--frames 200]
+"""
+import argparse
+import io
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from frame_decode import FramePool, decode_frame
+
+
+def old_decode(image_bytes):
+    image = Image.open(io.BytesIO(image_bytes))
+    frame = np.array(image)
+    frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+    return frame.copy()
+
+
+def make_jpeg(path, width, height, quality):
+    """Encode a test JPEG at the requested size from a file or a synthetic pattern"""
+    if path:
+        frame = cv2.imread(path)
+        if frame is None:
+            raise SystemExit(f"Could not read {path}")
+    else:
+        y, x = np.mgrid[0:height, 0:width]
+        frame = np.dstack([(x * 255 // width), (y * 255 // height), ((x + y) % 256)]).astype(np.uint8)
+        noise = np.random.default_rng(0).integers(0, 32, frame.shape, dtype=np.uint8)
+        frame = cv2.add(frame, noise)
+    frame = cv2.resize(frame, (width, height))
+    ok, encoded = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return encoded.tobytes()
+
+
+def measure(decode, image_bytes, frames):
+    """Return (ms per frame, bytes allocated per frame, output shape)"""
+    for _ in range(5):  # Warm up
+        decode(image_bytes)
+
+    start = time.perf_counter()
+    for _ in range(frames):
+        frame = decode(image_bytes)
+    ms = (time.perf_counter() - start) * 1000 / frames
+
+    allocated = 0
+    runs = min(frames, 20)
+    tracemalloc.start()
+    for _ in range(runs):
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        frame = decode(image_bytes)
+        allocated += tracemalloc.get_traced_memory()[1] - baseline
+        del frame
+    tracemalloc.stop()
+    return ms, allocated / runs, decode(image_bytes).shape
+
+
+def pooled_decode(pool, image_bytes, **kwargs):
+    """Decode into a pool buffer and release it right away, as a processed frame would be"""
+    frame = decode_frame(image_bytes, pool=pool, **kwargs)
+    pool.release(frame)
+    return frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--image', help='Source image (defaults to a synthetic pattern)')
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--quality', type=int, default=85)
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--target-size', type=int, default=640, help='Model input size')
+    parser.add_argument('--max-dimension', type=int, default=1280, help='Frame size cap (traffic-light.py)')
+    args = parser.parse_args()
+
+    image_bytes = make_jpeg(args.image, args.width, args.height, args.quality)
+    pool = FramePool()
+    paths = {
+        'old (PIL + cvtColor + copy)': old_decode,
+        'new full (imdecode)': lambda b: decode_frame(b),
+        f'new reduced (target {args.target_size})': lambda b: decode_frame(b, target_size=args.target_size),
+        f'new reduced + pool (max {args.max_dimension})': lambda b: pooled_decode(
+            pool, b, target_size=args.target_size, max_dimension=args.max_dimension),
+    }
+
+    print(f"JPEG {args.width}x{args.height}, {len(image_bytes) / 1024:.1f} KiB, {args.frames} frames")
+    print(f"{'path':<40} {'ms/frame':>10} {'KiB alloc/frame':>16}  output")
+    for name, decode in paths.items():
+        ms, allocated, shape = measure(decode, image_bytes, args.frames)
+        print(f"{name:<40} {ms:>10.2f} {allocated / 1024:>16.1f}  {shape[1]}x{shape[0]}")
+
+
+if __name__ == '__main__':
+    main()
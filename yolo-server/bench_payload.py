@@ -0,0 +1,124 @@
+"""Benchmark of full JSON vs incremental binary 'car_detected' payloads.
+
+Simulates one camera with a steady set of moving vehicles, keeps their trails
+in a TrackHistory exactly like server.py, and encodes every frame with
+payload_codec.build_full_payload (serialized as JSON, as Socket.IO does) and
+with DeltaEncoder (msgpack when installed, and the packed-array dict).
+
+Reports bytes on the wire and encode time per frame for each mode.
+
+Usage:
+    python bench_payload.py [--frames 600] [--vehicles 20] [--keyframe-interval 30]
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+import payload_codec
+from payload_codec import DeltaEncoder, build_full_payload, flatten_counts
+from track_history import TrackHistory
+
+CLASS_NAMES = ['person', 'bicycle', 'car', 'motorcycle', 'airplane', 'bus', 'train', 'truck']
+VEHICLE_CLASSES = ['car', 'truck', 'bus', 'motorcycle', 'bicycle']
+
+
+def simulate(frames, vehicles, width=1280, height=720, fps=30, seed=0):
+    """Yield per-frame detection arrays for vehicles moving across the frame"""
+    rng = np.random.default_rng(seed)
+    vehicle_ids = [CLASS_NAMES.index(name) for name in VEHICLE_CLASSES]
+    start = rng.uniform([0, 0], [width, height], size=(vehicles, 2))
+    velocity = rng.uniform(-6, 6, size=(vehicles, 2))
+    classes = rng.choice(vehicle_ids, size=vehicles)
+    track_ids = np.arange(1, vehicles + 1)
+    created_at = 1_760_000_000_000
+
+    for frame in range(frames):
+        centers = (start + velocity * frame) % [width, height]
+        boxes = np.hstack([centers - 40, centers + 40]).clip(0, [width, height, width, height])
+        yield created_at + frame * 1000 // fps, boxes.astype(np.int64), rng.uniform(0.5, 0.95, vehicles), \
+            classes, track_ids
+
+
+def serialized_size(payload):
+    """Bytes on the wire: JSON for dicts, with bytes fields counted as binary attachments"""
+    if isinstance(payload, bytes):
+        return len(payload)
+    attachments = sum(len(v) for v in payload.values() if isinstance(v, bytes))
+    header = {k: (None if isinstance(v, bytes) else v) for k, v in payload.items()}
+    return len(json.dumps(header)) + attachments
+
+
+def run(mode, args):
+    width, height = 1280, 720
+    history = TrackHistory(max_tracks=128, max_points=30, max_age=5000)
+    encoder = None
+    if mode != 'json':
+        encoder = DeltaEncoder(CLASS_NAMES, args.keyframe_interval, use_msgpack=(mode == 'delta-msgpack'))
+
+    counts_up = {name: 0 for name in VEHICLE_CLASSES}
+    counts_down = {name: 0 for name in VEHICLE_CLASSES}
+    total_bytes = 0
+    total_time = 0.0
+
+    for created_at, boxes, confidences, class_ids, track_ids in simulate(args.frames, args.vehicles):
+        centers = (boxes[:, :2] + boxes[:, 2:]) // 2
+        for track_id, (x, y), class_id in zip(track_ids.tolist(), centers.tolist(), class_ids.tolist()):
+            history.append(track_id, x, y, created_at, class_id)
+        history.expire(created_at)
+        recent = history.recent(20, now=created_at)
+        rel_boxes = boxes / np.array([width, height, width, height], dtype=np.float64)
+        current = {name: 0 for name in VEHICLE_CLASSES}
+        for class_id in class_ids.tolist():
+            current[CLASS_NAMES[class_id]] += 1
+
+        start = time.perf_counter()
+        if encoder is None:
+            rel_sizes = rel_boxes[:, 2:] - rel_boxes[:, :2]
+            detections = [
+                {'class': CLASS_NAMES[c], 'confidence': conf, 'id': tid,
+                 'bbox': {'x1': b[0], 'y1': b[1], 'x2': b[2], 'y2': b[3], 'width': s[0], 'height': s[1]}}
+                for c, conf, tid, b, s in zip(class_ids.tolist(), confidences.tolist(), track_ids.tolist(),
+                                              rel_boxes.tolist(), rel_sizes.tolist())
+            ]
+            payload = build_full_payload(
+                'camera', 'image', 50, detections, 12.5, width, height, created_at, 0, 0,
+                counts_up, counts_down, current, recent, [], CLASS_NAMES)
+            wire = json.dumps(payload)
+            size = len(wire)
+        else:
+            payload = encoder.encode(
+                'camera', 'image', created_at, 50, 12.5, width, height, rel_boxes, confidences,
+                class_ids, track_ids, recent, flatten_counts(0, 0, counts_up, counts_down), current, [])
+            if isinstance(payload, dict):
+                json.dumps({k: v for k, v in payload.items() if not isinstance(v, bytes)})
+            size = serialized_size(payload)
+        total_time += time.perf_counter() - start
+        total_bytes += size
+
+    return total_bytes / args.frames, total_time * 1000 / args.frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--frames', type=int, default=600)
+    parser.add_argument('--vehicles', type=int, default=20)
+    parser.add_argument('--keyframe-interval', type=int, default=30)
+    args = parser.parse_args()
+
+    modes = ['json', 'delta-packed']
+    if payload_codec.msgpack is not None:
+        modes.append('delta-msgpack')
+    else:
+        print("msgpack not installed, skipping delta-msgpack")
+
+    print(f"{args.frames} frames, {args.vehicles} vehicles, keyframe every {args.keyframe_interval} updates")
+    print(f"{'mode':<16} {'bytes/frame':>12} {'encode ms/frame':>16}")
+    for mode in modes:
+        size, ms = run(mode, args)
+        print(f"{mode:<16} {size:>12.0f} {ms:>16.3f}")
+
+
+if __name__ == '__main__':
+    main()
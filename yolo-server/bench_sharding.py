@@ -0,0 +1,126 @@
+"""Aggregate frames per second of camera-sharded worker processes on one host.
+
+For each worker count, the given number of synthetic cameras is split over the
+workers by the same consistent-hash ring server.py uses. Each worker is set up
+like a ShardSupervisor worker: its own torch/OpenMP thread count (CPUs // workers
+unless --threads is given) and optionally its own CPU set. Every worker then
+runs its cameras' frames round-robin through the model, followed by the NumPy
+post-processing of server.py's select_vehicles, for --seconds.
+
+--workload python replaces the model with a pure-Python loop holding the GIL,
+which shows the single-process ceiling without torch installed.
+
+Usage:
+    python bench_sharding.py [--workers 1,2,4] [--cameras 8] [--seconds 20] [--model yolo11n.pt] [--pin]
+"""
+import argparse
+import multiprocessing as mp
+import os
+import time
+
+import numpy as np
+
+from sharding import START_METHOD, HashRing, configure_worker, cpu_sets
+
+
+def make_frames(count, height, width):
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 255, (height, width, 3), dtype=np.uint8) for _ in range(count)]
+
+
+def post_process(detections, confidence=0.5):
+    """The vectorized filtering and box conversion of select_vehicles"""
+    detections = detections[detections[:, 4] >= confidence]
+    boxes = detections[:, :4].astype(np.int32)
+    centers = (boxes[:, :2] + boxes[:, 2:]) / 2
+    return boxes, centers
+
+
+def bench_worker(index, threads, cpus, cameras, args, ready, start, results):
+    configure_worker(index, threads, cpus)
+    frames = make_frames(max(1, len(cameras)), args.height, args.width)
+
+    if args.workload == 'model':
+        from ultralytics import YOLO
+        model = YOLO(args.model)
+
+        def infer(frame):
+            result = model(frame, imgsz=args.imgsz, verbose=False)[0]
+            return result.boxes.data.cpu().numpy()
+    else:
+        def infer(frame):
+            total = 0
+            for i in range(args.python_iterations):
+                total += i * i
+            return np.array([[10, 10, 50, 50, 0.9, 2]], dtype=np.float32)
+
+    for frame in frames[:2]:  # Warm up
+        post_process(infer(frame))
+    ready.wait()
+    start.wait()
+
+    processed = 0
+    deadline = time.perf_counter() + args.seconds
+    while cameras and time.perf_counter() < deadline:
+        for frame in frames:
+            post_process(infer(frame))
+            processed += 1
+    results.put((index, len(cameras), processed))
+
+
+def run(worker_count, args):
+    context = mp.get_context(START_METHOD)
+    camera_ids = [f'camera-{i}' for i in range(args.cameras)]
+    ring = HashRing(range(worker_count))
+    owned = {index: [c for c in camera_ids if ring.owner(c) == index] for index in range(worker_count)}
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else (os.cpu_count() or 1)
+    threads = args.threads or max(1, cpus // worker_count)
+    sets = cpu_sets(worker_count) if args.pin else [None] * worker_count
+
+    ready = context.Barrier(worker_count + 1)
+    start = context.Barrier(worker_count + 1)
+    results = context.Queue()
+    processes = [
+        context.Process(target=bench_worker,
+                        args=(i, threads, sets[i], owned[i], args, ready, start, results))
+        for i in range(worker_count)
+    ]
+    for p in processes:
+        p.start()
+    ready.wait()  # Every model loaded and warmed up
+    start.wait()
+    per_worker = sorted(results.get() for _ in processes)
+    for p in processes:
+        p.join()
+    total = sum(processed for _, _, processed in per_worker)
+    return total / args.seconds, threads, per_worker
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--workers', default='1,2,4', help='Comma-separated worker counts')
+    parser.add_argument('--cameras', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=20.0)
+    parser.add_argument('--workload', choices=('model', 'python'), default='model')
+    parser.add_argument('--model', default='yolo11n.pt')
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--width', type=int, default=960)
+    parser.add_argument('--height', type=int, default=540)
+    parser.add_argument('--threads', type=int, help='torch threads per worker (default: CPUs // workers)')
+    parser.add_argument('--pin', action='store_true', help='Pin each worker to its own CPUs')
+    parser.add_argument('--python-iterations', type=int, default=200000, help='Loop size of --workload python')
+    args = parser.parse_args()
+
+    print(f"{args.cameras} cameras, {args.width}x{args.height} frames, workload: {args.workload}, "
+          f"{os.cpu_count()} CPUs{', pinned' if args.pin else ''}")
+    print(f"{'workers':>8} {'threads':>8} {'fps':>10} {'speedup':>8}  cameras/frames per worker")
+    baseline = None
+    for worker_count in [int(n) for n in args.workers.split(',')]:
+        fps, threads, per_worker = run(worker_count, args)
+        baseline = baseline or fps
+        shares = ', '.join(f'{cameras}/{processed}' for _, cameras, processed in per_worker)
+        print(f"{worker_count:>8} {threads:>8} {fps:>10.1f} {fps / baseline:>7.2f}x  {shares}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,309 @@
+"""Frame decoding in worker processes with a shared-memory frame ring.
+
+The Socket.IO callback only hands the raw event buffer to a bounded input
+queue. Worker processes decode it with frame_decode.decode_frame into a free
+slot of one multiprocessing.shared_memory block and send back only
+(camera_id, image_id, slot, shape, meta). The slots are the frame pool of this
+path: a frame capped by max_dimension is resized straight into its slot, and
+one decoded at its final size is copied in once (cv2.imdecode cannot write
+into a caller's buffer). Decoding therefore scales with cores and never holds
+the inference process's GIL; the frame itself never crosses a pipe.
+
+The inference side gets a NumPy view of the slot, not a copy. The slot stays
+lent to that frame until release(frame) is called: after post-processing, or
+when the frame is superseded, expired or dropped on the way. A worker that
+finds no free slot drops the frame instead of blocking, so the slot count must
+cover the frames in flight. Frames larger than a slot are pickled through the
+output queue instead. They are counted as 'oversized', and each worker logs
+the first one.
+"""
+import contextlib
+import multiprocessing as mp
+import queue
+import sys
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from frame_decode import decode_frame
+
+# Forking a process that has imported torch (or may later) is unsafe. The workers are started with
+# the service script hidden (main_script_hidden), so they import only this module and frame_decode.
+DEFAULT_START_METHOD = 'spawn'
+
+
+@contextlib.contextmanager
+def main_script_hidden():
+    """Start processes without re-running __main__ in them
+
+    spawn (and forkserver) children import the parent's main script, by path or module name, before
+    running their target. For the service scripts that is torch, the model runtime and the metrics
+    registry, none of which decode_worker needs.
+    """
+    main = sys.modules.get('__main__')
+    if main is None:
+        yield
+        return
+    saved_file = main.__dict__.pop('__file__', None)
+    saved_spec = getattr(main, '__spec__', None)
+    main.__spec__ = None
+    try:
+        yield
+    finally:
+        main.__spec__ = saved_spec
+        if saved_file is not None:
+            main.__file__ = saved_file
+
+
+class SlotLender:
+    """FramePool-like acquire() over the free slots, so decode_frame resizes straight into a slot"""
+
+    def __init__(self, shm, free_slots, slot_bytes):
+        self.shm = shm
+        self.free_slots = free_slots
+        self.slot_bytes = slot_bytes
+        self.slot = None  # Slot lent for the current frame
+        self.starved = False  # No slot was free for the current frame
+
+    def acquire(self, shape, dtype=np.uint8):
+        if int(np.prod(shape)) * np.dtype(dtype).itemsize > self.slot_bytes:
+            return None
+        try:
+            self.slot = self.free_slots.get(timeout=0.5)
+        except queue.Empty:
+            self.starved = True
+            return None
+        return np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=self.slot * self.slot_bytes)
+
+
+def decode_worker(worker_id, input_queue, output_queue, free_slots, shm_name, slot_bytes, target_size,
+                  max_dimension, counters):
+    """Worker process loop: decode event buffers into shared-memory slots"""
+    import cv2
+    cv2.setNumThreads(1)  # One decode per core, no nested threading
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    lender = SlotLender(shm, free_slots, slot_bytes)
+    oversized_logged = False
+    try:
+        while True:
+            task = input_queue.get()
+            if task is None:
+                break
+            camera_id, image_id, image, meta = task
+
+            lender.slot = None
+            lender.starved = False
+            try:
+                start_time = time.perf_counter()
+                frame = decode_frame(image, target_size=target_size, max_dimension=max_dimension, pool=lender)
+                decode_ms = (time.perf_counter() - start_time) * 1000
+            except Exception as e:
+                if lender.slot is not None:
+                    free_slots.put(lender.slot)
+                with counters.get_lock():
+                    counters[2] += 1
+                print(f"[DecodeWorker {worker_id}] Error decoding image: {e}")
+                continue
+
+            if lender.slot is not None:
+                # Resized straight into the slot
+                shape = frame.shape
+                del frame
+                output_queue.put((camera_id, image_id, lender.slot, shape, meta, None, decode_ms))
+                continue
+            if lender.starved:
+                with counters.get_lock():
+                    counters[1] += 1
+                continue
+
+            if frame.nbytes > slot_bytes:
+                # Larger than a slot: fall back to pickling the array through the queue
+                with counters.get_lock():
+                    counters[3] += 1
+                if not oversized_logged:
+                    oversized_logged = True
+                    print(f"[DecodeWorker {worker_id}] {frame.shape[1]}x{frame.shape[0]} frame is larger than a "
+                          f"{slot_bytes}-byte slot, sending it through the queue (counted as oversized)")
+                output_queue.put((camera_id, image_id, -1, frame.shape, meta, frame, decode_ms))
+                continue
+
+            try:
+                slot = free_slots.get(timeout=0.5)
+            except queue.Empty:
+                with counters.get_lock():
+                    counters[1] += 1
+                continue
+
+            # imdecode cannot write into a caller's buffer: a frame decoded at its final size is copied once
+            view = np.ndarray(frame.shape, dtype=np.uint8, buffer=shm.buf, offset=slot * slot_bytes)
+            view[...] = frame
+            del view
+            output_queue.put((camera_id, image_id, slot, frame.shape, meta, None, decode_ms))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        shm.close()
+
+
+class DecodePool:
+    """Pool of decode worker processes sharing one frame ring
+
+    Args:
+        workers: Number of decode processes
+        slots: Number of frame slots in the shared-memory ring
+        slot_bytes: Capacity of one slot (frames larger than this are pickled through the queue)
+        target_size: Passed to decode_frame for DCT-reduced decoding
+        max_dimension: Passed to decode_frame to cap the frame size
+        input_size: Maximum number of encoded buffers waiting for a worker
+        start_method: multiprocessing start method
+        on_decode: Optional on_decode(camera_id, decode_ms) called for every frame taken with get()
+        input_queue: Existing queue of (camera_id, image_id, buffer, meta) to decode from instead of
+            one fed by submit() (a shard worker's inbox, filled by the supervisor)
+    """
+
+    def __init__(self, workers=2, slots=32, slot_bytes=1920 * 1080 * 3, target_size=None, max_dimension=None,
+                 input_size=None, start_method=DEFAULT_START_METHOD, on_decode=None, input_queue=None):
+        self.on_decode = on_decode
+        self.workers = workers
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.target_size = target_size
+        self.max_dimension = max_dimension
+        self.context = mp.get_context(start_method)
+        self.input_queue = input_queue or self.context.Queue(maxsize=input_size or workers * 4)
+        self.output_queue = self.context.Queue()
+        self.free_slots = self.context.Queue()
+        # decoded, dropped (no free slot), errors, oversized (pickled instead of shared)
+        self.counters = self.context.Array('q', 4)
+        self.dropped_input = 0
+        self.shm = None
+        self.processes = []
+        self.lock = threading.Lock()
+        self.lent = {}  # id(frame view) -> (slot, view)
+
+    def start(self):
+        self.shm = shared_memory.SharedMemory(create=True, size=self.slots * self.slot_bytes)
+        for slot in range(self.slots):
+            self.free_slots.put(slot)
+        with main_script_hidden():
+            for worker_id in range(self.workers):
+                p = self.context.Process(
+                    target=decode_worker,
+                    args=(worker_id, self.input_queue, self.output_queue, self.free_slots, self.shm.name,
+                          self.slot_bytes, self.target_size, self.max_dimension, self.counters),
+                    daemon=True
+                )
+                p.start()
+                self.processes.append(p)
+        print(f"[DecodePool] Started {self.workers} decode workers with {self.slots} shared frame slots "
+              f"({self.slots * self.slot_bytes / (1024 * 1024):.1f} MiB)")
+
+    def stop(self, timeout=2):
+        self.output_queue.put(None)  # Wakes a consumer blocked in get()
+        for _ in self.processes:
+            try:
+                self.input_queue.put(None, timeout=0.1)
+            except queue.Full:
+                pass
+        for p in self.processes:
+            p.join(timeout=timeout)
+            if p.is_alive():
+                p.terminate()
+        self.processes = []
+        if self.shm is not None:
+            with self.lock:
+                self.lent.clear()
+            try:
+                self.shm.close()
+            except BufferError:
+                pass  # Frames still in flight hold views; the mapping goes with the process
+            self.shm.unlink()
+            self.shm = None
+
+    def submit(self, camera_id, image_id, image, meta=None):
+        """Queue an encoded event buffer for decoding; returns False if it was dropped"""
+        try:
+            self.input_queue.put_nowait((camera_id, image_id, image, meta))
+            return True
+        except queue.Full:
+            self.dropped_input += 1
+            return False
+
+    def get(self, timeout=0.1):
+        """Wait for the next decoded frame (timeout=None waits until a frame arrives or stop())
+
+        The frame is a view of its shared slot. The slot is lent to the frame
+        until release(frame); the caller must release every frame it got,
+        whether it was processed or dropped.
+
+        Returns:
+            (camera_id, image_id, frame, meta), or None on timeout or stop
+        """
+        try:
+            decoded = self.output_queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        if decoded is None:
+            return None
+        camera_id, image_id, slot, shape, meta, frame, decode_ms = decoded
+        if slot >= 0:
+            frame = np.ndarray(shape, dtype=np.uint8, buffer=self.shm.buf, offset=slot * self.slot_bytes)
+            with self.lock:
+                self.lent[id(frame)] = (slot, frame)
+        with self.counters.get_lock():
+            self.counters[0] += 1
+        if self.on_decode is not None:
+            self.on_decode(camera_id, decode_ms)
+        return camera_id, image_id, frame, meta
+
+    def release(self, frame):
+        """Return the slot of a frame from get() to the workers; other frames are ignored"""
+        with self.lock:
+            lent = self.lent.pop(id(frame), None)
+        if lent is None:
+            return False
+        self.free_slots.put(lent[0])
+        return True
+
+    def stats(self):
+        with self.counters.get_lock():
+            decoded, dropped_no_slot, errors, oversized = self.counters[:]
+        with self.lock:
+            lent = len(self.lent)
+        return {
+            'decoded': decoded,
+            'dropped_input': self.dropped_input,
+            'dropped_no_slot': dropped_no_slot,
+            'errors': errors,
+            'oversized': oversized,
+            'slots_lent': lent,
+            'alive_workers': sum(1 for p in self.processes if p.is_alive()),
+        }
+
+
+def forward_decoded_frames(pool, handle_frame, is_running):
+    """Thread loop passing decoded frames to handle_frame(camera_id, image_id, frame, meta)
+
+    handle_frame takes over the frame and releases it with pool.release once done.
+    """
+    while is_running():
+        decoded = None
+        try:
+            decoded = pool.get(timeout=None)
+            if decoded is None:
+                continue
+            handle_frame(*decoded)
+        except Exception as e:
+            print(f"[DecodePool] Error forwarding decoded frame: {e}")
+            if decoded is not None:
+                pool.release(decoded[2])
+            time.sleep(0.1)  # Prevent tight loop if there's an error
+
+
+def start_forwarder(pool, handle_frame, is_running):
+    t = threading.Thread(target=forward_decoded_frames, args=(pool, handle_frame, is_running), daemon=True)
+    t.start()
+    return t
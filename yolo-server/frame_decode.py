@@ -0,0 +1,168 @@
+"""Shared frame decoding for the Socket.IO image handlers.
+
+Frames are decoded straight to BGR with cv2.imdecode from a zero-copy view of
+the received bytes. When a JPEG is much larger than the model input, it is
+decoded at 1/2, 1/4 or 1/8 scale in the DCT domain (IMREAD_REDUCED_COLOR_*),
+which is both faster and smaller than a full decode followed by a resize. When
+a size cap still requires resizing, the result is written into a FramePool
+buffer instead of a fresh allocation. The buffer is lent to the frame until
+the frame is released (processed, superseded or dropped), so it is never
+reused while the frame is still queued or being inferred. OpenCV's Python
+imdecode cannot write into a caller buffer, so frames that need no resize are
+still allocated by the decoder. The decode worker processes (decode_pool.py)
+pass their shared-memory slots as the pool, so on that default path capped
+frames are resized straight into the slot the inference process reads.
+"""
+import base64
+import threading
+
+import cv2
+import numpy as np
+
+REDUCED_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+# JPEG start-of-frame markers carrying the image dimensions (excluding DHT/JPG/DAC)
+SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+class FramePool:
+    """Preallocated frame buffers, keyed by shape, lent out until released
+
+    acquire() hands out a buffer no frame holds; release() returns it once the
+    frame in it is done with. When every buffer of a shape is lent out, a new
+    one is allocated, up to max_buffers per shape; beyond that acquire()
+    returns None and the caller allocates.
+
+    Args:
+        max_buffers: Buffers kept per shape (at least the frames in flight at once)
+    """
+
+    def __init__(self, max_buffers=32):
+        self.max_buffers = max_buffers
+        self.lock = threading.Lock()
+        self.free = {}  # (shape, dtype) -> buffers not lent out
+        self.allocated = {}  # (shape, dtype) -> buffers created
+        self.lent = {}  # id(buffer) -> buffer
+        self.exhausted = 0
+
+    def acquire(self, shape, dtype=np.uint8):
+        """Lend a buffer of the given shape, or None when max_buffers are all lent out"""
+        key = (tuple(shape), np.dtype(dtype).str)
+        with self.lock:
+            free = self.free.setdefault(key, [])
+            if free:
+                buffer = free.pop()
+            elif self.allocated.get(key, 0) < self.max_buffers:
+                buffer = np.empty(shape, dtype=dtype)
+                self.allocated[key] = self.allocated.get(key, 0) + 1
+            else:
+                self.exhausted += 1
+                return None
+            self.lent[id(buffer)] = buffer
+            return buffer
+
+    def release(self, frame):
+        """Return a lent buffer to the pool; frames the pool did not lend are ignored"""
+        with self.lock:
+            buffer = self.lent.pop(id(frame), None)
+            if buffer is None:
+                return False
+            self.free[(buffer.shape, buffer.dtype.str)].append(buffer)
+            return True
+
+    def stats(self):
+        with self.lock:
+            return {
+                'allocated': sum(self.allocated.values()),
+                'lent': len(self.lent),
+                'exhausted': self.exhausted,
+            }
+
+
+def to_bytes(image):
+    """Normalize an 'image' event buffer (raw bytes, base64 string or {'image': ...}) to bytes"""
+    if isinstance(image, dict) and 'image' in image:
+        image = image['image']
+    if isinstance(image, str):
+        return base64.b64decode(image)
+    return image
+
+
+def jpeg_dimensions(data):
+    """Read (width, height) from a JPEG header without decoding, or None if not a JPEG"""
+    length = len(data)
+    if length < 4 or data[0] != 0xFF or data[1] != 0xD8:
+        return None
+    pos = 2
+    while pos + 4 <= length:
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:  # Fill byte
+            pos += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:  # Markers without a length
+            pos += 2
+            continue
+        segment_length = (data[pos + 2] << 8) | data[pos + 3]
+        if marker in SOF_MARKERS:
+            if pos + 9 > length:
+                return None
+            height = (data[pos + 5] << 8) | data[pos + 6]
+            width = (data[pos + 7] << 8) | data[pos + 8]
+            return width, height
+        pos += 2 + segment_length
+    return None
+
+
+def reduction_factor(width, height, target_size):
+    """Largest DCT reduction (1, 2, 4 or 8) that keeps the long side at or above target_size"""
+    if not target_size:
+        return 1
+    long_side = max(width, height)
+    for factor in (8, 4, 2):
+        if long_side // factor >= target_size:
+            return factor
+    return 1
+
+
+def decode_frame(image, target_size=None, max_dimension=None, pool=None):
+    """Decode an image buffer to a BGR frame
+
+    Args:
+        image: Event buffer (raw bytes, base64 string or {'image': ...})
+        target_size: Model input size; JPEGs at least twice as large are decoded at reduced scale
+        max_dimension: Optional cap on the long side of the returned frame
+        pool: Optional FramePool (or anything with acquire(shape) -> buffer or None) lending the
+            output buffer when a resize is needed
+
+    Returns:
+        BGR uint8 frame owned by the caller, or lent by the pool until pool.release(frame)
+    """
+    data = to_bytes(image)
+    buffer = np.frombuffer(data, dtype=np.uint8)
+
+    flag = cv2.IMREAD_COLOR
+    if target_size:
+        dimensions = jpeg_dimensions(data)
+        if dimensions is not None:
+            flag = REDUCED_FLAGS[reduction_factor(dimensions[0], dimensions[1], target_size)]
+
+    frame = cv2.imdecode(buffer, flag)
+    if frame is None:
+        raise ValueError("Could not decode image buffer")
+
+    if max_dimension:
+        height, width = frame.shape[:2]
+        if width > max_dimension or height > max_dimension:
+            scale = max_dimension / max(width, height)
+            size = (int(width * scale), int(height * scale))
+            dst = pool.acquire((size[1], size[0], 3)) if pool is not None else None
+            frame = cv2.resize(frame, size, dst=dst)
+
+    return frame
@@ -0,0 +1,222 @@
+"""Latest-frame-wins mailboxes for per-camera frame handoff.
+
+A FrameMailbox holds at most one frame. A new frame always replaces an unread
+one, and a frame that is older than max_age_ms when it is taken is dropped
+instead of processed, so consumers never work through a backlog of stale
+frames. FrameMailbox mirrors the put/get/queue.Empty interface of queue.Queue,
+so it can replace a per-camera queue directly; MailboxGroup puts several
+cameras behind one consumer. Frames a mailbox drops (superseded or expired)
+are passed to on_discard, so a frame held in a pooled buffer is released.
+
+Frame age comes from the created_at (ms since epoch) carried in each event.
+The Node server and this host may disagree on the time, so the smallest
+delivery delay seen over the last delay_window frames is taken as the clock
+offset and subtracted: age is how much later than the best recent case a
+frame is being processed.
+"""
+import queue
+import threading
+import time
+from collections import deque
+
+
+def now_ms():
+    return time.time() * 1000
+
+
+class FrameMailbox:
+    """Conflating single-slot mailbox for one camera
+
+    Args:
+        max_age_ms: Frames older than this when taken are dropped (None disables)
+        timestamp: Function returning an item's created_at in ms; without it age is time since put
+        delay_window: Number of recent frames used to estimate the clock offset
+        on_deliver: Optional on_deliver(wait_ms, age_ms) called for every frame handed out, where
+            wait_ms is the time it spent in this mailbox
+        on_discard: Optional on_discard(item) called for every frame dropped instead of handed out
+    """
+
+    def __init__(self, max_age_ms=None, timestamp=None, delay_window=1000, on_deliver=None, on_discard=None):
+        self.max_age_ms = max_age_ms
+        self.timestamp = timestamp
+        self.on_deliver = on_deliver
+        self.on_discard = on_discard
+        self.cond = threading.Condition()
+        self.item = None
+        self.item_origin = None  # ms timestamp the item's age is measured from
+        self.recent_delays = deque(maxlen=delay_window)
+        self.ages = deque(maxlen=200)
+        self.received = 0
+        self.superseded = 0
+        self.expired = 0
+        self.delivered = 0
+        self.last_put_time = time.time()  # Creation counts as activity for idle_seconds()
+
+    def put(self, item, block=False, timeout=None):
+        """Store item as the newest frame, replacing any unread one (never blocks)"""
+        current = now_ms()
+        origin = current
+        if self.timestamp is not None:
+            try:
+                origin = float(self.timestamp(item))
+            except (TypeError, ValueError):
+                origin = current
+        with self.cond:
+            if origin != current:
+                self.recent_delays.append(current - origin)
+            superseded = self.item
+            if superseded is not None:
+                self.superseded += 1
+            self.item = item
+            self.item_origin = origin
+            self.received += 1
+            self.last_put_time = time.time()
+            self.cond.notify()
+        if superseded is not None and self.on_discard is not None:
+            self.on_discard(superseded)
+
+    def idle_seconds(self):
+        """Seconds since the last frame was put (or since creation)"""
+        return time.time() - self.last_put_time
+
+    def _age(self, origin):
+        age = now_ms() - origin
+        if self.timestamp is not None and self.recent_delays:
+            age -= min(self.recent_delays)
+        return max(0.0, age)
+
+    def _take(self):
+        """Pop the pending item if it is fresh enough (caller holds the lock)"""
+        item, origin = self.item, self.item_origin
+        self.item = None
+        self.item_origin = None
+        age = self._age(origin)
+        if self.max_age_ms is not None and age > self.max_age_ms:
+            self.expired += 1
+            if self.on_discard is not None:
+                self.on_discard(item)
+            return None
+        self.delivered += 1
+        self.ages.append(age)
+        if self.on_deliver is not None:
+            self.on_deliver((time.time() - self.last_put_time) * 1000, age)
+        return item
+
+    def age_of(self, created_at):
+        """Skew-corrected age in ms of a frame created at created_at (ms since epoch)"""
+        with self.cond:
+            return self._age(created_at)
+
+    def get(self, block=True, timeout=None):
+        """Return the newest fresh frame, raising queue.Empty like queue.Queue.get"""
+        deadline = None if timeout is None else time.time() + timeout
+        with self.cond:
+            while True:
+                if self.item is not None:
+                    item = self._take()
+                    if item is not None:
+                        return item
+                    continue
+                if not block:
+                    raise queue.Empty
+                if deadline is None:
+                    self.cond.wait()
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise queue.Empty
+                    self.cond.wait(remaining)
+
+    def qsize(self):
+        return 0 if self.item is None else 1
+
+    def empty(self):
+        return self.item is None
+
+    def stats(self):
+        with self.cond:
+            ages = sorted(self.ages)
+            return {
+                'received': self.received,
+                'delivered': self.delivered,
+                'superseded': self.superseded,
+                'expired': self.expired,
+                'dropped': self.superseded + self.expired,
+                'age_ms_mean': sum(ages) / len(ages) if ages else 0.0,
+                'age_ms_p95': ages[int(0.95 * (len(ages) - 1))] if ages else 0.0,
+                'age_ms_max': ages[-1] if ages else 0.0,
+                'clock_offset_ms': min(self.recent_delays) if self.recent_delays else 0.0,
+            }
+
+
+class MailboxGroup:
+    """Per-camera FrameMailboxes drained round-robin by a single consumer
+
+    Args:
+        on_deliver: Optional on_deliver(camera_id, wait_ms, age_ms) for every frame handed out
+        mailbox_kwargs: Passed to each camera's FrameMailbox
+    """
+
+    def __init__(self, on_deliver=None, **mailbox_kwargs):
+        self.on_deliver = on_deliver
+        self.mailbox_kwargs = mailbox_kwargs
+        self.mailboxes = {}
+        self.cond = threading.Condition()
+        self._next_camera = 0
+
+    def put(self, camera_id, item):
+        with self.cond:
+            mailbox = self.mailboxes.get(camera_id)
+            if mailbox is None:
+                on_deliver = None
+                if self.on_deliver is not None:
+                    on_deliver = lambda wait_ms, age_ms: self.on_deliver(camera_id, wait_ms, age_ms)
+                mailbox = FrameMailbox(on_deliver=on_deliver, **self.mailbox_kwargs)
+                self.mailboxes[camera_id] = mailbox
+            mailbox.put(item)
+            self.cond.notify()
+
+    def get(self, block=True, timeout=None):
+        """Return the newest fresh frame of the next camera that has one, or raise queue.Empty"""
+        deadline = None if timeout is None else time.time() + timeout
+        with self.cond:
+            while True:
+                camera_ids = list(self.mailboxes.keys())
+                for i in range(len(camera_ids)):
+                    camera_id = camera_ids[(self._next_camera + i) % len(camera_ids)]
+                    try:
+                        item = self.mailboxes[camera_id].get(block=False)
+                    except queue.Empty:
+                        continue
+                    self._next_camera = (self._next_camera + i + 1) % len(camera_ids)
+                    return item
+                if not block:
+                    raise queue.Empty
+                if deadline is None:
+                    self.cond.wait()
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise queue.Empty
+                    self.cond.wait(remaining)
+
+    def reap(self, idle_timeout):
+        """Remove the mailboxes of cameras without a frame for idle_timeout seconds, returning their ids"""
+        with self.cond:
+            idle = [camera_id for camera_id, mailbox in self.mailboxes.items()
+                    if mailbox.qsize() == 0 and mailbox.idle_seconds() >= idle_timeout]
+            for camera_id in idle:
+                del self.mailboxes[camera_id]
+        return idle
+
+    def stats(self):
+        return {camera_id: mailbox.stats() for camera_id, mailbox in list(self.mailboxes.items())}
+
+
+def print_mailbox_stats(mailboxes):
+    """Print one line of frame-drop and age statistics per camera"""
+    for camera_id, mailbox in list(mailboxes.items()):
+        s = mailbox.stats()
+        print(f"[Camera {camera_id}] frames received: {s['received']}, processed: {s['delivered']}, "
+              f"superseded: {s['superseded']}, expired: {s['expired']}, "
+              f"age mean/p95/max: {s['age_ms_mean']:.0f}/{s['age_ms_p95']:.0f}/{s['age_ms_max']:.0f}ms")
@@ -1,15 +1,22 @@
-from PIL import Image
+# Created before the heavy imports so the startup report can time them
+from startup import StartupReport, warm_up
+startup_report = StartupReport('license plate OCR')
+
+import asyncio
 import cv2
 import torch
 import math
 import numpy as np
 import os
-import io
-import socketio
 import time
-import threading
-import queue
 import re
+from frame_decode import decode_frame
+from metrics import REGISTRY, start_metrics_server, startup_collector
+from plate_cache import PlateCache, print_plate_cache_stats
+from rate_log import RateLimitedLog
+from socket_emitter import RELIABLE, SocketEmitter, register_emitter_metrics
+from service_runtime import ServiceRuntime
+startup_report.mark('imports')
 
 # ---------------------------------------------------------------------------- #
 #                               GLOBAL CONSTANTS                               #
@@ -26,32 +33,95 @@ SAVE_CROPS = True
 USE_HALF_PRECISION = True 
 ENABLE_GPU = True 
 
+# Plate detection on padded crops of the violating vehicles only, as one batch at VEHICLE_CROP_SIZE,
+# instead of the whole frame at INPUT_SIZE (used when the event has no usable vehicle boxes)
+DETECT_IN_VEHICLE_CROPS = True
+VEHICLE_CROP_PADDING = 0.1  # Fraction of the vehicle box size added on each side
+VEHICLE_CROP_SIZE = 640  # Plate detector input size for vehicle crops
+
+# Plate OCR: all plate crops of a violation image are read in batched calls. Crops that fail are
+# read again as their deskewed variants in one more call; the first variant that reads wins.
+OCR_MAX_BATCH = 16  # Crops per OCR forward pass
+OCR_DESKEW_UPFRONT = False  # True: variants join the first call (one pass per image, ~3x the crops)
+
+# Per-track plate cache: readings of a vehicle from successive violation events are merged by
+# per-character voting; once confident, the cached plate is served without running OCR
+ENABLE_PLATE_CACHE = True
+PLATE_CACHE_TTL = 60.0  # Seconds a track's plate is kept after its last reading or use
+PLATE_CONFIDENT_READINGS = 2  # Agreeing readings before OCR stops for a track
+PLATE_MIN_AGREEMENT = 0.7  # Vote share the winning character needs at every position
+PLATE_CACHE_SIZE = 2048  # Tracks remembered at most
+PLATE_CACHE_STATS_INTERVAL = 60.0  # Seconds between cache hit rate reports
+
 # Socket.IO configuration
-SOCKETIO_SERVER_URL = 'wss://172.28.31.150:3000' 
+SOCKETIO_SERVER_URL = os.environ.get('SOCKETIO_SERVER_URL', 'wss://172.28.31.150:3000')  # replay.py points it at a stand-in
 MAX_FPS = 90
 QUEUE_SIZE = 5 
 
-# Initialize Socket.IO client with reconnection settings
-sio = socketio.Client(
-    reconnection=True,
-    reconnection_attempts=0,  # Infinite retries
-    reconnection_delay=1,
-    reconnection_delay_max=5,
-    ssl_verify=False
-)
+# Warm-up run before connecting
+WARMUP_FRAME_SHAPES = [(1080, 1920)]  # (height, width) of violation frames given to the plate detector
+WARMUP_VEHICLE_SHAPES = [(360, 480)]  # Padded violating vehicle crops given to the plate detector
+WARMUP_PLATE_SHAPES = [(64, 224), (160, 192)]  # One- and two-line plate crops given to the OCR model
+WARMUP_ITERATIONS = 2  # Passes per shape
+
+# Observability: Prometheus-style /metrics on localhost, per-event logs at most once per LOG_INTERVAL
+ENABLE_METRICS = True
+METRICS_PORT = 9102
+LOG_INTERVAL = 5.0  # Seconds between two per-event log lines of the same camera
+
+# Results are sent by a background thread; violation plates are must-deliver and wait out reconnects
+OUTBOX_SIZE = 256  # Pending 'violation_license_plate' events before OCR waits for room
+RELIABLE_EMIT_TIMEOUT = 5.0  # Seconds OCR waits for room before an event is dropped
+
+# Event loop for Socket.IO I/O (with reconnection); decoding and OCR run on a bounded executor
+runtime = ServiceRuntime('license plate OCR', SOCKETIO_SERVER_URL, reconnect_delay=1, reconnect_delay_max=5)
+sio = runtime.sio
+ocr_executor = runtime.executor('ocr', max_workers=1)  # The cached models are used by one thread at a time
 
 # Global variables
 running = True
 connected = False
 last_processing_time = 0
-plate_queue = queue.Queue(maxsize=QUEUE_SIZE)
-connection_lock = threading.Lock()
+plate_queue = asyncio.Queue(maxsize=QUEUE_SIZE)  # Filled and drained on the event loop
 
 # Cached models (loaded once and reused)
 yolo_LP_detect = None
 yolo_license_plate = None
 
-model_frame_queue = queue.Queue(maxsize=10)
+event_log = RateLimitedLog(LOG_INTERVAL)
+plate_cache = PlateCache(
+    ttl=PLATE_CACHE_TTL,
+    confident_readings=PLATE_CONFIDENT_READINGS,
+    min_agreement=PLATE_MIN_AGREEMENT,
+    max_entries=PLATE_CACHE_SIZE
+) if ENABLE_PLATE_CACHE else None
+
+# Metrics
+stage_latency = REGISTRY.histogram(
+    'yolo_stage_latency_ms', 'Latency of each pipeline stage per camera in milliseconds', ('camera', 'stage'))
+events_processed = REGISTRY.counter('yolo_frames_processed_total', 'Violation images run through OCR per camera', ('camera',))
+events_dropped = REGISTRY.counter('yolo_frames_dropped_total', 'Violation images dropped per camera and reason',
+                                  ('camera', 'reason'))
+plate_detector_pixels = REGISTRY.counter('yolo_plate_detector_pixels_total',
+                                         'Image pixels given to the plate detector by search mode', ('mode',))
+ocr_batch_size = REGISTRY.histogram('yolo_ocr_batch_size', 'Plate crops per batched OCR call',
+                                    buckets=tuple(range(1, OCR_MAX_BATCH + 1)))
+if plate_cache is not None:
+    REGISTRY.counter('yolo_plate_cache_lookups_total', 'Violator plate lookups by result (a hit is an OCR read saved)',
+                     ('result',), collect=lambda: {('hit', ): plate_cache.stats()['hits'],
+                                                   ('miss', ): plate_cache.stats()['misses']})
+    REGISTRY.counter('yolo_plate_cache_events_served_total', 'Violation events answered from the cache alone',
+                     collect=lambda: {(): plate_cache.stats()['events_served']})
+    REGISTRY.gauge('yolo_plate_cache_tracks', 'Tracks with cached plate readings',
+                   collect=lambda: {(): plate_cache.stats()['entries']})
+REGISTRY.gauge('yolo_queue_depth', 'Items waiting per queue', ('camera', 'queue'),
+               collect=lambda: {('all', 'plate'): plate_queue.qsize()})
+emitter = SocketEmitter(runtime.send, reliable_timeout=RELIABLE_EMIT_TIMEOUT)
+emitter.register('violation_license_plate', RELIABLE, maxsize=OUTBOX_SIZE)
+register_emitter_metrics(REGISTRY, emitter)
+
+REGISTRY.gauge('yolo_startup_phase_seconds', 'Startup wall time per phase (imports, weight load, device move, warm-up)',
+               ('phase',), collect=startup_collector(startup_report))
 
 # --------- UTILITY FUNCTIONS (from utils_rotate.py) ---------
 
@@ -125,11 +195,22 @@ def check_point_linear(x, y, x1, y1, x2, y2):
     y_pred = a*x+b
     return(math.isclose(y_pred, y, abs_tol = 3))
 
+def character_boxes(pred, names):
+    """Characters of one image's (N, 6) OCR predictions as [xmin, ymin, xmax, ymax, confidence, class, name] rows"""
+    return [box[:5] + [int(box[5]), names[int(box[5])]] for box in pred.tolist()]
+
 # detect character and number in license plate
 def read_plate(yolo_license_plate, im):
+    return decode_plate(character_boxes(yolo_license_plate(im)[0], yolo_license_plate.names))
+
+def decode_plate(bb_list, confidences=None):
+    """Plate text from its character boxes, or "unknown" when the count doesn't fit a plate
+
+    Args:
+        bb_list: [xmin, ymin, xmax, ymax, confidence, class, name] rows
+        confidences: Optional list that receives the confidence of every character of the text ('-' counts as 1.0)
+    """
     LP_type = "1"
-    results = yolo_license_plate(im)
-    bb_list = results.pandas().xyxy[0].values.tolist()
     if len(bb_list) == 0 or len(bb_list) < 7 or len(bb_list) > 10:
         return "unknown"
     center_list = []
@@ -139,7 +220,7 @@ def read_plate(yolo_license_plate, im):
         x_c = (bb[0]+bb[2])/2
         y_c = (bb[1]+bb[3])/2
         y_sum += y_c
-        center_list.append([x_c,y_c,bb[-1]])
+        center_list.append([x_c,y_c,bb[-1],bb[4]])
 
     # find 2 point to draw line
     l_point = center_list[0]
@@ -155,7 +236,6 @@ def read_plate(yolo_license_plate, im):
                 LP_type = "2"
 
     y_mean = int(int(y_sum) / len(bb_list))
-    size = results.pandas().s
 
     # 1 line plates and 2 line plates
     line_1 = []
@@ -167,16 +247,58 @@ def read_plate(yolo_license_plate, im):
                 line_2.append(c)
             else:
                 line_1.append(c)
-        for l1 in sorted(line_1, key = lambda x: x[0]):
-            license_plate += str(l1[2])
-        license_plate += "-"
-        for l2 in sorted(line_2, key = lambda x: x[0]):
-            license_plate += str(l2[2])
+        characters = sorted(line_1, key = lambda x: x[0]) + [[0, 0, "-", 1.0]] + sorted(line_2, key = lambda x: x[0])
     else:
-        for l in sorted(center_list, key = lambda x: x[0]):
-            license_plate += str(l[2])
+        characters = sorted(center_list, key = lambda x: x[0])
+    for c in characters:
+        license_plate += str(c[2])
+        if confidences is not None:
+            confidences.append(float(c[3]))
     return license_plate
 
+def ocr_batch(yolo_license_plate, images):
+    """Decoded (plate text, character confidences) of each image, OCR_MAX_BATCH images per forward pass"""
+    readings = []
+    for start in range(0, len(images), OCR_MAX_BATCH):
+        chunk = images[start:start + OCR_MAX_BATCH]
+        results = yolo_license_plate(chunk)
+        ocr_batch_size.observe(len(chunk))
+        for pred in results:
+            confidences = []
+            readings.append((decode_plate(character_boxes(pred, yolo_license_plate.names), confidences), confidences))
+    return readings
+
+def plate_variants(crop_img):
+    """Deskewed versions of a plate crop, cheapest first"""
+    return [deskew(crop_img, cc, 0) for cc in range(0, 2)]
+
+def read_plates(yolo_license_plate, crops, deskew_upfront=OCR_DESKEW_UPFRONT):
+    """Read many plate crops with at most two batched OCR calls
+
+    Every crop is read as is. Crops that don't read are read again as their deskewed
+    variants, together in a second call (or all variants go in the first call with
+    deskew_upfront). Per crop, the cheapest variant that reads wins.
+
+    Returns:
+        (plate text or "unknown", character confidences) per crop
+    """
+    plates = [("unknown", [])] * len(crops)
+    variants = [[crop] + (plate_variants(crop) if deskew_upfront else []) for crop in crops]
+
+    def read_round(indices):
+        readings = iter(ocr_batch(yolo_license_plate, [image for i in indices for image in variants[i]]))
+        for i in indices:
+            read = [next(readings) for _ in variants[i]]
+            plates[i] = next((reading for reading in read if reading[0] != "unknown"), ("unknown", []))
+
+    read_round(range(len(crops)))
+    if not deskew_upfront:
+        failed = [i for i, (text, _) in enumerate(plates) if text == "unknown"]
+        for i in failed:
+            variants[i] = plate_variants(crops[i])
+        read_round(failed)
+    return plates
+
 # --------- MAIN LICENSE PLATE RECOGNITION CODE (from ocr.py) ---------
 
 def load_models():
@@ -211,10 +333,12 @@ def load_models():
                     print("CUDA is not available. Using CPU.")
             except Exception as e:
                 print(f"Error checking GPU: {e}. Using CPU.")
+        startup_report.mark('device check')
         
         # Load YOLO models using the global constants with verbose=False
         yolo_LP_detect = torch.hub.load('yolov5', 'custom', path=DETECTOR_PATH, force_reload=False, source='local', verbose=False)
         yolo_license_plate = torch.hub.load('yolov5', 'custom', path=OCR_PATH, force_reload=False, source='local', verbose=False)
+        startup_report.mark('weight load')
         
         # Move models to appropriate device
         yolo_LP_detect.to(device)
@@ -224,13 +348,13 @@ def load_models():
         if device == 'cuda' and USE_HALF_PRECISION:
             yolo_LP_detect = yolo_LP_detect.half()
             yolo_license_plate = yolo_license_plate.half()
+        startup_report.mark('device move')
         
         # Set model confidence threshold
         yolo_license_plate.conf = CONFIDENCE_THRESHOLD
-
-        # Start model threads
-        model_thread = threading.Thread(target=process_license_plates_thread, daemon=True)
-        model_thread.start()
+        # Only boxes are read from the results: get per-image (N, 6) numpy arrays instead of Detections objects
+        yolo_LP_detect.minimal = True
+        yolo_license_plate.minimal = True
     finally:
         # Restore stdout
         sys.stdout.close()
@@ -238,15 +362,75 @@ def load_models():
     
     return yolo_LP_detect, yolo_license_plate
 
-def recognize_license_plate(image_path=None, image_array=None, detections=None):
+def warm_up_models():
+    """Run both models on representative shapes (and batch sizes) once"""
+    print(f"Warming up plate detector (shapes: {WARMUP_FRAME_SHAPES}) and OCR (shapes: {WARMUP_PLATE_SHAPES})...")
+    warm_up(lambda frames: yolo_LP_detect(frames[0], size=INPUT_SIZE), WARMUP_FRAME_SHAPES,
+            iterations=WARMUP_ITERATIONS, label='plate detector')
+    if DETECT_IN_VEHICLE_CROPS:
+        warm_up(lambda frames: yolo_LP_detect(frames, size=VEHICLE_CROP_SIZE), WARMUP_VEHICLE_SHAPES,
+                batch_sizes=(1, 3), iterations=WARMUP_ITERATIONS, label='plate detector (vehicle crops)')
+    warm_up(lambda frames: ocr_batch(yolo_license_plate, frames), WARMUP_PLATE_SHAPES,
+            batch_sizes=(1, 3), iterations=WARMUP_ITERATIONS, label='plate OCR')
+    startup_report.mark('warm-up')
+
+def vehicle_crops(img, areas):
+    """Padded pixel boxes (x1, y1, x2, y2) of vehicle detections, clipped to the image"""
+    height, width = img.shape[:2]
+    boxes = []
+    for area in areas:
+        bbox = area.get("bbox")
+        x1, y1, x2, y2 = bbox.get("x1") * width, bbox.get("y1") * height, bbox.get("x2") * width, bbox.get("y2") * height
+        pad_x = (x2 - x1) * VEHICLE_CROP_PADDING
+        pad_y = (y2 - y1) * VEHICLE_CROP_PADDING
+        boxes.append((max(0, int(x1 - pad_x)), max(0, int(y1 - pad_y)),
+                      min(width, int(math.ceil(x2 + pad_x))), min(height, int(math.ceil(y2 + pad_y)))))
+    return boxes
+
+def detect_plates(img, valid_areas):
+    """Plate boxes in img pixels, each with the vehicle detections it may belong to
+
+    With DETECT_IN_VEHICLE_CROPS, only padded crops of valid_areas go through the detector,
+    as one batch at VEHICLE_CROP_SIZE, and each plate can only belong to its crop's vehicle.
+    Otherwise the whole image is searched at INPUT_SIZE.
+
+    Returns:
+        List of ([xmin, ymin, xmax, ymax, confidence, ...], candidate areas or None)
+    """
+    if DETECT_IN_VEHICLE_CROPS and valid_areas:
+        boxes = vehicle_crops(img, valid_areas)
+        keep = [i for i, (x1, y1, x2, y2) in enumerate(boxes) if x2 - x1 >= 20 and y2 - y1 >= 10]
+        if not keep:
+            return []
+        crops = [img[boxes[i][1]:boxes[i][3], boxes[i][0]:boxes[i][2]] for i in keep]
+        plate_detector_pixels.inc(sum(crop.shape[0] * crop.shape[1] for crop in crops), mode='vehicle_crops')
+        plates = yolo_LP_detect(crops, size=VEHICLE_CROP_SIZE)
+        found = []
+        for index, i in enumerate(keep):
+            plate_boxes, conf = plates[index][:, :4], plates[index][:, 4]
+            # Back to frame coordinates (minimal results are float32 even for half models)
+            x0, y0 = boxes[i][:2]
+            plate_boxes = plate_boxes + np.array([x0, y0, x0, y0], dtype=np.float32)
+            found.extend((box + [score], [valid_areas[i]]) for box, score in zip(plate_boxes.tolist(), conf.tolist()))
+        return found
+
+    plate_detector_pixels.inc(img.shape[0] * img.shape[1], mode='full_frame')
+    pred = yolo_LP_detect(img, size=INPUT_SIZE)[0]
+    plate_boxes, conf = pred[:, :4], pred[:, 4]
+    return [(box + [score], valid_areas) for box, score in zip(plate_boxes.tolist(), conf.tolist())]
+
+def recognize_license_plate(image_path=None, image_array=None, detections=None, violations=None, with_confidence=False):
     """
     Recognize license plates from either an image path or image array
     Args:
         image_path: Path to the image file
         image_array: OpenCV image array (if image_path is None)
+        detections: Vehicle detections of the image ('id' and normalized 'bbox'); plates outside them are ignored
+        violations: Violations of the image ('id' of a detection); only these vehicles are read
+        with_confidence: Return (plate number, character confidences) instead of the plate number
     
     Returns:
-        A set of detected license plate numbers
+        A dict of vehicle id -> license plate number
     """
     global yolo_LP_detect, yolo_license_plate
     
@@ -263,38 +447,41 @@ def recognize_license_plate(image_path=None, image_array=None, detections=None):
         print("Error: Either image_path or image_array must be provided.")
         return set(), None
     
-    # Resize image if it's too large (for faster processing)
-    frame_height, frame_width = img.shape[:2]
-    if max(frame_height, frame_width) > 1920:  # If the image is larger than Full HD
-        scale = 1920 / max(frame_height, frame_width)
-        new_frame_width = int(frame_width * scale)
-        new_frame_height = int(frame_height * scale)
-        img = cv2.resize(img, (new_frame_width, new_frame_height))
+    # Only the violating vehicles' plates are wanted (all detections when the violators are unknown)
+    valid_areas = None
+    if detections is not None:
+        violator_ids = {violation.get("id") for violation in violations} if violations else None
+        valid_areas = [detection for detection in detections
+                       if violator_ids is None or detection.get("id") in violator_ids]
     
-    # Create a copy for visualization
-    vis_img = img.copy()
+    if valid_areas is not None and not valid_areas:
+        return {}  # None of the violators is among the detections
     
-    # Detect license plates with optimized size
-    plates = yolo_LP_detect(img, size=INPUT_SIZE)
+    # The full-frame search runs on at most Full HD (vehicle crops are cut from the full resolution)
+    if not (DETECT_IN_VEHICLE_CROPS and valid_areas):
+        frame_height, frame_width = img.shape[:2]
+        if max(frame_height, frame_width) > 1920:  # If the image is larger than Full HD
+            scale = 1920 / max(frame_height, frame_width)
+            new_frame_width = int(frame_width * scale)
+            new_frame_height = int(frame_height * scale)
+            img = cv2.resize(img, (new_frame_width, new_frame_height))
+    # Vehicle boxes are normalized, so they are scaled by the size of the image actually searched
+    frame_height, frame_width = img.shape[:2]
     
-    # Process detection results
-    list_plates = plates.pandas().xyxy[0].values.tolist()
+    # Detect license plates (in the violators' crops or the whole frame)
+    list_plates = detect_plates(img, valid_areas)
     list_read_plates = dict()
-    
-    # Process each detected license plate
-    detection_ids = [detection.get("id") for detection in detections]
-    valid_areas = [detection for detection in detections if detection.get("id") in detection_ids]
 
-    crop_images = dict()
+    # Plate crops of the whole image are read together after the loop
+    crop_vehicle_ids = []
+    crop_images = []
 
-
-    for plate in list_plates:
+    for plate, candidate_areas in list_plates:
         # Only process if confidence is above threshold
         confidence = float(plate[4])
         if confidence < CONFIDENCE_THRESHOLD:
             continue
             
-        flag = 0
         x = int(plate[0])  # xmin
         y = int(plate[1])  # ymin
         w = int(plate[2] - plate[0])  # xmax - xmin
@@ -312,10 +499,10 @@ def recognize_license_plate(image_path=None, image_array=None, detections=None):
 
         # Skip if license plate is outside valid area
         vehicle_id = None
-        if valid_areas is not None:
+        if candidate_areas is not None:
             is_inside_valid_area = False
 
-            for valid_area in valid_areas:
+            for valid_area in candidate_areas:
                 x1 = valid_area.get("bbox").get("x1") * frame_width
                 x2 = valid_area.get("bbox").get("x2") * frame_width
                 y1 = valid_area.get("bbox").get("y1") * frame_height
@@ -337,22 +524,13 @@ def recognize_license_plate(image_path=None, image_array=None, detections=None):
             crop_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "crop.jpg")
             cv2.imwrite(crop_file, crop_img)
         
-        # Optimize the deskew process - try fewer orientations for speed
-        # First try without deskew, which is fastest
-        lp = read_plate(yolo_license_plate, crop_img)
+        crop_vehicle_ids.append(vehicle_id)
+        crop_images.append(crop_img)
+    
+    # One batched OCR call for all crops, one more for the deskewed variants of those that failed
+    for vehicle_id, (lp, confidences) in zip(crop_vehicle_ids, read_plates(yolo_license_plate, crop_images)):
         if lp != "unknown":
-            list_read_plates[vehicle_id] = lp
-            continue
-        
-        # If not successful, try deskew with fewer combinations for better speed
-        for cc in range(0, 2):
-            lp = read_plate(yolo_license_plate, deskew(crop_img, cc, 0))
-            if lp != "unknown":
-                list_read_plates[vehicle_id] = lp
-                flag = 1
-                break
-            if flag == 1:
-                break
+            list_read_plates[vehicle_id] = (lp, confidences) if with_confidence else lp
     
     return list_read_plates
 
@@ -371,13 +549,9 @@ def detect_license_plate_from_car_event(vehicle_data):
         if 'image_data' in vehicle_data:
             image_bytes = vehicle_data['image_data']
             
-            # Convert bytes to image
+            # Convert bytes to image (full resolution for plate reading)
             try:
-                # Open as PIL image first
-                image = Image.open(io.BytesIO(image_bytes))
-                # Convert PIL image to OpenCV format (RGB to BGR)
-                frame = np.array(image)
-                frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+                frame = decode_frame(image_bytes)
             except Exception as e:
                 print(f"Error decoding image: {e}")
                 return vehicle_data
@@ -401,23 +575,25 @@ def detect_license_plate_from_car_event(vehicle_data):
 # --------- SOCKETIO EVENT HANDLERS AND PROCESSING ---------
 
 @sio.event
-def connect():
+async def connect():
     """Handler for connection event"""
     global connected
     connected = True
+    emitter.set_connected(True)
     print(f"Successfully connected to Socket.IO server: {SOCKETIO_SERVER_URL}")
     print("Waiting for 'violation_detect' events with vehicle images...")
 
 @sio.event
-def disconnect():
+async def disconnect():
     """Handler for disconnection event"""
     global connected
     connected = False
+    emitter.set_connected(False)
     print("Disconnected from Socket.IO server")
-    print("Connection manager will attempt to reconnect...")
+    print("Will attempt to reconnect automatically...")
 
 @sio.on('violation_detect')
-def on_license_plate(data):
+async def on_license_plate(data):
     """
     Handler for receiving license plate detection events
     Args:
@@ -425,17 +601,17 @@ def on_license_plate(data):
     """
     global last_processing_time
 
-    print("Received license plate event")
-
     camera_id = data.get('camera_id')
     image_id = data.get('image_id')
     violations = data.get('violations')
     buffer = data.get('buffer')
     detections = data.get('detections')
+    track_epoch = data.get('track_epoch')  # Track ids restart with a new epoch
 
     # Limit processing rate to avoid overload
     current_time = time.time()
     if current_time - last_processing_time < 1.0/MAX_FPS:
+        events_dropped.inc(camera=camera_id, reason='rate_limited')
         return  # Skip this frame to maintain reasonable frame rate
     
     last_processing_time = current_time
@@ -448,151 +624,155 @@ def on_license_plate(data):
         
         # Add to processing queue
         try:
-            plate_queue.put((camera_id, image_id, violations, buffer, detections), block=False)
-            print(f"Added license plate image to processing queue")
-        except queue.Full:
+            plate_queue.put_nowait((camera_id, image_id, violations, buffer, detections, track_epoch, time.time()))
+        except asyncio.QueueFull:
             # If queue is full, just discard this data
-            pass
+            events_dropped.inc(camera=camera_id, reason='queue_full')
     
     except Exception as e:
         print(f"Error handling license_plate event: {e}")
 
-def process_license_plates_thread():
-    """Background thread to process license plate images"""
-    global running, yolo_LP_detect, yolo_license_plate
-    
-    print("Starting license plate OCR thread")
+def decode_violation_image(camera_id, buffer):
+    """Decode a violation image, or count the drop and return None"""
+    # Convert buffer to image with optimized error handling
+    try:
+        decode_start = time.time()
+        # Convert bytes to numpy array
+        nparr = np.frombuffer(buffer, np.uint8)
+        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        
+        if img is None:
+            print(f"Error: Could not decode image for plate")
+            events_dropped.inc(camera=camera_id, reason='decode_error')
+            return None
+        stage_latency.observe((time.time() - decode_start) * 1000, camera=camera_id, stage='decode')
+            
+        # Check if image is too small for useful processing
+        if img.shape[0] < 20 or img.shape[1] < 20:
+            print(f"Image too small for reliable processing: {img.shape}")
+            events_dropped.inc(camera=camera_id, reason='too_small')
+            return None
+    except Exception as e:
+        print(f"Error decoding image: {e}")
+        events_dropped.inc(camera=camera_id, reason='decode_error')
+        return None
+    return img
+
+def is_vietnam_plate(text):
+    # Kiểm tra định dạng biển số việt nam
+    return re.match(r'^[0-9]{2}[A-Z]{1,2}[0-9]{1,5}$', text) is not None
+
+def process_plate_event(camera_id, image_id, violations, buffer, detections, track_epoch=None):
+    """Decode one violation image, read its plates and queue the result (runs on the OCR executor)"""
+    # Violators the cache already agrees on are served without OCR
+    cached = {}
+    if plate_cache is not None and violations:
+        for track_id in dict.fromkeys(violation.get('id') for violation in violations):
+            text = plate_cache.get(camera_id, track_epoch, track_id) if track_id is not None else None
+            if text is not None:
+                cached[track_id] = text
+    pending = [violation for violation in violations if violation.get('id') not in cached] if cached else violations
     
-    # Pre-load models for faster inference later
-    yolo_LP_detect, yolo_license_plate = load_models()
-    print("Models loaded successfully and cached for reuse")
+    license_plates = {}
+    inference_time = 0.0
+    if cached and not pending:
+        plate_cache.served_event()  # No decoding, detection or OCR for this event
+    else:
+        img = decode_violation_image(camera_id, buffer)
+        if img is None:
+            return
+        
+        # Start timing for inference
+        start_time = time.time()
+        
+        # Use our optimized recognition with cached models
+        readings = recognize_license_plate(image_array=img, detections=detections, violations=pending,
+                                           with_confidence=True)
+        
+        # Calculate inference time
+        inference_time = (time.time() - start_time) * 1000  # ms
+        stage_latency.observe(inference_time, camera=camera_id, stage='inference')
+        events_processed.inc(camera=camera_id)
+        
+        # Valid readings are voted into the track's cached plate; the consensus so far is reported
+        # rather than this frame's reading
+        for vehicle_id, (text, confidences) in readings.items():
+            if plate_cache is not None and vehicle_id is not None and is_vietnam_plate(text):
+                _, text = plate_cache.add(camera_id, track_epoch, vehicle_id, text, confidences)
+            license_plates[vehicle_id] = text
+    post_process_start = time.time()
     
-    # Set up batch processing variables
-    batch_size = 1  # Start with single image processing
+    # Prepare response with recognition results and include the original data
+    plates = dict(cached)
+    for key, value in license_plates.items():
+        if is_vietnam_plate(value):
+            plates[key] = value
+
+    response = {
+        'camera_id': camera_id,
+        'image_id': image_id,
+        'inference_time': inference_time,
+        'license_plates': plates,
+        'violations': violations,
+    }
+
+    # Per-event summary, at most one line per camera every LOG_INTERVAL
+    event_log.log('plates_recognized', key=camera_id, camera=camera_id, image=image_id,
+                  plates=",".join(plates.values()), inference_ms=inference_time)
+    emit_start = time.time()
+    stage_latency.observe((emit_start - post_process_start) * 1000, camera=camera_id, stage='post_process')
+
+    # Emit license plate OCR results using 'license_plate_ocr' event
+    emitter.emit('violation_license_plate', response)
+    stage_latency.observe((time.time() - emit_start) * 1000, camera=camera_id, stage='emit')
+
+async def process_license_plates():
+    """Take violation events off the plate queue in order and run them on the OCR executor"""
+    print("Starting license plate OCR task")
     
-    while running:
+    while True:
+        camera_id, image_id, violations, buffer, detections, track_epoch, enqueued_at = await plate_queue.get()
+        stage_latency.observe((time.time() - enqueued_at) * 1000, camera=camera_id, stage='queue_wait')
         try:
-            # Try to get a plate event from the queue, non-blocking
-            try:
-                camera_id, image_id, violations, buffer, detections = plate_queue.get(block=False)
-                if camera_id is None:
-                    print(camera_id)
-                    time.sleep(0.01)
-                    continue
-            except queue.Empty:
-                time.sleep(0.01)
-                continue
-            
-            # Convert buffer to image with optimized error handling
-            try:
-                # Convert bytes to numpy array
-                nparr = np.frombuffer(buffer, np.uint8)
-                img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-                
-                if img is None:
-                    print(f"Error: Could not decode image for plate")
-                    continue
-                    
-                # Check if image is too small for useful processing
-                if img.shape[0] < 20 or img.shape[1] < 20:
-                    print(f"Image too small for reliable processing: {img.shape}")
-                    continue
-            except Exception as e:
-                print(f"Error decoding image: {e}")
-                continue
-            
-            # Start timing for inference
-            start_time = time.time()
-            
-            # Use our optimized recognition with cached models
-            license_plates = recognize_license_plate(image_array=img, detections=detections)
-
-            print(license_plates)
-            
-            # Calculate inference time
-            inference_time = (time.time() - start_time) * 1000  # ms
-            
-            # Prepare response with recognition results and include the original data
-            plates = dict()
-            for key, value in license_plates.items():
-                # Kiểm tra định dạng biển số việt nam
-                vietnam_plate_regex = r'^[0-9]{2}[A-Z]{1,2}[0-9]{1,5}$'
-                if re.match(vietnam_plate_regex, value):
-                    plates[key] = value
-
-            response = {
-                'camera_id': camera_id,
-                'image_id': image_id,
-                'inference_time': inference_time,
-                'license_plates': plates,
-                'violations': violations,
-            }
-
-            # Show detected license plates in the command line
-            print(f"[LicensePlateOCR] Camera: {camera_id}, Image: {image_id}, "
-                  f"Plates: {response['license_plates']}, "
-                  f"Inference Time: {inference_time:.2f}ms")
-
-            # Emit license plate OCR results using 'license_plate_ocr' event
-            sio.emit('violation_license_plate', response)
-            
+            await ocr_executor.run(process_plate_event, camera_id, image_id, violations, buffer, detections,
+                                   track_epoch)
         except Exception as e:
-            print(f"Error in license plate OCR thread: {e}")
-            time.sleep(0.1)  # Prevent tight loop if there's an error
-    
-    print("License plate OCR thread stopped")
+            print(f"Error in license plate OCR task: {e}")
 
-def maintain_connection():
-    """Thread to manage Socket.IO connection and auto-reconnect"""
-    global connected, running
-    
-    while running:
-        try:
-            if not connected:
-                try:
-                    print(f"Attempting to connect to Socket.IO server at {SOCKETIO_SERVER_URL}...")
-                    sio.connect(
-                        SOCKETIO_SERVER_URL,
-                        transports=['websocket'],
-                        wait=False
-                    )
-                except Exception as e:
-                    print(f"Failed to connect: {e}")
-                    time.sleep(5)  # Wait before retry
-            time.sleep(1)  # Check connection status periodically
-        except Exception as e:
-            print(f"Connection manager error: {e}")
-            time.sleep(1)
+def shutdown():
+    """Flush pending results (runtime shutdown hook, the loop can still send)"""
+    global running
+    running = False
+    emitter.stop()
 
 def main():
     """Main function to run the license plate OCR service"""
-    global running
-    
     try:
-        # Start connection management thread
-        connection_thread = threading.Thread(target=maintain_connection, daemon=True)
-        connection_thread.start()
-        print("Connection management thread started")
-        
-        # Start processing thread
-        processing_thread = threading.Thread(target=process_license_plates_thread, daemon=True)
-        processing_thread.start()
-        print("License plate processing thread started")
+        # Load and warm up the models before connecting so the first violation doesn't pay for it
+        load_models()
+        print("Models loaded successfully and cached for reuse")
+        warm_up_models()
+        startup_report.print()
         
-        # Keep the main thread running
-        while running:
+        if ENABLE_METRICS:
             try:
-                time.sleep(1)
-            except KeyboardInterrupt:
-                break
+                start_metrics_server(METRICS_PORT)
+            except OSError as e:
+                print(f"Could not start metrics endpoint on port {METRICS_PORT}: {e}")
+        
+        emitter.start()
+        
+        # Connection, reconnects and the plate queue all run on the runtime's event loop
+        runtime.task(process_license_plates)
+        if plate_cache is not None:
+            runtime.every(PLATE_CACHE_STATS_INTERVAL, lambda: print_plate_cache_stats(plate_cache))
+        runtime.on_shutdown(shutdown)
+        runtime.run()
                 
     except Exception as e:
         print(f"Error in main thread: {str(e)}")
         
     finally:
-        running = False
-        if sio.connected:
-            sio.disconnect()
         print("License plate OCR service stopped")
 
 if __name__ == "__main__":
@@ -0,0 +1,210 @@
+"""Minimal Prometheus-compatible metrics and a local /metrics HTTP endpoint.
+
+Counters, gauges and histograms with labels, rendered in the Prometheus text
+exposition format (version 0.0.4) by a stdlib ThreadingHTTPServer, so the
+services need no extra dependency. Recording is a dict lookup and an add under
+a lock; histograms keep cumulative bucket counts, so nothing grows with the
+number of observations.
+
+Values that already live elsewhere (queue depths, mailbox drop counters) are
+read when scraped through a collect function instead of being copied on every
+frame.
+"""
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Milliseconds, from sub-frame stages up to multi-second stalls
+LATENCY_BUCKETS_MS = (0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names, values, extra=None):
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base class: a named family of labelled values
+
+    Args:
+        name: Metric name
+        help_text: HELP line
+        labels: Label names, values are passed as keyword arguments in the same order
+        collect: Optional function returning {label value tuple: value}, called on every scrape
+    """
+
+    kind = 'untyped'
+
+    def __init__(self, name, help_text, labels=(), collect=None):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self.collect = collect
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def _key(self, labels):
+        return tuple(labels.get(name, '') for name in self.label_names)
+
+    def samples(self):
+        """List of (suffix, label values, extra label, value)"""
+        with self.lock:
+            values = dict(self.values)
+        if self.collect is not None:
+            values.update(self.collect())
+        return [('', key, None, value) for key, value in sorted(values.items(), key=lambda kv: str(kv[0]))]
+
+    def forget(self, label, value):
+        """Drop the recorded series whose label has this value (e.g. a camera that went away)"""
+        if label not in self.label_names:
+            return 0
+        index = self.label_names.index(label)
+        with self.lock:
+            keys = [key for key in self.values if key[index] == value]
+            for key in keys:
+                del self.values[key]
+        return len(keys)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} {self.kind}']
+        for suffix, key, extra, value in self.samples():
+            lines.append(f'{self.name}{suffix}{format_labels(self.label_names, key, extra)} {format_value(value)}')
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS_MS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = [[0] * (len(self.buckets) + 1), 0.0, 0]  # per-bucket counts, sum, count
+                self.values[key] = entry
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self):
+        with self.lock:
+            values = {key: (list(entry[0]), entry[1], entry[2]) for key, entry in self.values.items()}
+        samples = []
+        for key, (counts, total, count) in sorted(values.items(), key=lambda kv: str(kv[0])):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                samples.append(('_bucket', key, f'le="{format_value(float(bound))}"', cumulative))
+            samples.append(('_sum', key, None, total))
+            samples.append(('_count', key, None, count))
+        return samples
+
+
+class Registry:
+    """Set of metrics rendered together"""
+
+    def __init__(self):
+        self.metrics = []
+        self.lock = threading.Lock()
+
+    def _add(self, metric):
+        with self.lock:
+            self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=(), collect=None):
+        return self._add(Counter(name, help_text, labels, collect))
+
+    def gauge(self, name, help_text, labels=(), collect=None):
+        return self._add(Gauge(name, help_text, labels, collect))
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS_MS):
+        return self._add(Histogram(name, help_text, labels, buckets))
+
+    def forget(self, label, value):
+        """Drop the series of every metric whose label has this value"""
+        with self.lock:
+            metrics = list(self.metrics)
+        return sum(metric.forget(label, value) for metric in metrics)
+
+    def render(self):
+        with self.lock:
+            metrics = list(self.metrics)
+        blocks = []
+        for metric in metrics:
+            try:
+                blocks.append(metric.render())
+            except Exception as e:
+                blocks.append(f'# {metric.name} collection failed: {escape_label(e)}')
+        return '\n'.join(blocks) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def start_metrics_server(port, host='127.0.0.1', registry=REGISTRY):
+    """Serve registry.render() at http://host:port/metrics from a daemon thread"""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # Scrapes are not worth a line each
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    print(f"[Metrics] Serving http://{host}:{port}/metrics")
+    return server
+
+
+def startup_collector(report):
+    """collect function exposing a StartupReport's phases in seconds, labelled by phase"""
+    return lambda: {(phase,): ms / 1000.0 for phase, ms in report.phases}
@@ -0,0 +1,100 @@
+"""Per-camera change detection used to skip inference on static frames.
+
+MotionGate shrinks each frame to a small blurred grayscale image and compares
+it with a running-average background. When fewer than min_changed_fraction of
+the pixels differ by more than pixel_threshold gray levels, nothing moved and
+the frame can skip the forward pass; the camera's tracks are advanced by
+prediction instead. One frame every max_skip_ms of frame time always goes
+through inference, so slow changes the background absorbs (a vehicle stopping
+at a light, headlights at dusk) are still picked up.
+
+The check costs one INTER_AREA resize to `width` pixels wide, a blur and an
+absdiff on roughly 160x90 pixels, under a millisecond for a 960x540 frame.
+"""
+import threading
+
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """Running-background change detector for one camera
+
+    Args:
+        width: Width of the downscaled comparison image (height keeps the aspect ratio)
+        pixel_threshold: Gray-level difference for a pixel to count as changed
+        min_changed_fraction: Fraction of changed pixels above which the frame has motion
+        alpha: Background learning rate per frame
+        max_skip_ms: Longest stretch of frame time without a real inference
+    """
+
+    def __init__(self, width=160, pixel_threshold=25, min_changed_fraction=0.002, alpha=0.05, max_skip_ms=2000):
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.min_changed_fraction = min_changed_fraction
+        self.alpha = alpha
+        self.max_skip_ms = max_skip_ms
+        self.background = None
+        self.last_inference_at = None
+        self.lock = threading.Lock()
+        self.frames = 0
+        self.skipped = 0
+        self.changed_fraction = 0.0
+        self.inference_ms = 0.0  # Running mean model time per frame for this camera
+        self.inference_samples = 0
+
+    def _small_gray(self, frame):
+        height, width = frame.shape[:2]
+        size = (self.width, max(1, int(round(height * self.width / float(width)))))
+        small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(small, (5, 5), 0)
+
+    def check(self, frame, created_at):
+        """Return True if the frame needs inference (motion, first frame or max_skip_ms reached)"""
+        small = self._small_gray(frame)
+        with self.lock:
+            self.frames += 1
+            if self.background is None or self.background.shape != small.shape:
+                self.background = small.astype(np.float32)
+                self.last_inference_at = created_at
+                return True
+
+            difference = cv2.absdiff(small, cv2.convertScaleAbs(self.background))
+            changed = float(np.count_nonzero(difference > self.pixel_threshold)) / difference.size
+            self.changed_fraction = changed
+            cv2.accumulateWeighted(small, self.background, self.alpha)
+
+            stale = created_at - self.last_inference_at >= self.max_skip_ms
+            if changed >= self.min_changed_fraction or stale:
+                self.last_inference_at = created_at
+                return True
+            self.skipped += 1
+            return False
+
+    def record_inference(self, ms):
+        """Add one frame's share of a forward pass to the running mean (used to estimate savings)"""
+        with self.lock:
+            self.inference_samples += 1
+            self.inference_ms += (ms - self.inference_ms) / min(self.inference_samples, 100)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'frames': self.frames,
+                'skipped': self.skipped,
+                'skip_ratio': self.skipped / self.frames if self.frames else 0.0,
+                'changed_fraction': self.changed_fraction,
+                'inference_ms_per_frame': self.inference_ms,
+                'saved_ms': self.skipped * self.inference_ms,
+            }
+
+
+def print_motion_stats(gates):
+    """Print one line of skip ratio and estimated compute saved per camera"""
+    for camera_id, gate in list(gates.items()):
+        s = gate.stats()
+        print(f"[Camera {camera_id}] motion gate: skipped {s['skipped']}/{s['frames']} frames "
+              f"({100 * s['skip_ratio']:.1f}%), saved ~{s['saved_ms'] / 1000:.1f}s of inference "
+              f"({s['inference_ms_per_frame']:.1f}ms/frame)")
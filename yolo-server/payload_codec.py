@@ -0,0 +1,210 @@
+"""Incremental, binary encoding of per-camera detection updates.
+
+The full 'car_detected' payload resends every trail point, every counter and
+every detection as nested JSON on each frame. DeltaEncoder keeps, per camera,
+what has already been sent and produces a compact update instead:
+
+    v, seq, keyframe              protocol version, per-camera sequence number,
+                                  True when the payload is a full resync
+    camera_id, image_id, created_at, track_line_y, inference_time, width, height
+    classes                       class id -> name table (keyframes only)
+    detections                    float32 (N, 5) [x1, y1, x2, y2, conf], normalized
+    detection_meta                int32 (N, 2) [track_id (-1 if none), class_id]
+    points                        int32 (M, 5) [track_id, x, y, dt_ms, class_id]; only
+                                  points not sent before (all live points on keyframes),
+                                  dt_ms relative to created_at
+    counts                        changed counters only ('total_up', 'up.<class>', ...)
+    current                       non-zero per-class counts in this frame
+    crossings                     int32 (K, 2) [track_id, direction]
+    zones                         per-line counts and polygon occupancy (when configured)
+    predicted                     True when inference was skipped (static frame) and the
+                                  detections are the tracker's predicted boxes
+    track_epoch                   id of the tracker's track id sequence (changes whenever
+                                  track ids restart), None without tracking
+
+Arrays are raw little-endian bytes. With msgpack installed the whole update
+is packed into one binary message; otherwise the dict is emitted as is and
+Socket.IO sends the bytes fields as binary attachments. A keyframe is sent
+every keyframe_interval updates and whenever request_keyframe() is called
+(e.g. after a reconnect), so a receiver that missed updates resynchronizes.
+"""
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+PROTOCOL_VERSION = 1
+
+
+def pack_array(array, dtype):
+    return np.ascontiguousarray(array, dtype=np.dtype(dtype).newbyteorder('<')).tobytes()
+
+
+class DeltaEncoder:
+    """Per-camera state for building incremental detection updates
+
+    Args:
+        class_names: Class id -> name list, sent on keyframes
+        keyframe_interval: Updates between full resyncs
+        use_msgpack: Pack the update into one msgpack message when msgpack is available
+    """
+
+    def __init__(self, class_names, keyframe_interval=30, use_msgpack=True):
+        self.class_names = list(class_names)
+        self.keyframe_interval = keyframe_interval
+        self.use_msgpack = use_msgpack and msgpack is not None
+        self.sequence = 0
+        self.updates_since_keyframe = 0
+        self.force_keyframe = True
+        self.sent_until = {}  # track_id -> time of the newest point already sent
+        self.sent_counts = {}
+
+    def request_keyframe(self):
+        self.force_keyframe = True
+
+    def encode(self, camera_id, image_id, created_at, track_line_y, inference_time, width, height,
+               rel_boxes, confidences, class_ids, track_ids, tracks, counts, current_counts, crossings,
+               zones=None, predicted=False, track_epoch=None):
+        """Build the update for one frame
+
+        Args:
+            rel_boxes, confidences, class_ids, track_ids: Detection arrays (track_ids may be None)
+            tracks: TrackHistory.recent() output, (track_id, xy, times, class_ids) per track
+            counts: Flat dict of cumulative counters
+            current_counts: Per-class counts in this frame
+            crossings: List of (track_id, direction) that happened in this frame
+            zones: Optional per-line counts and polygon occupancy, sent as is
+            predicted: The detections are tracker predictions, not model output
+            track_epoch: CameraTracker.epoch the track ids belong to
+
+        Returns:
+            msgpack bytes, or a dict with bytes fields
+        """
+        keyframe = self.force_keyframe or self.updates_since_keyframe >= self.keyframe_interval
+        if keyframe:
+            self.sent_until = {}
+            self.sent_counts = {}
+            self.updates_since_keyframe = 0
+            self.force_keyframe = False
+        self.updates_since_keyframe += 1
+        self.sequence += 1
+
+        # Only trail points newer than what this receiver already has
+        new_points = []
+        sent_until = {}
+        for track_id, xy, times, track_class_ids in tracks:
+            last_sent = self.sent_until.get(track_id)
+            fresh = times > last_sent if last_sent is not None else np.ones(len(times), dtype=bool)
+            if len(times):
+                sent_until[track_id] = times[-1]
+            if not fresh.any():
+                continue
+            block = np.empty((int(fresh.sum()), 5), dtype=np.int64)
+            block[:, 0] = track_id
+            block[:, 1:3] = xy[fresh]
+            block[:, 3] = times[fresh] - created_at
+            block[:, 4] = track_class_ids[fresh]
+            new_points.append(block)
+        self.sent_until = sent_until
+        points = np.concatenate(new_points) if new_points else np.zeros((0, 5), dtype=np.int64)
+
+        changed_counts = {key: value for key, value in counts.items() if self.sent_counts.get(key) != value}
+        self.sent_counts.update(changed_counts)
+
+        detection_meta = np.empty((len(confidences), 2), dtype=np.int64)
+        detection_meta[:, 0] = track_ids if track_ids is not None else -1
+        detection_meta[:, 1] = class_ids
+        detections = np.empty((len(confidences), 5), dtype=np.float32)
+        detections[:, :4] = rel_boxes
+        detections[:, 4] = confidences
+
+        update = {
+            'v': PROTOCOL_VERSION,
+            'seq': self.sequence,
+            'keyframe': keyframe,
+            'camera_id': camera_id,
+            'image_id': image_id,
+            'created_at': created_at,
+            'track_line_y': track_line_y,
+            'inference_time': round(float(inference_time), 2),
+            'width': width,
+            'height': height,
+            'detections': pack_array(detections, np.float32),
+            'detection_meta': pack_array(detection_meta, np.int32),
+            'points': pack_array(points, np.int32),
+            'counts': changed_counts,
+            'current': {name: count for name, count in current_counts.items() if count},
+            'crossings': pack_array(np.array(crossings, dtype=np.int64).reshape(-1, 2), np.int32),
+            'predicted': bool(predicted),
+            'track_epoch': track_epoch,
+        }
+        if zones is not None:
+            update['zones'] = zones
+        if keyframe:
+            update['classes'] = self.class_names
+
+        if self.use_msgpack:
+            return msgpack.packb(update, use_bin_type=True)
+        return update
+
+
+def build_full_payload(camera_id, image_id, track_line_y, detected_objects, inference_time, width, height,
+                       created_at, total_counted_up, total_counted_down, vehicle_counts_up,
+                       vehicle_counts_down, vehicle_counts, recent_tracks, new_crossings, class_names, zones=None,
+                       predicted=False, track_epoch=None):
+    """Build the full (non-incremental) 'car_detected' payload
+
+    predicted marks a frame whose detections are the tracker's predicted boxes (inference skipped);
+    track_epoch is the CameraTracker.epoch the track ids belong to
+    """
+    payload = {
+        'camera_id': camera_id,
+        'image_id': image_id,
+        'track_line_y': track_line_y,
+        'detections': detected_objects,
+        'inference_time': inference_time,
+        'image_dimensions': {
+            'width': width,
+            'height': height
+        },
+        'created_at': created_at,
+        'predicted': bool(predicted),
+        'track_epoch': track_epoch,
+        'vehicle_count': {
+            'total_up': total_counted_up,
+            'total_down': total_counted_down,
+            'by_type_up': vehicle_counts_up,
+            'by_type_down': vehicle_counts_down,
+            'current': vehicle_counts
+        },
+        'tracks': [
+            {
+                'id': track_id,
+                'positions': [
+                    {'x': x, 'y': y, 'time': t}
+                    for (x, y), t in zip(xy.astype(np.int64).tolist(), times.tolist())
+                ],
+                'class': class_names[int(track_class_ids[-1])]
+            }
+            for track_id, xy, times, track_class_ids in recent_tracks
+        ],
+        'new_crossings': [
+            {'id': crossing[0], 'direction': crossing[1]}
+            for crossing in new_crossings
+        ]
+    }
+    if zones is not None:
+        payload['zones'] = zones
+    return payload
+
+
+def flatten_counts(total_up, total_down, by_type_up, by_type_down):
+    """Cumulative counters as one flat dict, so changes can be diffed key by key"""
+    counts = {'total_up': total_up, 'total_down': total_down}
+    for name, value in by_type_up.items():
+        counts[f'up.{name}'] = value
+    for name, value in by_type_down.items():
+        counts[f'down.{name}'] = value
+    return counts
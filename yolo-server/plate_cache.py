@@ -0,0 +1,154 @@
+"""Per-track license plate cache with multi-frame voting.
+
+One vehicle often triggers several violation events: a red light and a lane
+encroachment, or the same violation over consecutive frames. Each event used
+to run plate detection and OCR from scratch. PlateCache keeps the readings of
+every (camera_id, track_epoch, track_id) and merges them by voting per character
+position: each reading adds its character confidences to the candidates at
+its positions. Readings with a different layout (length, line break) are
+counted separately, and the layout with the most readings wins.
+
+Track ids start again at 1 whenever a tracker is recreated (service or shard
+restart, reclaimed idle camera), so the key includes the tracker's epoch and a
+new vehicle that reuses an old id never inherits the old vehicle's plate.
+
+A plate is confident once confident_readings readings agree on its
+layout and the winning character at every position holds at least
+min_agreement of the vote. From then on get() returns it, and the caller
+skips OCR for that vehicle. Entries expire ttl seconds after their last
+reading; cache hits do not extend them, so a plate is always backed by an
+OCR reading at most ttl old. Beyond max_entries the entry read longest ago
+is evicted.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class PlateVotes:
+    """Readings of one track"""
+
+    def __init__(self):
+        self.layouts = {}  # layout -> [readings, [{char: summed confidence} per position]]
+        self.updated = 0.0
+
+    @staticmethod
+    def layout(text):
+        return len(text), text.find('-')
+
+    def add(self, text, confidences):
+        entry = self.layouts.get(self.layout(text))
+        if entry is None:
+            entry = [0, [{} for _ in text]]
+            self.layouts[self.layout(text)] = entry
+        entry[0] += 1
+        for votes, char, confidence in zip(entry[1], text, confidences):
+            votes[char] = votes.get(char, 0.0) + confidence
+
+    def consensus(self):
+        """(text, readings, agreement) of the best layout: the top character per position and its smallest vote share"""
+        if not self.layouts:
+            return None, 0, 0.0
+        readings, positions = max(self.layouts.values(), key=lambda entry: entry[0])
+        text = ''
+        agreement = 1.0
+        for votes in positions:
+            char, score = max(votes.items(), key=lambda item: item[1])
+            text += char
+            total = sum(votes.values())
+            agreement = min(agreement, score / total if total > 0 else 0.0)
+        return text, readings, agreement
+
+
+class PlateCache:
+    """(camera_id, track_epoch, track_id) -> voted plate reading
+
+    Args:
+        ttl: Seconds an entry is kept after its last reading
+        confident_readings: Readings of the winning layout needed before a plate is served from the cache
+        min_agreement: Smallest vote share the winning character needs at every position
+        max_entries: Tracks kept at most (the one read longest ago is evicted)
+    """
+
+    def __init__(self, ttl=60.0, confident_readings=2, min_agreement=0.7, max_entries=2048):
+        self.ttl = ttl
+        self.confident_readings = confident_readings
+        self.min_agreement = min_agreement
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.readings = 0
+        self.events_served = 0  # Events answered without decoding, detection or OCR
+
+    def _expire(self, now):
+        while self.entries:
+            votes = next(iter(self.entries.values()))
+            if now - votes.updated < self.ttl:
+                break
+            self.entries.popitem(last=False)
+
+    def _confident(self, votes):
+        text, readings, agreement = votes.consensus()
+        if readings >= self.confident_readings and agreement >= self.min_agreement:
+            return text
+        return None
+
+    def get(self, camera_id, track_epoch, track_id, now=None):
+        """Confident cached plate of a track, or None when OCR should run"""
+        now = time.time() if now is None else now
+        with self.lock:
+            self._expire(now)
+            votes = self.entries.get((camera_id, track_epoch, track_id))
+            text = self._confident(votes) if votes is not None else None
+            if text is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return text
+
+    def add(self, camera_id, track_epoch, track_id, text, confidences, now=None):
+        """Merge a reading into the track's votes
+
+        Returns:
+            (text, consensus): this reading and the track's consensus text after merging it, which
+            can differ from the reading once earlier readings outvote it
+        """
+        now = time.time() if now is None else now
+        key = (camera_id, track_epoch, track_id)
+        with self.lock:
+            votes = self.entries.get(key)
+            if votes is None:
+                votes = PlateVotes()
+                self.entries[key] = votes
+            votes.add(text, confidences)
+            votes.updated = now
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self.readings += 1
+            return text, votes.consensus()[0]
+
+    def served_event(self):
+        with self.lock:
+            self.events_served += 1
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'readings': self.readings,
+                'events_served': self.events_served,
+            }
+
+
+def print_plate_cache_stats(cache):
+    s = cache.stats()
+    print(f"[PlateCache] tracks: {s['entries']}, hit rate: {100 * s['hit_rate']:.1f}% "
+          f"({s['hits']} OCR reads saved, {s['misses']} misses), readings merged: {s['readings']}, "
+          f"events served from cache: {s['events_served']}")
@@ -0,0 +1,184 @@
+"""Adaptive per-camera quality of service for shared inference.
+
+Every camera sits on a level of a ladder ordered from most to least expensive;
+each level sets the camera's effective frame rate, model input size and
+(optionally) the model variant. On every step() (the service schedules it on
+its event loop) the controller looks at the p95 end-to-end latency (event created_at to post-processing, clock-skew
+corrected) of each camera:
+
+- if any camera is above target_latency_ms, the shared GPU is overloaded and the
+  lowest-priority camera that can still go down is moved one level down;
+- if every camera is below headroom * target_latency_ms, the highest-priority
+  camera that can go up is moved one level up.
+
+One camera moves per step, so the effect of a change is measured before the
+next one. Priority is raised for cameras with a recent violation and cameras
+with tracks close to a counting line, so those keep their frame rate and
+resolution the longest. Every adjustment is logged.
+"""
+import threading
+import time
+from collections import deque
+
+from batch_scheduler import percentile
+
+
+class CameraQos:
+    """QoS state of one camera"""
+
+    def __init__(self, level, window):
+        self.level = level
+        self.latencies = deque(maxlen=window)
+        self.inference_times = deque(maxlen=window)
+        self.last_admitted = None
+        self.admitted = 0
+        self.throttled = 0
+        self.violation_until = 0.0
+        self.near_line = 0
+
+
+class QosController:
+    """Per-camera frame rate / input size / model ladder driven by latency
+
+    Args:
+        levels: List of dicts with 'max_fps', 'imgsz' and optionally 'model', most expensive first
+        target_latency_ms: p95 end-to-end latency to stay within
+        start_level: Level new cameras start at
+        headroom: Fraction of the target every camera must be under before anything is upgraded
+        window: Latency samples kept per camera
+        violation_hold: Seconds a violation keeps a camera prioritized
+        min_samples: Latency samples a camera needs before it is judged
+    """
+
+    def __init__(self, levels, target_latency_ms=500, start_level=0, headroom=0.6, window=100,
+                 violation_hold=30.0, min_samples=10):
+        if not levels:
+            raise ValueError("QosController needs at least one level")
+        self.levels = list(levels)
+        self.target_latency_ms = target_latency_ms
+        self.start_level = min(max(0, start_level), len(self.levels) - 1)
+        self.headroom = headroom
+        self.window = window
+        self.violation_hold = violation_hold
+        self.min_samples = min_samples
+        self.cameras = {}
+        self.lock = threading.Lock()
+        self.adjustments = 0
+
+    def _camera(self, camera_id):
+        state = self.cameras.get(camera_id)
+        if state is None:
+            state = CameraQos(self.start_level, self.window)
+            self.cameras[camera_id] = state
+        return state
+
+    def level(self, camera_id):
+        """Settings dict of the camera's current level"""
+        with self.lock:
+            return self.levels[self._camera(camera_id).level]
+
+    def admit(self, camera_id, created_at):
+        """True if a frame with this created_at (ms) fits the camera's current frame rate"""
+        with self.lock:
+            state = self._camera(camera_id)
+            max_fps = self.levels[state.level].get('max_fps')
+            if max_fps and state.last_admitted is not None:
+                # Small tolerance so sources running at exactly max_fps are not halved by jitter
+                if created_at - state.last_admitted < 0.9 * 1000.0 / max_fps:
+                    state.throttled += 1
+                    return False
+            state.last_admitted = created_at
+            state.admitted += 1
+            return True
+
+    def observe(self, camera_id, latency_ms, inference_ms=None):
+        with self.lock:
+            state = self._camera(camera_id)
+            state.latencies.append(latency_ms)
+            if inference_ms is not None:
+                state.inference_times.append(inference_ms)
+
+    def mark_violation(self, camera_id):
+        with self.lock:
+            self._camera(camera_id).violation_until = time.time() + self.violation_hold
+
+    def set_near_line(self, camera_id, count):
+        """Number of the camera's tracks currently close to a counting line"""
+        with self.lock:
+            self._camera(camera_id).near_line = count
+
+    def forget(self, camera_id):
+        """Drop a camera's state; it starts again at start_level if it comes back"""
+        with self.lock:
+            self.cameras.pop(camera_id, None)
+
+    def _priority(self, state, now):
+        return (2 if state.violation_until > now else 0) + (1 if state.near_line > 0 else 0)
+
+    def step(self):
+        """Run one control decision, returning (camera_id, old_level, new_level, reason) or None"""
+        now = time.time()
+        with self.lock:
+            judged = {camera_id: percentile(list(state.latencies), 95)
+                      for camera_id, state in self.cameras.items() if len(state.latencies) >= self.min_samples}
+            if not judged:
+                return None
+            worst = max(judged.values())
+
+            if worst > self.target_latency_ms:
+                # Overloaded: cheapest change first, the lowest-priority camera at the best level goes down
+                candidates = [c for c, s in self.cameras.items() if s.level < len(self.levels) - 1]
+                key = lambda c: (self._priority(self.cameras[c], now), self.cameras[c].level)
+                direction = 1
+                reason = f"p95 latency {worst:.0f}ms > target {self.target_latency_ms:.0f}ms"
+            elif worst < self.headroom * self.target_latency_ms:
+                candidates = [c for c, s in self.cameras.items() if s.level > 0]
+                key = lambda c: (-self._priority(self.cameras[c], now), -self.cameras[c].level)
+                direction = -1
+                reason = f"p95 latency {worst:.0f}ms < {self.headroom * self.target_latency_ms:.0f}ms"
+            else:
+                return None
+            if not candidates:
+                return None
+
+            camera_id = min(candidates, key=key)
+            state = self.cameras[camera_id]
+            old_level = state.level
+            state.level += direction
+            priority = self._priority(state, now)
+            # Samples taken at the old level no longer describe this camera
+            for other in self.cameras.values():
+                other.latencies.clear()
+            self.adjustments += 1
+
+        settings = self.levels[state.level]
+        print(f"[QoS] Camera {camera_id}: level {old_level} -> {state.level} "
+              f"(fps: {settings.get('max_fps')}, imgsz: {settings.get('imgsz')}, "
+              f"model: {settings.get('model', 'default')}, priority: {priority}), {reason}")
+        return camera_id, old_level, state.level, reason
+
+    def stats(self):
+        now = time.time()
+        with self.lock:
+            return {
+                camera_id: {
+                    'level': state.level,
+                    'priority': self._priority(state, now),
+                    'latency_ms_p95': percentile(list(state.latencies), 95),
+                    'inference_ms_mean': (sum(state.inference_times) / len(state.inference_times)
+                                          if state.inference_times else 0.0),
+                    'admitted': state.admitted,
+                    'throttled': state.throttled,
+                }
+                for camera_id, state in self.cameras.items()
+            }
+
+
+def print_qos_stats(controller):
+    """Print one line of QoS level, priority and latency per camera"""
+    for camera_id, s in controller.stats().items():
+        settings = controller.levels[s['level']]
+        print(f"[Camera {camera_id}] QoS level {s['level']} (fps: {settings.get('max_fps')}, "
+              f"imgsz: {settings.get('imgsz')}), priority: {s['priority']}, "
+              f"latency p95: {s['latency_ms_p95']:.0f}ms, frames admitted: {s['admitted']}, "
+              f"throttled: {s['throttled']}")
@@ -0,0 +1,59 @@
+"""Rate-limited structured (logfmt) logging for per-frame events.
+
+Printing a line per frame costs measurable time at 30 FPS per camera and buries
+the lines that matter. RateLimitedLog prints at most one line per key (usually
+per camera and event) every `interval` seconds, as `event=... key=value ...`,
+with the number of lines suppressed since the previous one.
+"""
+import threading
+import time
+
+
+def format_field(value):
+    if isinstance(value, float):
+        text = f'{value:.2f}'
+    else:
+        text = str(value)
+    if not text or any(c in text for c in ' ="'):
+        text = '"' + text.replace('"', '\\"') + '"'
+    return text
+
+
+class RateLimitedLog:
+    """At most one log line per key every `interval` seconds
+
+    Args:
+        interval: Seconds between two lines with the same key
+    """
+
+    def __init__(self, interval=5.0):
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.last = {}  # key -> (time of last line, lines suppressed since)
+
+    def log(self, event, key=None, **fields):
+        """Print `event` with its fields unless a line with the same key was printed recently
+
+        Returns:
+            True if the line was printed
+        """
+        key = (event, key)
+        now = time.time()
+        with self.lock:
+            last_time, suppressed = self.last.get(key, (0.0, 0))
+            if now - last_time < self.interval:
+                self.last[key] = (last_time, suppressed + 1)
+                return False
+            self.last[key] = (now, 0)
+        parts = [f'event={format_field(event)}']
+        parts.extend(f'{name}={format_field(value)}' for name, value in fields.items())
+        if suppressed:
+            parts.append(f'suppressed={suppressed}')
+        print(' '.join(parts))
+        return True
+
+    def forget(self, key):
+        """Drop the rate-limit state of every event logged with this key"""
+        with self.lock:
+            for entry in [k for k in self.last if k[1] == key]:
+                del self.last[entry]
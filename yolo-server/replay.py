@@ -0,0 +1,401 @@
+"""Record camera events once, then replay them as load into the inference services.
+
+    record   Connect to the Node server like a service, join every camera room and
+             write each 'image' and 'violation_detect' event to a recording file.
+    replay   Run a local stand-in Socket.IO server that plays a recording to the
+             connected services at real time or N x speed, fanned out to M
+             synthetic cameras, and report per service:
+               - throughput
+               - end-to-end latency percentiles
+               - unanswered events
+               - processed / dropped frames read from each service's /metrics
+    info     Summarize a recording.
+
+Point the services at the stand-in with the SOCKETIO_SERVER_URL environment
+variable, e.g. SOCKETIO_SERVER_URL=ws://127.0.0.1:3900 python server.py.
+As on the Node server, images go only to the clients that emitted
+'join_all_camera', and violations go to every client. The replay starts once
+--clients Socket.IO clients are connected, or after --wait seconds.
+
+Recording format: the magic line b'YREC1\\n', then one record per event:
+struct '<II' (metadata length, buffer length), UTF-8 JSON metadata
+({'t': ms since the first event, 'event': name, 'data': fields without the
+buffer}) and the raw JPEG buffer. Images are stored exactly as received.
+
+Latency is measured from the moment an event is sent (its created_at is
+rewritten to the send time) to the matching result: 'car_detected' /
+'car_detected_delta' and 'traffic_light' by created_at, 'violation_license_plate'
+by image_id. The vehicle and traffic light services emit only when something
+was detected, and superseded updates are coalesced, so "unanswered" is an upper
+bound on drops; the /metrics counters give the exact figures.
+
+Usage:
+    python replay.py record --url wss://172.28.31.150:3000 --out traffic.yrec [--seconds 300]
+    python replay.py replay traffic.yrec [--port 3900] [--speed 2] [--cameras 16] [--loops 1]
+        [--clients 3] [--wait 120] [--metrics 9100,9101,9102]
+    python replay.py info traffic.yrec
+"""
+import argparse
+import asyncio
+import json
+import struct
+import time
+import urllib.request
+from collections import defaultdict
+
+from batch_scheduler import percentile
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MAGIC = b'YREC1\n'
+RECORD_HEADER = struct.Struct('<II')
+RECORDED_EVENTS = ('image', 'violation_detect')
+CAMERA_ROOM = 'cameras'  # Stand-in for the camera_<id> rooms join_all_camera joins
+
+# Result event -> service it comes from
+RESULT_SERVICES = {
+    'car_detected': 'vehicles',
+    'car_detected_delta': 'vehicles',
+    'traffic_light': 'traffic light',
+    'violation_license_plate': 'license plate',
+}
+
+
+def now_ms():
+    return time.time() * 1000.0
+
+
+# ---------------------------------------------------------------------------- #
+#                                Recording file                                #
+# ---------------------------------------------------------------------------- #
+class RecordingWriter:
+    def __init__(self, path):
+        self.file = open(path, 'wb')
+        self.file.write(MAGIC)
+        self.start = None
+        self.count = 0
+        self.bytes = 0
+
+    def write(self, event, data):
+        if self.start is None:
+            self.start = now_ms()
+        data = dict(data)
+        buffer = bytes(data.pop('buffer', b'') or b'')
+        meta = json.dumps({'t': round(now_ms() - self.start, 1), 'event': event, 'data': data},
+                          separators=(',', ':')).encode('utf-8')
+        self.file.write(RECORD_HEADER.pack(len(meta), len(buffer)))
+        self.file.write(meta)
+        self.file.write(buffer)
+        self.count += 1
+        self.bytes += RECORD_HEADER.size + len(meta) + len(buffer)
+
+    def close(self):
+        self.file.close()
+
+
+def read_recording(path):
+    """List of (t_ms, event, data) with data['buffer'] restored"""
+    records = []
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise SystemExit(f"{path} is not a recording (bad magic)")
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                break
+            meta_length, buffer_length = RECORD_HEADER.unpack(header)
+            meta = json.loads(f.read(meta_length))
+            data = meta['data']
+            data['buffer'] = f.read(buffer_length)
+            records.append((meta['t'], meta['event'], data))
+    return records
+
+
+# ---------------------------------------------------------------------------- #
+#                                    record                                    #
+# ---------------------------------------------------------------------------- #
+async def record(args):
+    import socketio
+    sio = socketio.AsyncClient(ssl_verify=False)
+    writer = RecordingWriter(args.out)
+    done = asyncio.Event()
+
+    async def on_event(event, data):
+        if isinstance(data, dict) and data.get('buffer') is not None:
+            writer.write(event, data)
+            if args.max_events and writer.count >= args.max_events:
+                done.set()
+
+    for event in RECORDED_EVENTS:
+        sio.on(event, lambda data, event=event: on_event(event, data))
+
+    @sio.event
+    async def connect():
+        print(f"Connected to {args.url}, recording {', '.join(RECORDED_EVENTS)} events to {args.out}...")
+        await sio.emit('join_all_camera')
+
+    await sio.connect(args.url, transports=['websocket'])
+    try:
+        await asyncio.wait_for(done.wait(), timeout=args.seconds)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        await sio.disconnect()
+        writer.close()
+    print(f"Recorded {writer.count} events ({writer.bytes / (1024 * 1024):.1f} MiB)")
+
+
+def info(args):
+    records = read_recording(args.recording)
+    by_event = defaultdict(int)
+    cameras = defaultdict(int)
+    size = 0
+    for _, event, data in records:
+        by_event[event] += 1
+        size += len(data['buffer'])
+        if event == 'image':
+            cameras[data.get('cameraId')] += 1
+    duration = records[-1][0] / 1000.0 if records else 0.0
+    print(f"{len(records)} events over {duration:.1f}s, {size / (1024 * 1024):.1f} MiB of images")
+    for event, count in sorted(by_event.items()):
+        print(f"  {event}: {count}")
+    for camera_id, count in sorted(cameras.items(), key=lambda kv: str(kv[0])):
+        print(f"  camera {camera_id}: {count} images ({count / duration if duration else 0:.1f} fps)")
+
+
+# ---------------------------------------------------------------------------- #
+#                                    replay                                    #
+# ---------------------------------------------------------------------------- #
+def build_schedule(records, cameras, loops):
+    """Timeline of (t_ms, event, source data, synthetic camera id) for `cameras` synthetic cameras
+
+    Synthetic camera k replays the events of recorded camera k % (recorded cameras),
+    shifted by a fraction of that camera's frame interval so cameras don't fire in lockstep.
+    """
+    streams = defaultdict(list)
+    for t, event, data in records:
+        source = data.get('cameraId') if event == 'image' else data.get('camera_id')
+        streams[str(source)].append((t, event, data))
+    sources = sorted(streams)
+    if not sources:
+        return [], 0.0
+    duration = max(t for t, _, _ in records) + 1.0
+
+    schedule = []
+    for k in range(cameras):
+        stream = streams[sources[k % len(sources)]]
+        image_times = [t for t, event, _ in stream if event == 'image']
+        interval = (image_times[-1] - image_times[0]) / (len(image_times) - 1) if len(image_times) > 1 else 0.0
+        offset = interval * k / cameras
+        for loop in range(loops):
+            for t, event, data in stream:
+                schedule.append((loop * duration + t + offset, event, data, f'replay-{k}'))
+    schedule.sort(key=lambda item: item[0])
+    return schedule, loops * duration
+
+
+def scrape_totals(port):
+    """Sum of yolo_frames_processed_total and yolo_frames_dropped_total (by reason) from a /metrics endpoint"""
+    text = urllib.request.urlopen(f'http://127.0.0.1:{port}/metrics', timeout=2).read().decode('utf-8')
+    totals = defaultdict(float)
+    for line in text.splitlines():
+        if line.startswith('#') or not line.strip():
+            continue
+        name_labels, _, value = line.rpartition(' ')
+        name = name_labels.split('{', 1)[0]
+        if name == 'yolo_frames_processed_total':
+            totals['processed'] += float(value)
+        elif name == 'yolo_frames_dropped_total':
+            reason = name_labels.split('reason="', 1)[1].split('"', 1)[0] if 'reason="' in name_labels else 'other'
+            totals[f'dropped.{reason}'] += float(value)
+    return totals
+
+
+class ReplayStats:
+    def __init__(self):
+        self.sent = defaultdict(int)  # event -> count
+        self.sent_at = {}  # image_id of a violation_detect -> send time
+        self.latencies = defaultdict(list)  # service -> ms
+        self.answered = defaultdict(set)  # service -> answered image ids
+        self.results = defaultdict(int)
+        self.lag_ms = []  # How far sends fell behind the schedule
+
+    def on_result(self, event, data):
+        service = RESULT_SERVICES.get(event)
+        if service is None:
+            return
+        if event == 'car_detected_delta' and isinstance(data, (bytes, bytearray)):
+            if msgpack is None:
+                self.results[service] += 1
+                return
+            data = msgpack.unpackb(data, raw=False)
+        if not isinstance(data, dict):
+            return
+        self.results[service] += 1
+        received = now_ms()
+        image_id = data.get('image_id', data.get('imageId'))
+        if event == 'violation_license_plate':
+            sent = self.sent_at.get(image_id)
+        else:
+            sent = data.get('created_at')
+        if sent is not None:
+            self.latencies[service].append(received - float(sent))
+        if image_id is not None:
+            self.answered[service].add(image_id)
+
+
+async def replay(args):
+    import socketio
+    from aiohttp import web
+
+    records = read_recording(args.recording)
+    schedule, duration = build_schedule(records, args.cameras, args.loops)
+    print(f"Loaded {len(records)} events; replaying {len(schedule)} events over {duration / 1000 / args.speed:.1f}s "
+          f"({args.cameras} cameras, {args.speed}x)")
+
+    sio = socketio.AsyncServer(async_mode='aiohttp', cors_allowed_origins='*',
+                               max_http_buffer_size=args.max_message_mb * 1024 * 1024)
+    app = web.Application()
+    sio.attach(app)
+    stats = ReplayStats()
+    connected = set()
+    clients_ready = asyncio.Event()
+
+    # Readiness counts connections: not every service joins the camera rooms (the license plate
+    # service only gets the broadcast violations, shard workers get their frames from the supervisor)
+    @sio.event
+    async def connect(sid, *_):
+        connected.add(sid)
+        print(f"Client {sid} connected ({len(connected)}/{args.clients})")
+        if len(connected) >= args.clients:
+            clients_ready.set()
+
+    @sio.event
+    async def disconnect(sid):
+        connected.discard(sid)
+
+    # Like the Node server, images go only to the clients that joined the camera rooms
+    @sio.event
+    async def join_all_camera(sid, *_):
+        await sio.enter_room(sid, CAMERA_ROOM)
+
+    for event in list(RESULT_SERVICES) + ['vehicle_crop']:
+        sio.on(event, lambda sid, data=None, event=event: stats.on_result(event, data))
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', args.port).start()
+    print(f"Stand-in server listening on ws://127.0.0.1:{args.port}, waiting for {args.clients} clients...")
+    try:
+        await asyncio.wait_for(clients_ready.wait(), timeout=args.wait)
+    except asyncio.TimeoutError:
+        print(f"Only {len(connected)}/{args.clients} clients connected after {args.wait}s; starting anyway")
+    await asyncio.sleep(args.settle)
+
+    metric_ports = [int(p) for p in args.metrics.split(',')] if args.metrics else []
+    before = {}
+    for port in metric_ports:
+        try:
+            before[port] = scrape_totals(port)
+        except OSError as e:
+            print(f"Could not read metrics on port {port}: {e}")
+
+    sequence = 0
+    start = time.perf_counter()
+    for t, event, data, camera_id in schedule:
+        delay = t / args.speed / 1000.0 - (time.perf_counter() - start)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        else:
+            stats.lag_ms.append(-delay * 1000)
+        sequence += 1
+        image_id = f'{camera_id}-{sequence}'
+        if event == 'image':
+            payload = dict(data, cameraId=camera_id, imageId=image_id, created_at=now_ms())
+        else:
+            payload = dict(data, camera_id=camera_id, image_id=image_id)
+            stats.sent_at[image_id] = now_ms()
+        await sio.emit(event, payload, room=CAMERA_ROOM if event == 'image' else None)
+        stats.sent[event] += 1
+    elapsed = time.perf_counter() - start
+
+    print(f"Sent {sum(stats.sent.values())} events in {elapsed:.1f}s, draining for {args.drain}s...")
+    await asyncio.sleep(args.drain)
+
+    after = {}
+    for port in before:
+        try:
+            after[port] = scrape_totals(port)
+        except OSError as e:
+            print(f"Could not read metrics on port {port}: {e}")
+    await runner.cleanup()
+
+    report(args, stats, elapsed, before, after)
+
+
+def report(args, stats, elapsed, before, after):
+    lag = sorted(stats.lag_ms)
+    print(f"\nReplay: {elapsed:.1f}s at {args.speed}x, {args.cameras} cameras, "
+          f"images sent: {stats.sent['image']}, violations sent: {stats.sent['violation_detect']}, "
+          f"send lag p95: {percentile(lag, 95):.1f}ms")
+    print(f"{'service':<15} {'results':>8} {'per s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'unanswered':>11}")
+    for service in ('vehicles', 'traffic light', 'license plate'):
+        sent = stats.sent['violation_detect'] if service == 'license plate' else stats.sent['image']
+        latencies = sorted(stats.latencies[service])
+        unanswered = 1.0 - len(stats.answered[service]) / sent if sent else 0.0
+        print(f"{service:<15} {stats.results[service]:>8} {stats.results[service] / elapsed:>8.1f} "
+              f"{percentile(latencies, 50):>8.1f} {percentile(latencies, 95):>8.1f} "
+              f"{percentile(latencies, 99):>8.1f} {100 * unanswered:>10.1f}%")
+
+    for port in after:
+        delta = {key: after[port].get(key, 0.0) - before[port].get(key, 0.0) for key in after[port]}
+        processed = delta.pop('processed', 0.0)
+        dropped = sum(delta.values())
+        total = processed + dropped
+        reasons = ', '.join(f"{key.split('.', 1)[1]}: {value:.0f}" for key, value in sorted(delta.items()) if value)
+        print(f"metrics :{port}  processed: {processed:.0f}, dropped: {dropped:.0f} "
+              f"({100 * dropped / total if total else 0.0:.1f}%){' (' + reasons + ')' if reasons else ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    p = commands.add_parser('record', help='Record events from the Node server')
+    p.add_argument('--url', default='wss://172.28.31.150:3000')
+    p.add_argument('--out', required=True)
+    p.add_argument('--seconds', type=float, default=300.0)
+    p.add_argument('--max-events', type=int, default=0, help='Stop after this many events (0: no limit)')
+
+    p = commands.add_parser('replay', help='Replay a recording into the services')
+    p.add_argument('recording')
+    p.add_argument('--port', type=int, default=3900)
+    p.add_argument('--speed', type=float, default=1.0, help='Playback speed multiplier')
+    p.add_argument('--cameras', type=int, default=4, help='Synthetic cameras')
+    p.add_argument('--loops', type=int, default=1, help='Times to play the recording')
+    p.add_argument('--clients', type=int, default=3,
+                   help='Socket.IO clients to wait for before starting (a sharded vehicle service opens one '
+                        'per worker plus one for the supervisor)')
+    p.add_argument('--wait', type=float, default=120.0, help='Seconds to wait for the clients before starting anyway')
+    p.add_argument('--settle', type=float, default=2.0, help='Seconds between the last client connecting and the start')
+    p.add_argument('--drain', type=float, default=5.0, help='Seconds to wait for results after the last event')
+    p.add_argument('--metrics', default='9100,9101,9102', help="Services' metrics ports ('' to skip)")
+    p.add_argument('--max-message-mb', type=int, default=16)
+
+    p = commands.add_parser('info', help='Summarize a recording')
+    p.add_argument('recording')
+
+    args = parser.parse_args()
+    if args.command == 'record':
+        asyncio.run(record(args))
+    elif args.command == 'replay':
+        asyncio.run(replay(args))
+    else:
+        info(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Static per-camera regions of interest applied before inference.
+
+A region is given in normalized (0-1) coordinates: two points for a box, three
+or more for a polygon. Only the bounding rectangle of the region is passed to
+the model, at an inference size no larger than that rectangle (rounded up to
+the model stride), so a small region costs proportionally less compute rather
+than being upscaled back to the full input size. Detections are shifted back to
+full-frame pixels, and for polygons those centered outside the polygon are
+dropped.
+"""
+import math
+
+import numpy as np
+
+from zones import PolygonZone, ZoneEngine
+
+MODEL_STRIDE = 32
+
+
+def inference_size(shape, max_size, stride=MODEL_STRIDE):
+    """Model input size for an image of `shape`: its long side rounded up to the stride, capped at max_size"""
+    long_side = max(shape[0], shape[1])
+    return int(min(max_size, max(stride, math.ceil(long_side / float(stride)) * stride)))
+
+
+class RegionOfInterest:
+    """Box or polygon region of one camera
+
+    Args:
+        points: [[x1, y1], [x2, y2]] box or 3+ polygon vertices in normalized coordinates
+    """
+
+    def __init__(self, points):
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if len(points) < 2:
+            raise ValueError("A region of interest needs at least 2 points")
+        self.points = points
+        self.engine = ZoneEngine(polygons=[PolygonZone('roi', points)]) if len(points) >= 3 else None
+        self.lower = np.clip(points.min(axis=0), 0.0, 1.0)
+        self.upper = np.clip(points.max(axis=0), 0.0, 1.0)
+        self._rects = {}  # (width, height) -> pixel rectangle
+
+    def rect(self, width, height):
+        """(x1, y1, x2, y2) pixel bounding rectangle of the region in a width x height frame"""
+        rect = self._rects.get((width, height))
+        if rect is None:
+            x1 = int(math.floor(self.lower[0] * width))
+            y1 = int(math.floor(self.lower[1] * height))
+            x2 = max(x1 + 1, int(math.ceil(self.upper[0] * width)))
+            y2 = max(y1 + 1, int(math.ceil(self.upper[1] * height)))
+            rect = (x1, y1, x2, y2)
+            self._rects[(width, height)] = rect
+        return rect
+
+    def crop(self, frame):
+        """View of the frame's region rectangle and its (x, y) offset in the frame"""
+        height, width = frame.shape[:2]
+        x1, y1, x2, y2 = self.rect(width, height)
+        return frame[y1:y2, x1:x2], (x1, y1)
+
+    def to_frame(self, detections, offset, width, height):
+        """Shift (N, 6+) crop-space xyxy detections to frame pixels and drop those centered outside a polygon"""
+        detections = detections.copy()
+        detections[:, [0, 2]] += offset[0]
+        detections[:, [1, 3]] += offset[1]
+        if self.engine is None or len(detections) == 0:
+            return detections
+        centers = (detections[:, :2] + detections[:, 2:4]) / 2 / np.array([width, height], dtype=np.float64)
+        return detections[self.engine.contains(centers)[:, 0]]
+
+
+def warmup_shapes(rois, frame_shapes):
+    """Frame shapes plus the crop shape of every region in each of them, without duplicates
+
+    The model sees these shapes in production (at inference_size of each), so they are the ones to warm up.
+    """
+    shapes = [tuple(shape) for shape in frame_shapes]
+    for height, width in frame_shapes:
+        for roi in rois.values():
+            x1, y1, x2, y2 = roi.rect(width, height)
+            shapes.append((y2 - y1, x2 - x1))
+    return list(dict.fromkeys(shapes))
+
+
+def load_rois(config):
+    """Build camera_id -> RegionOfInterest from a camera_id -> points config dict"""
+    return {camera_id: RegionOfInterest(points) for camera_id, points in config.items()}
@@ -1,325 +1,701 @@
+# Created before the heavy imports so the startup report can time them
+from startup import StartupReport, warm_up
+startup_report = StartupReport('vehicle detection')
+
 import cv2
+import os
 import numpy as np
 import time
 import threading
-import socketio
-import base64
 from ultralytics import YOLO
-import io
-from PIL import Image
 import queue
+from batch_scheduler import BatchScheduler
+from frame_decode import decode_frame
+from decode_pool import DecodePool, start_forwarder
+from frame_mailbox import FrameMailbox, print_mailbox_stats
+from motion_gate import MotionGate, print_motion_stats
+from roi import inference_size, load_rois, warmup_shapes
+from qos import QosController, print_qos_stats
+from metrics import REGISTRY, start_metrics_server, startup_collector
+from rate_log import RateLimitedLog
+from state_store import TTLStore, array_nbytes
+from service_runtime import ServiceRuntime
+from sharding import Shard, ShardSupervisor, configure_worker, worker_share
+from socket_emitter import DROP, LATEST, SocketEmitter, print_emitter_stats, register_emitter_metrics
+from tracker import FREE, CameraTracker
+from track_history import TrackHistory
+from payload_codec import DeltaEncoder, build_full_payload, flatten_counts
+from vehicle_crops import CropEmitter
+from zones import CameraZones, horizontal_line, parse_zones
+startup_report.mark('imports')
 
 # --- Configuration ---
 MODEL_PATH = 'yolo11n.pt'
 # MODEL_PATH = 'yolo11m.pt'
 
 CONFIDENCE_THRESHOLD = 0.5 
+MODEL_INPUT_SIZE = 640  # Large JPEGs are decoded at reduced scale down to this size
 VEHICLE_CLASSES = ['car', 'truck', 'bus', 'motorcycle', 'bicycle'] 
-SOCKETIO_SERVER_URL = 'wss://172.28.31.150:3000'
+SOCKETIO_SERVER_URL = os.environ.get('SOCKETIO_SERVER_URL', 'wss://172.28.31.150:3000')  # replay.py points it at a stand-in
 ENABLE_TRACKING = True 
+TRACKER_MAX_TRACKS = 128  # Preallocated track slots per camera
 ENABLE_GPU = True 
 
+# Cross-camera batching configuration
+BATCH_MAX_SIZE = 8  # Maximum frames (one per camera) per forward pass
+BATCH_MAX_WAIT_MS = 15  # Latency budget for filling a batch
+BATCH_STATS_INTERVAL = 30.0  # Seconds between batch statistics reports
+
+# Observability: Prometheus-style /metrics on localhost, per-frame logs at most once per LOG_INTERVAL
+ENABLE_METRICS = True
+METRICS_PORT = 9100
+LOG_INTERVAL = 5.0  # Seconds between two per-frame log lines of the same camera
+
+# Results are sent by a background thread; a slow socket coalesces updates instead of stalling inference
+OUTBOX_SIZE = 64  # Pending updates per event type (for 'car_detected': cameras with a pending update)
+
+# Warm-up run before joining the camera rooms
+WARMUP_FRAME_SHAPES = [(540, 960)]  # (height, width) of decoded frames; 1080p JPEGs decode at 1/2 scale
+WARMUP_ITERATIONS = 2  # Passes per shape and batch size
+
+# Decode worker processes (frames handed back through shared memory). Both are totals for the host:
+# with SHARD_WORKERS > 1 every shard worker gets its share, since each serves a share of the cameras.
+ENABLE_DECODE_POOL = True
+DECODE_WORKERS = 2
+DECODE_SLOTS = 32  # Each frame keeps its slot until post-processed or dropped: cover every camera's frames in flight
+DECODE_THREADS = 2  # Decode executor threads when the worker processes are disabled
+
+# Worker processes on one host, each handling a consistent-hash share of the cameras (1 = no sharding).
+# Only the supervisor process receives images and hands each to its camera's worker; every worker runs
+# its own model, decode pool and Socket.IO client (for results), and serves metrics on METRICS_PORT + index.
+SHARD_WORKERS = 1
+SHARD_THREADS = None  # torch/OpenMP threads per worker (None: CPUs // SHARD_WORKERS)
+SHARD_PIN_CPUS = False  # Pin each worker to its own contiguous set of CPUs
+SHARD_RESTART_DELAY = 2.0  # Seconds before a worker that exited is restarted
+SHARD_INBOX_SIZE = 8  # Encoded frames waiting per worker before the supervisor drops new ones
+
+# Per-camera frame mailboxes (newest frame wins)
+MAX_FRAME_AGE_MS = 1000  # Frames older than this are dropped instead of processed
+MAILBOX_STATS_INTERVAL = 30.0  # Seconds between per-camera drop/age reports
+
+# Motion gating: static frames skip inference and tracks advance by prediction
+ENABLE_MOTION_GATE = True
+MOTION_GATE_WIDTH = 160  # Width of the downscaled grayscale comparison image
+MOTION_PIXEL_THRESHOLD = 25  # Gray-level change for a pixel to count as moved
+MOTION_MIN_CHANGED_FRACTION = 0.002  # Fraction of moved pixels that triggers inference
+MOTION_MAX_SKIP_MS = 2000  # Run inference at least this often (frame time) even without motion
+
 # Add tracking-related configurations
 TRAIL_DURATION = 5.0 
 MAX_TRAIL_POINTS = 30 
+MAX_EMITTED_TRACKS = 20  # Most recently seen tracks sent with each update
+
+# Detection payload protocol: 'json' sends full 'car_detected' dicts,
+# 'delta' sends compact incremental updates as DELTA_EVENT (see payload_codec.py)
+PAYLOAD_MODE = 'json'
+DELTA_EVENT = 'car_detected_delta'
+DELTA_KEYFRAME_INTERVAL = 30  # Updates between full resyncs
 
 # Add counting line configuration
 ENABLE_COUNTING_LINE = True 
-COUNTING_LINE_POSITION = 0.5 
+COUNTING_LINE_POSITION = 0.5  # Used when an image event carries no track_line_y
 BIDIRECTIONAL_COUNTING = True 
 
-# Vehicle cropping configuration
-ENABLE_VEHICLE_CROPPING = True 
+# Bounded per-camera state: idle cameras release their worker, queues and state, per-track keys expire
+CAMERA_IDLE_TIMEOUT = 300.0  # Seconds without an image before a camera is reclaimed (None: never)
+CAMERA_REAP_INTERVAL = 30.0  # Seconds between idle camera checks
+COUNTED_CROSSING_TTL = 600.0  # Seconds (frame time) a counted crossing is remembered to prevent double counting
+MAX_COUNTED_CROSSINGS = 4096  # Counted crossings remembered per camera
+MAX_CROP_TIMESTAMPS = 1024  # Tracks with a crop timestamp per camera
+
+# Adaptive quality of service: each camera moves along QOS_LEVELS (most expensive first)
+# to keep its p95 event-to-result latency under QOS_TARGET_LATENCY_MS
+ENABLE_QOS = True
+QOS_TARGET_LATENCY_MS = 500
+QOS_INTERVAL = 5.0  # Seconds between adjustments (one camera moves one level per adjustment)
+QOS_LEVELS = [
+    {'max_fps': 30, 'imgsz': 640},
+    {'max_fps': 15, 'imgsz': 640},
+    {'max_fps': 15, 'imgsz': 480},
+    {'max_fps': 10, 'imgsz': 416},
+    {'max_fps': 5, 'imgsz': 320},
+]
+QOS_UPGRADE_MODEL_PATH = None  # e.g. 'yolo11m.pt': adds a top level cameras reach when there is headroom
+QOS_LINE_MARGIN = 0.05  # Tracks this close (normalized) to a counting line raise a camera's priority
+QOS_VIOLATION_HOLD = 30.0  # Seconds a violation raises a camera's priority
+
+# Per-camera road regions in normalized (0-1) image coordinates: [[x1, y1], [x2, y2]] for a box,
+# 3+ points for a polygon. Only the region's bounding rectangle is run through the model and
+# vehicles centered outside a polygon are ignored. Cameras not listed use the full frame.
+CAMERA_ROIS = {
+    # 'camera-id': [[0.0, 0.35], [1.0, 0.35], [1.0, 1.0], [0.0, 1.0]],
+}
+
+# Per-camera counting lines and polygon zones in normalized (0-1) image coordinates.
+# Line crossings from the left to the right of start->end count as 'down' (+1).
+# Cameras not listed count on one horizontal line at the track_line_y (percent of
+# image height) sent with each image event.
+CAMERA_ZONES = {
+    # 'camera-id': [
+    #     {'type': 'line', 'name': 'stop_line', 'points': [[0.1, 0.6], [0.9, 0.6]], 'directions': 'both'},
+    #     {'type': 'polygon', 'name': 'junction', 'points': [[0.2, 0.4], [0.8, 0.4], [0.9, 0.9], [0.1, 0.9]]},
+    # ],
+}
+
+# Vehicle cropping configuration. Off by default: nothing subscribes to CROP_EVENT yet (the Node
+# server has no handler to relay it and license_plate.py does not listen for it)
+ENABLE_VEHICLE_CROPPING = False
 CROP_EMIT_INTERVAL = 1.0 
 CROP_IMAGE_QUALITY = 85 
 CROP_MAX_SIZE = 300 
+CROP_MIN_SIZE = 24  # Vehicles smaller than this (pixels, either side) are not cropped
+CROP_WORKERS = 2  # Threads resizing and JPEG-encoding crops
+CROP_MAX_PENDING = 32  # Crops waiting for an encoder before new ones are dropped
+CROP_EVENT = 'vehicle_crop'
 
-# Initialize Socket.IO client
-sio = socketio.Client(reconnection=True, reconnection_attempts=0, reconnection_delay=1, reconnection_delay_max=5000, ssl_verify=False)
+# Event loop for Socket.IO I/O and scheduling; decoding runs on a bounded executor
+runtime = ServiceRuntime('vehicle detection', SOCKETIO_SERVER_URL, reconnect_delay=1, reconnect_delay_max=5)
+sio = runtime.sio
+decode_executor = runtime.executor('decode', max_workers=DECODE_THREADS, max_pending=DECODE_THREADS)
 print(f"Initializing Socket.IO client to connect to {SOCKETIO_SERVER_URL}")
 
 # Global variables
 running = True
 connected = False 
+camera_workers_lock = threading.Lock()
+shard = None  # This worker's Shard when running under the ShardSupervisor
+supervisor = None  # The ShardSupervisor, in the supervisor process only
 model = None
+models = {}  # Model path -> loaded model (MODEL_PATH and, when configured, QOS_UPGRADE_MODEL_PATH)
+class_names = []  # Class id -> name, indexed by id
+vehicle_class_mask = np.zeros(0, dtype=bool)  # Class id -> is a VEHICLE_CLASSES class
 last_frame_time = 0
 MAX_FPS = 30 
 
 # Dictionary to manage queues and threads for each camera
 camera_queues = {}
+camera_result_queues = {}
 camera_threads = {}
+camera_encoders = {}
+camera_motion_gates = {}
+camera_states = {}  # camera_id -> the post-processing thread's state, read by the memory gauges
+camera_rois = load_rois(CAMERA_ROIS)
+qos = None
+frame_log = RateLimitedLog(LOG_INTERVAL)
+
+# Metrics (read at scrape time where the value already lives elsewhere)
+stage_latency = REGISTRY.histogram(
+    'yolo_stage_latency_ms', 'Latency of each pipeline stage per camera in milliseconds', ('camera', 'stage'))
+frame_age = REGISTRY.histogram(
+    'yolo_frame_age_ms', 'Skew-corrected time from image event creation to emitted result', ('camera',))
+batch_size_histogram = REGISTRY.histogram(
+    'yolo_batch_size', 'Frames per batched inference call', buckets=tuple(range(1, BATCH_MAX_SIZE + 1)))
+frames_processed = REGISTRY.counter(
+    'yolo_frames_processed_total', 'Frames post-processed per camera, by whether the model ran', ('camera', 'inference'))
+
+def collect_dropped():
+    dropped = {}
+    for camera_id, mailbox in list(camera_queues.items()):
+        s = mailbox.stats()
+        dropped[(camera_id, 'superseded')] = s['superseded']
+        dropped[(camera_id, 'expired')] = s['expired']
+    if decode_pool is not None:
+        s = decode_pool.stats()
+        dropped[('all', 'decode_input_full')] = s['dropped_input']
+        dropped[('all', 'decode_no_slot')] = s['dropped_no_slot']
+        dropped[('all', 'decode_error')] = s['errors']
+    return dropped
 
-# Global variables for vehicle counting
-counted_vehicles = {} 
-vehicle_counts_up = {vehicle_type: 0 for vehicle_type in VEHICLE_CLASSES}
-vehicle_counts_down = {vehicle_type: 0 for vehicle_type in VEHICLE_CLASSES}
-total_counted_up = 0
-total_counted_down = 0
-
-# Actual counting line coordinates (will be set based on frame dimensions)
-counting_line_y = None
-counting_line_start_x = None
-counting_line_end_x = None
-
-# Function to check if a vehicle has crossed the counting line
-def check_line_crossing(prev_pos, curr_pos, line_y):
-    """Check if a vehicle has crossed the counting line between two positions"""
-    prev_y = prev_pos[1]
-    curr_y = curr_pos[1]
+def collect_queue_depth():
+    depth = {}
+    for camera_id, mailbox in list(camera_queues.items()):
+        depth[(camera_id, 'mailbox')] = mailbox.qsize()
+    for camera_id, result_queue in list(camera_result_queues.items()):
+        depth[(camera_id, 'results')] = result_queue.qsize()
+    if decode_pool is not None:
+        try:
+            depth[('all', 'decode_input')] = decode_pool.input_queue.qsize()
+        except NotImplementedError:
+            pass
+    return depth
+
+def collect_state_entries():
+    entries = {}
+    for camera_id, state in list(camera_states.items()):
+        entries[(camera_id, 'tracks')] = len(state['tracks'])
+        entries[(camera_id, 'crop_times')] = len(state['crop_times'])
+        if state['tracker'] is not None:
+            entries[(camera_id, 'tracker')] = int(np.count_nonzero(state['tracker'].state != FREE))
+        zones = state['zones']
+        if zones is not None:
+            entries[(camera_id, 'counted')] = len(zones.counted)
+            entries[(camera_id, 'zone_inside')] = len(zones.inside)
+    return entries
+
+def collect_state_bytes():
+    usage = {}
+    for camera_id, state in list(camera_states.items()):
+        mailbox = camera_queues.get(camera_id)
+        pending = mailbox.item[0].nbytes if mailbox is not None and mailbox.item is not None else 0
+        usage[(camera_id, )] = array_nbytes(state['tracks'], state['tracker']) + pending
+    return usage
+
+def collect_state_evicted():
+    evicted = {}
+    for camera_id, state in list(camera_states.items()):
+        stores = {'crop_times': state['crop_times']}
+        if state['zones'] is not None:
+            stores['counted'] = state['zones'].counted
+        for name, store in stores.items():
+            evicted[(camera_id, name, 'expired')] = store.expired
+            evicted[(camera_id, name, 'capacity')] = store.evicted
+    return evicted
+
+frames_dropped = REGISTRY.counter(
+    'yolo_frames_dropped_total', 'Frames dropped per camera and reason', ('camera', 'reason'), collect=collect_dropped)
+REGISTRY.gauge('yolo_queue_depth', 'Items waiting per camera and queue', ('camera', 'queue'), collect=collect_queue_depth)
+REGISTRY.gauge('yolo_camera_state_entries', 'Entries of per-camera tracking state', ('camera', 'state'),
+               collect=collect_state_entries)
+REGISTRY.gauge('yolo_camera_state_bytes', 'Bytes of per-camera arrays (track history, tracker, pending frame)',
+               ('camera',), collect=collect_state_bytes)
+REGISTRY.counter('yolo_camera_state_evicted_total', 'Per-track keys removed by TTL or size bound per camera',
+                 ('camera', 'store', 'reason'), collect=collect_state_evicted)
+REGISTRY.gauge('yolo_cameras_active', 'Cameras with a worker', collect=lambda: {(): len(camera_queues)})
+REGISTRY.counter('yolo_decode_oversized_total', 'Decoded frames pickled through a queue because they exceed a shared slot',
+                 collect=lambda: {(): decode_pool.stats()['oversized']} if decode_pool is not None else {})
+REGISTRY.gauge('yolo_decode_slots_lent', 'Shared frame slots held by frames not yet processed or dropped',
+               collect=lambda: {(): decode_pool.stats()['slots_lent']} if decode_pool is not None else {})
+cameras_reclaimed = REGISTRY.counter('yolo_cameras_reclaimed_total', 'Idle cameras whose worker and state were released')
+REGISTRY.gauge('yolo_startup_phase_seconds', 'Startup wall time per phase (imports, weight load, device move, warm-up)',
+               ('phase',), collect=startup_collector(startup_report))
+scheduler = None
+decode_pool = None
+crop_emitter = None
+
+def merge_car_detected(old, new):
+    """Keep the crossings of a superseded full payload, everything else is cumulative or per-frame"""
+    if old['new_crossings']:
+        new['new_crossings'] = old['new_crossings'] + new['new_crossings']
+    return new
+
+def request_keyframe(camera_id):
+    """A dropped delta update leaves a gap for the receiver; resync it with the next update"""
+    encoder = camera_encoders.get(camera_id)
+    if encoder is not None:
+        encoder.request_keyframe()
+
+emitter = SocketEmitter(runtime.send)
+emitter.register('car_detected', LATEST, maxsize=OUTBOX_SIZE, merge=merge_car_detected)
+emitter.register(DELTA_EVENT, DROP, maxsize=OUTBOX_SIZE, on_drop=request_keyframe)
+emitter.register(CROP_EVENT, DROP, maxsize=OUTBOX_SIZE)
+register_emitter_metrics(REGISTRY, emitter)
+
+def build_camera_zones(camera_id, track_line_y, previous=None):
+    """Create the counting lines/zones of a camera, keeping the counts of lines it already had"""
+    if camera_id in CAMERA_ZONES:
+        lines, polygons = parse_zones(CAMERA_ZONES[camera_id])
+    else:
+        position = track_line_y / 100.0 if track_line_y is not None else COUNTING_LINE_POSITION
+        line = horizontal_line('main', position)
+        if not BIDIRECTIONAL_COUNTING:
+            line.directions = 'forward'
+        lines, polygons = [line], []
+    zones = CameraZones(lines, polygons, VEHICLE_CLASSES, counted_ttl_ms=COUNTED_CROSSING_TTL * 1000,
+                        max_counted=MAX_COUNTED_CROSSINGS)
+    if previous is not None:
+        for name, counts in previous.line_counts.items():
+            if name in zones.line_counts:
+                zones.line_counts[name] = counts
+        zones.counted = previous.counted
+    return zones
+
+def create_tracker():
+    """Create an independent tracker so each camera keeps its own track state"""
+    # Static frames age tracks too; a track is kept through one full motion-gate skip window
+    track_buffer = 30 + (int(MOTION_MAX_SKIP_MS * 30 / 1000) if ENABLE_MOTION_GATE else 0)
+    return CameraTracker(max_tracks=TRACKER_MAX_TRACKS, frame_rate=MAX_FPS, track_buffer=track_buffer)
+
+def has_motion(item):
+    """Motion gate decision for a frame taken out of its mailbox for inference"""
+    camera_id = item[1]
+    gate = camera_motion_gates.get(camera_id) if camera_id is not None else None
+    if gate is None:
+        return True
+    # Motion outside the region of interest doesn't matter
+    roi = camera_rois.get(camera_id)
+    return gate.check(roi.crop(item[0])[0] if roi is not None else item[0], item[3])
+
+def infer_batch(camera_ids, items):
+    """Run batched forward passes over the newest frame of each camera, one per model and QoS input size
+
+    Returns one (N, 6) [x1, y1, x2, y2, conf, cls] NumPy array per frame, moved off the
+    device in a single copy so post-processing never touches tensors, or None for a
+    frame without motion.
+    """
+    # The gate sees only frames that reach inference, so a moving frame superseded in its
+    # mailbox never updates the background; static frames skip the model and get None
+    moving = [i for i, item in enumerate(items) if has_motion(item)]
+    results = [None] * len(items)
+    if not moving:
+        return results
+    
+    # Cameras with a region of interest only send its bounding rectangle to the model
+    groups = {}  # (model path, QoS input size) -> [(item index, model input, offset)]
+    for i in moving:
+        camera_id = items[i][1]
+        roi = camera_rois.get(camera_id)
+        if roi is not None:
+            crop, offset = roi.crop(items[i][0])
+        else:
+            crop, offset = items[i][0], None
+        level = qos.level(camera_id) if qos is not None and camera_id is not None else {}
+        key = (level.get('model', MODEL_PATH), min(MODEL_INPUT_SIZE, level.get('imgsz', MODEL_INPUT_SIZE)))
+        groups.setdefault(key, []).append((i, crop, offset))
+    
+    if camera_ids is not None:  # Warm-up passes None and stays out of the metrics
+        batch_size_histogram.observe(len(moving))
     
-    # Return direction: 1 for downward, -1 for upward, 0 for no crossing
-    if prev_y <= line_y and curr_y > line_y:
-        return 1  # Downward crossing
-    elif prev_y >= line_y and curr_y < line_y:
-        return -1  # Upward crossing
-    return 0  # No crossing
+    # One forward pass per model and QoS input size present in this batch, each no larger
+    # than its biggest input needs
+    for (model_path, max_size), members in groups.items():
+        imgsz = max(inference_size(crop.shape, max_size) for _, crop, _ in members)
+        start_time = time.time()
+        outputs = models.get(model_path, model)([crop for _, crop, _ in members], imgsz=imgsz, verbose=False)
+        group_ms = (time.time() - start_time) * 1000
+        per_frame_ms = group_ms / len(members)
+        for (i, _, offset), result in zip(members, outputs):
+            if items[i][1] is not None:
+                stage_latency.observe(group_ms, camera=items[i][1], stage='inference')
+            results[i] = result.boxes.data.cpu().numpy()
+            if offset is not None:
+                # Back to full-frame pixels, so normalization uses the full frame size
+                height, width = items[i][0].shape[:2]
+                results[i] = camera_rois[items[i][1]].to_frame(results[i], offset, width, height)
+            gate = camera_motion_gates.get(items[i][1])
+            if gate is not None:
+                gate.record_inference(per_frame_ms)
+    return results
+
+def select_vehicles(detections, tracker=None):
+    """Filter detections to confident vehicles and associate them with the camera's tracker
+
+    Args:
+        detections: (N, 6) [x1, y1, x2, y2, conf, cls] array from infer_batch, or None when
+            inference was skipped and the tracker's predicted boxes should be used
+        tracker: The camera's CameraTracker, or None when tracking is disabled
+
+    Returns:
+        boxes (K, 4) int xyxy, confidences (K,), class ids (K,) and track ids (K,) or None
+    """
+    if detections is None:
+        # Static frame: tracks advance by their motion model only
+        tracks = tracker.predict() if tracker is not None else np.zeros((0, 8), dtype=np.float32)
+        vehicles = tracks[:, [0, 1, 2, 3, 5, 6]]
+        track_ids = tracks[:, 4].astype(np.int64) if tracker is not None else None
+        keep = vehicles[:, 4] >= CONFIDENCE_THRESHOLD
+        vehicles = vehicles[keep]
+        if track_ids is not None:
+            track_ids = track_ids[keep]
+        return vehicles[:, :4].astype(np.int64), vehicles[:, 4], vehicles[:, 5].astype(np.int64), track_ids
+
+    vehicles = detections[vehicle_class_mask[detections[:, 5].astype(np.int64)]]
+
+    track_ids = None
+    if tracker is not None:
+        # The tracker also sees low-confidence vehicles for its second association round
+        tracks = tracker.update(vehicles[:, :4], vehicles[:, 4], vehicles[:, 5])
+        if len(tracks) > 0:
+            vehicles = tracks[:, [0, 1, 2, 3, 5, 6]]
+            track_ids = tracks[:, 4].astype(np.int64)
+
+    keep = vehicles[:, 4] >= CONFIDENCE_THRESHOLD
+    vehicles = vehicles[keep]
+    if track_ids is not None:
+        track_ids = track_ids[keep]
+    return vehicles[:, :4].astype(np.int64), vehicles[:, 4], vehicles[:, 5].astype(np.int64), track_ids
 
-# Global variables for vehicle image cropping
-last_vehicle_crop_times = {}  # Store last emission time for each vehicle ID
+def release_frame(item):
+    """Return a frame's shared-memory slot to the decode workers once it was processed or dropped"""
+    if decode_pool is not None:
+        decode_pool.release(item[0])
+
+def dispatch_result(camera_id, item, result, inference_time):
+    """Hand a batched result back to the camera's post-processing thread"""
+    result_queue = camera_result_queues.get(camera_id)
+    if result_queue is None:
+        release_frame(item)
+        return  # Camera reclaimed while its frame was in the batch
+    try:
+        result_queue.put((item, result, inference_time), block=False)
+    except queue.Full:
+        # Post-processing is behind, drop this result
+        release_frame(item)
+        frames_dropped.inc(camera=camera_id, reason='results_full')
+
+def start_camera_worker(cameraId):
+    """Create the frame/result queues and post-processing thread for a camera (caller holds camera_workers_lock)"""
+    camera_result_queues[cameraId] = queue.Queue(maxsize=10)
+    # Only the newest frame is kept; frame tuples carry created_at at index 3
+    camera_queues[cameraId] = FrameMailbox(
+        max_age_ms=MAX_FRAME_AGE_MS,
+        timestamp=lambda item: item[3],
+        on_deliver=lambda wait_ms, age_ms: stage_latency.observe(wait_ms, camera=cameraId, stage='queue_wait'),
+        on_discard=release_frame
+    )
+    if ENABLE_MOTION_GATE:
+        camera_motion_gates[cameraId] = MotionGate(
+            width=MOTION_GATE_WIDTH,
+            pixel_threshold=MOTION_PIXEL_THRESHOLD,
+            min_changed_fraction=MOTION_MIN_CHANGED_FRACTION,
+            max_skip_ms=MOTION_MAX_SKIP_MS
+        )
+    t = threading.Thread(target=process_frames_thread, args=(cameraId,), daemon=True)
+    camera_threads[cameraId] = t
+    t.start()
 
 def process_frames_thread(camera_id):
-    """Thread function to process frames for a specific camera"""
+    """Thread function to post-process batched inference results for a specific camera"""
     global running, model
     # Each camera will have its own tracking/counter state
-    vehicle_tracks = {}
-    counted_vehicles = {}
-    vehicle_counts_up = {vehicle_type: 0 for vehicle_type in VEHICLE_CLASSES}
-    vehicle_counts_down = {vehicle_type: 0 for vehicle_type in VEHICLE_CLASSES}
-    total_counted_up = 0
-    total_counted_down = 0
-    counting_line_y = None
-    counting_line_start_x = None
-    counting_line_end_x = None
-    last_vehicle_crop_times = {}
+    # Trail times are event created_at values (ms), so the history ages in frame time
+    vehicle_tracks = TrackHistory(max_tracks=TRACKER_MAX_TRACKS, max_points=MAX_TRAIL_POINTS, max_age=TRAIL_DURATION * 1000)
+    camera_zones = None
+    zones_line_y = None  # track_line_y the default counting line was built for
+    # A crop timestamp older than the crop interval no longer holds a crop back
+    last_vehicle_crop_times = TTLStore(CROP_EMIT_INTERVAL * 1000, MAX_CROP_TIMESTAMPS)
+    last_detections = np.zeros((0, 6), dtype=np.float32)  # Reused for static frames when tracking is off
+    tracker = create_tracker() if ENABLE_TRACKING else None
+    encoder = DeltaEncoder(class_names, DELTA_KEYFRAME_INTERVAL) if PAYLOAD_MODE == 'delta' else None
+    camera_encoders[camera_id] = encoder
+    state = {'tracks': vehicle_tracks, 'zones': None, 'crop_times': last_vehicle_crop_times, 'tracker': tracker}
+    camera_states[camera_id] = state
+    # Held directly, so a reclaimed camera's last frame can still finish
+    result_queue = camera_result_queues[camera_id]
+    mailbox = camera_queues[camera_id]
+    this_thread = threading.current_thread()
     print(f"Starting frame processing thread for camera {camera_id}")
     while running:
+        frame_data = None
         try:
-            try:
-                frame_data = camera_queues[camera_id].get(block=True, timeout=0.1)
-                if frame_data is None:
-                    time.sleep(0.01)
-                    continue
-            except queue.Empty:
-                continue
+            result_data = result_queue.get()
+            if camera_threads.get(camera_id) is not this_thread:
+                # Camera reclaimed while idle (or restarted with a new worker)
+                release_pending_results(result_data, result_queue)
+                break
+            if result_data is None:
+                continue  # Woken for shutdown
+            frame_data, detections, inference_time = result_data
+            post_process_start = time.time()
             frame, cameraId, imageId, created_at, track_line_y = frame_data
             # Skip processing if model isn't loaded
             if model is None:
                 time.sleep(0.01)
                 continue
                 
-            # Process the frame with YOLO tracking instead of detection
-            start_time = time.time()
-            results = model.track(frame, persist=True, verbose=False) if ENABLE_TRACKING else model(frame, verbose=False)
-            inference_time = (time.time() - start_time) * 1000  # Convert to milliseconds
-            
             height, width = frame.shape[:2]
             
-            # Initialize or update counting line coordinates if needed
-            if ENABLE_COUNTING_LINE and (counting_line_y is None or counting_line_start_x is None or counting_line_end_x is None):
-                counting_line_y = int(height * COUNTING_LINE_POSITION)
-                counting_line_start_x = 0
-                counting_line_end_x = width
-                print(f"[Camera {camera_id}] Counting line initialized at y={counting_line_y}")
+            # Initialize the counting lines, or move the default line when Node's track line changed
+            if ENABLE_COUNTING_LINE and (camera_zones is None or
+                                         (camera_id not in CAMERA_ZONES and track_line_y != zones_line_y)):
+                camera_zones = build_camera_zones(camera_id, track_line_y, camera_zones)
+                zones_line_y = track_line_y
+                state['zones'] = camera_zones
+                print(f"[Camera {camera_id}] Counting zones initialized: "
+                      f"lines {[line.name for line in camera_zones.lines]}, "
+                      f"polygons {[polygon.name for polygon in camera_zones.polygons]}")
             
-            # Process detection results
-            detected_objects = []
-            current_tracks = {}  # Store current positions for each track ID
+            # Static frames come without detections and cost no model time
+            skipped = detections is None
+            if skipped:
+                inference_time = 0.0
+                if tracker is None:
+                    detections = last_detections
+            else:
+                last_detections = detections
+            
+            # Detection ran batched across cameras; filtering and tracking run on arrays per camera
+            boxes, confidences, class_ids, track_ids = select_vehicles(detections, tracker)
+            
+            # Centers for tracking and normalized (0-1) boxes for the response, for all vehicles at once
+            centers = (boxes[:, :2] + boxes[:, 2:]) // 2
+            rel_boxes = boxes / np.array([width, height, width, height], dtype=np.float64)
+            rel_sizes = rel_boxes[:, 2:] - rel_boxes[:, :2]
+            names = [class_names[c] for c in class_ids.tolist()]
             
             # Vehicle count by type for display
+            type_counts = np.bincount(class_ids, minlength=len(class_names))
             vehicle_counts = {vehicle_type: 0 for vehicle_type in VEHICLE_CLASSES}
+            for c in np.flatnonzero(type_counts).tolist():
+                vehicle_counts[class_names[c]] = int(type_counts[c])
             
-            for result in results:
-                boxes = result.boxes
-                for box in boxes:
-                    confidence = float(box.conf[0])
-                    cls_id = int(box.cls[0])
-                    
-                    # Check if the detected object is a vehicle and meets confidence threshold
-                    if cls_id in model.names and model.names[cls_id] in VEHICLE_CLASSES and confidence >= CONFIDENCE_THRESHOLD:
-                        # Get bounding box coordinates
-                        x1, y1, x2, y2 = map(int, box.xyxy[0])
-                        
-                        # Calculate center point of the bounding box for tracking
-                        center_x = (x1 + x2) // 2
-                        center_y = (y1 + y2) // 2
-                        
-                        # Get track ID if available (for tracking)
-                        track_id = None
-                        if ENABLE_TRACKING and hasattr(box, 'id') and box.id is not None:
-                            try:
-                                track_id = int(box.id[0])
-                            except:
-                                track_id = None
-                        
-                        # Calculate relative coordinates (0-1 range)
-                        rel_x1 = x1 / width
-                        rel_y1 = y1 / height
-                        rel_x2 = x2 / width
-                        rel_y2 = y2 / height
-                        
-                        class_name = model.names[cls_id]
-                        
-                        # Add detection to results with track_id if available
-                        detection_info = {
-                            'class': class_name,
-                            'confidence': float(confidence),
-                            'bbox': {
-                                'x1': float(rel_x1),  # Normalized coordinates (0-1)
-                                'y1': float(rel_y1),
-                                'x2': float(rel_x2),
-                                'y2': float(rel_y2),
-                                'width': float(rel_x2 - rel_x1),
-                                'height': float(rel_y2 - rel_y1)
-                            }
-                        }
-
-                        # Add track_id if available
-                        if track_id is not None:
-                            detection_info['id'] = track_id
-                        
-                        detected_objects.append(detection_info)
-                        
-                        # Update vehicle count
-                        vehicle_counts[class_name] += 1
-                            
-                        if track_id is not None:
-                            # Add to current tracks
-                            current_tracks[track_id] = {
-                                'position': (center_x, center_y),
-                                'time': created_at,
-                                'class': class_name
-                            }
+            # Process detection results
+            detected_objects = [
+                {
+                    'class': name,
+                    'confidence': conf,
+                    'bbox': {
+                        'x1': rx1,  # Normalized coordinates (0-1)
+                        'y1': ry1,
+                        'x2': rx2,
+                        'y2': ry2,
+                        'width': rw,
+                        'height': rh
+                    }
+                }
+                for name, conf, (rx1, ry1, rx2, ry2), (rw, rh) in zip(
+                    names, confidences.tolist(), rel_boxes.tolist(), rel_sizes.tolist())
+            ]
             
-            # Update vehicle tracking history and check for line crossings
-            current_time = time.time()
-            new_crossings = []  # Track IDs of vehicles that just crossed the line with direction
+            if track_ids is not None:
+                for detection_info, track_id in zip(detected_objects, track_ids.tolist()):
+                    detection_info['id'] = track_id
             
-            # Update positions for existing tracks
-            for track_id, track_info in current_tracks.items():
-                current_position = track_info['position']
-                current_class = track_info['class']
-                
-                if track_id not in vehicle_tracks:
-                    vehicle_tracks[track_id] = []
-                
-                # Check for line crossing if we have previous positions and counting is enabled
-                if ENABLE_COUNTING_LINE and len(vehicle_tracks[track_id]) > 0 and counting_line_y is not None:
-                    prev_position = vehicle_tracks[track_id][-1]['position']
-                    
-                    # Check if and in which direction this vehicle has crossed the line
-                    crossing_direction = check_line_crossing(prev_position, current_position, counting_line_y)
-                    
-                    # If vehicle crossed the line in either direction
-                    if crossing_direction != 0:
-                        # For each track_id, we count once per direction
-                        crossing_key = f"{track_id}_{crossing_direction}"
-                        if crossing_key not in counted_vehicles:
-                            counted_vehicles[crossing_key] = True
-                            
-                            # Update the appropriate counter based on direction
-                            if crossing_direction == 1:  # Downward
-                                vehicle_counts_down[current_class] += 1
-                                total_counted_down += 1
-                                crossing_name = "down"
-                            else:  # Upward
-                                vehicle_counts_up[current_class] += 1
-                                total_counted_up += 1
-                                crossing_name = "up"
-                                
-                            # Add to list of new crossings for highlighting
-                            new_crossings.append((track_id, crossing_direction))
-                            print(f"[Camera {camera_id}] Vehicle {track_id} ({current_class}) crossed {crossing_name}. " +
-                                  f"Up: {total_counted_up}, Down: {total_counted_down}")
-                
-                # Add new position
-                vehicle_tracks[track_id].append({
-                    'position': current_position,
-                    'time': track_info['time'],
-                    'class': current_class
-                })
+            # Check every track against every line and zone at once, then extend the trails
+            current_time = created_at
+            new_crossings = []  # Track IDs of vehicles that just crossed a line with direction
+            zone_states = {}
+            if track_ids is not None and len(track_ids) > 0:
+                if camera_zones is not None:
+                    # Zones are normalized; positions without history are NaN and never cross.
+                    # Predicted positions of a static frame count no crossings.
+                    scale = np.array([width, height], dtype=np.float64)
+                    prev_points = vehicle_tracks.last_positions(track_ids.tolist()) / scale
+                    crossings, zone_states = camera_zones.update(
+                        track_ids, prev_points, centers / scale, names, now=created_at, predicted=skipped)
+                    total_up, total_down = camera_zones.totals()[:2]
+                    for track_id, crossing_direction, line_name, current_class in crossings:
+                        # Add to list of new crossings for highlighting
+                        new_crossings.append((track_id, crossing_direction))
+                        crossing_name = "down" if crossing_direction == 1 else "up"
+                        print(f"[Camera {camera_id}] Vehicle {track_id} ({current_class}) crossed {crossing_name} " +
+                              f"at {line_name}. Up: {total_up}, Down: {total_down}")
                 
-                # Keep only recent points within TRAIL_DURATION
-                vehicle_tracks[track_id] = [
-                    point for point in vehicle_tracks[track_id]
-                    if current_time - point['time'] <= TRAIL_DURATION
-                ]
-                
-                # Limit the number of points to prevent excessive memory use
-                if len(vehicle_tracks[track_id]) > MAX_TRAIL_POINTS:
-                    vehicle_tracks[track_id] = vehicle_tracks[track_id][-MAX_TRAIL_POINTS:]
+                # Add observed positions (the ring buffer drops the oldest beyond MAX_TRAIL_POINTS);
+                # predictions stay out, so the next crossing test starts from the last detection
+                if not skipped:
+                    for track_id, (x, y), class_id in zip(track_ids.tolist(), centers.tolist(), class_ids.tolist()):
+                        vehicle_tracks.append(track_id, x, y, created_at, class_id)
+            
+            # Clean up old tracks that are no longer seen within TRAIL_DURATION
+            if vehicle_tracks.expire(current_time) and camera_zones is not None:
+                camera_zones.forget(lambda track_id: track_id in vehicle_tracks)
+            if camera_zones is not None:
+                camera_zones.expire(current_time)
             
-            # Clean up old tracks that are no longer seen
-            for track_id in list(vehicle_tracks.keys()):
-                if not vehicle_tracks[track_id] or current_time - vehicle_tracks[track_id][-1]['time'] > TRAIL_DURATION:
-                    del vehicle_tracks[track_id]
+            # Latency and activity feed the QoS controller; tracks near a line keep this camera prioritized
+            if qos is not None:
+                qos.observe(camera_id, mailbox.age_of(created_at), inference_time)
+                if camera_zones is not None and track_ids is not None and len(track_ids) > 0:
+                    distances = camera_zones.engine.line_distances(centers / np.array([width, height], dtype=np.float64))
+                    qos.set_near_line(camera_id, int(np.count_nonzero(distances.min(axis=1, initial=np.inf) < QOS_LINE_MARGIN)))
+                else:
+                    qos.set_near_line(camera_id, 0)
+            
+            # Crossings summed over all of the camera's lines
+            if camera_zones is not None:
+                total_counted_up, total_counted_down, vehicle_counts_up, vehicle_counts_down = camera_zones.totals()
+                zone_summary = {'lines': camera_zones.line_counts, 'polygons': zone_states}
+            else:
+                total_counted_up = total_counted_down = 0
+                vehicle_counts_up = {vehicle_type: 0 for vehicle_type in VEHICLE_CLASSES}
+                vehicle_counts_down = {vehicle_type: 0 for vehicle_type in VEHICLE_CLASSES}
+                zone_summary = None
             
-            # Limit to 20 most recent vehicles
-            if len(vehicle_tracks) > 20:
-                # Sort vehicle tracks by the timestamp of their most recent position
-                sorted_tracks = sorted(
-                    vehicle_tracks.items(), 
-                    key=lambda x: x[1][-1]['time'] if x[1] else 0,
-                    reverse=True  # Newest first
+            # Most recently seen vehicles, newest first
+            recent_tracks = vehicle_tracks.recent(MAX_EMITTED_TRACKS, now=current_time)
+            
+            # Cut due vehicles out of the frame; resizing/encoding happens on the crop pool
+            if crop_emitter is not None and track_ids is not None:
+                crop_emitter.submit(
+                    last_vehicle_crop_times, frame, boxes, track_ids, class_ids, confidences, class_names,
+                    {'camera_id': cameraId, 'image_id': imageId, 'created_at': created_at}
                 )
-                
-                # Keep only the 20 most recent vehicles
-                vehicle_tracks = dict(sorted_tracks[:20])
+            last_vehicle_crop_times.expire(created_at)
                     
-            # Prepare response with detection results
-            response = {
-                'camera_id': cameraId,
-                'image_id': imageId,
-                'track_line_y': track_line_y,
-                'detections': detected_objects,
-                'inference_time': inference_time,
-                'image_dimensions': {
-                    'width': width,
-                    'height': height
-                },
-                'created_at': created_at,
-                'vehicle_count': {
-                    'total_up': total_counted_up,
-                    'total_down': total_counted_down,
-                    'by_type_up': vehicle_counts_up,
-                    'by_type_down': vehicle_counts_down,
-                    'current': vehicle_counts
-                },
-                'tracks': [
-                    {
-                        'id': track_id,
-                        'positions': [
-                            {'x': point['position'][0], 'y': point['position'][1], 'time': point['time']}
-                            for point in track_data
-                        ],
-                        'class': track_data[-1]['class'] if track_data else None
-                    }
-                    for track_id, track_data in vehicle_tracks.items() if track_data
-                ],
-                'new_crossings': [
-                    {'id': crossing[0], 'direction': crossing[1]}
-                    for crossing in new_crossings
-                ]
-            }
-
-            # Emit detection results back to the server
+            emit_start = time.time()
+            stage_latency.observe((emit_start - post_process_start) * 1000, camera=camera_id, stage='post_process')
+            frames_processed.inc(camera=camera_id, inference='skipped' if skipped else 'model')
+            
+            # Emit detection results back to the server; predicted marks boxes that are tracker estimates
             if len(detected_objects) > 0:
-                sio.emit('car_detected', response)
-            print(f"[Camera {camera_id}] Processed image, found {len(detected_objects)} vehicles, inference time: {inference_time:.2f}ms")
+                if encoder is not None:
+                    update = encoder.encode(
+                        cameraId, imageId, created_at, track_line_y, inference_time, width, height,
+                        rel_boxes, confidences, class_ids, track_ids, recent_tracks,
+                        flatten_counts(total_counted_up, total_counted_down, vehicle_counts_up, vehicle_counts_down),
+                        vehicle_counts, new_crossings, zones=zone_summary, predicted=skipped,
+                        track_epoch=tracker.epoch if tracker is not None else None
+                    )
+                    emitter.emit(DELTA_EVENT, update, key=cameraId)
+                else:
+                    emitter.emit('car_detected', build_full_payload(
+                        cameraId, imageId, track_line_y, detected_objects, inference_time, width, height,
+                        created_at, total_counted_up, total_counted_down, vehicle_counts_up,
+                        vehicle_counts_down, vehicle_counts, recent_tracks, new_crossings, class_names,
+                        zones=zone_summary, predicted=skipped,
+                        track_epoch=tracker.epoch if tracker is not None else None
+                    ), key=cameraId)
+                stage_latency.observe((time.time() - emit_start) * 1000, camera=camera_id, stage='emit')
+            frame_age.observe(mailbox.age_of(created_at), camera=camera_id)
             
-            # Display vehicle count summary
-            if detected_objects:
-                count_summary = ", ".join([f"{count} {v_type}{'s' if count != 1 else ''}" 
-                                         for v_type, count in vehicle_counts.items() if count > 0])
-                print(f"[Camera {camera_id}] Vehicle counts: {count_summary}")
+            # Per-frame summary, at most one line per camera every LOG_INTERVAL
+            frame_log.log(
+                'frame_processed', key=camera_id, camera=camera_id, vehicles=len(detected_objects),
+                inference_ms=inference_time, up=total_counted_up, down=total_counted_down,
+                counts=",".join(f"{v_type}:{count}" for v_type, count in vehicle_counts.items() if count > 0)
+            )
                     
         except Exception as e:
             print(f"[Camera {camera_id}] Error in processing thread: {e}")
             time.sleep(0.1)  # Prevent tight loop if there's an error
+        finally:
+            # Crops were copied out, nothing refers to the frame any more
+            if frame_data is not None:
+                release_frame(frame_data)
     
     print(f"[Camera {camera_id}] Frame processing thread stopped")
 
+def release_pending_results(result_data, result_queue):
+    """Release the frames of a reclaimed camera's undelivered results"""
+    while True:
+        if result_data is not None:
+            release_frame(result_data[0])
+        try:
+            result_data = result_queue.get_nowait()
+        except queue.Empty:
+            return
+
+def reclaim_idle_cameras():
+    """Release the worker, queues and state of cameras without an image for CAMERA_IDLE_TIMEOUT (on the loop)"""
+    with camera_workers_lock:
+        idle = [camera_id for camera_id, mailbox in camera_queues.items()
+                if mailbox.qsize() == 0 and mailbox.idle_seconds() >= CAMERA_IDLE_TIMEOUT]
+        for camera_id in idle:
+            # The mailbox goes first, so the scheduler stops batching the camera
+            mailbox = camera_queues.pop(camera_id)
+            try:
+                release_frame(mailbox.get(block=False))  # A frame put since the idle check
+            except queue.Empty:
+                pass
+            result_queue = camera_result_queues.pop(camera_id)
+            del camera_threads[camera_id]
+            camera_encoders.pop(camera_id, None)
+            camera_motion_gates.pop(camera_id, None)
+            camera_states.pop(camera_id, None)
+            try:
+                result_queue.put_nowait(None)  # Wakes the thread, which sees it was reclaimed
+            except queue.Full:
+                pass  # The thread is busy and checks after its current result
+    for camera_id in idle:
+        if qos is not None:
+            qos.forget(camera_id)
+        frame_log.forget(camera_id)
+        REGISTRY.forget('camera', camera_id)
+        cameras_reclaimed.inc()
+        print(f"[Camera {camera_id}] No images for {CAMERA_IDLE_TIMEOUT:.0f}s, worker and state released")
+
 def load_model():
-    global model
+    global model, scheduler, class_names, vehicle_class_mask, qos
     print(f"Loading YOLO model: {MODEL_PATH}")
     try:
         # Check for tracking dependencies if tracking is enabled
@@ -350,52 +726,146 @@ def load_model():
             except Exception as e:
                 print(f"Error checking GPU: {e}. Falling back to CPU.")
 
+        startup_report.mark('device check')
+
         # Load the model with the selected device
         print(f"Loading model on device: {device}")
         model = YOLO(MODEL_PATH)
+        startup_report.mark('weight load')
         model.to(device)
+        models[MODEL_PATH] = model
+        if ENABLE_QOS and QOS_UPGRADE_MODEL_PATH:
+            # Same classes as MODEL_PATH, used for cameras with latency to spare
+            print(f"Loading QoS upgrade model: {QOS_UPGRADE_MODEL_PATH}")
+            models[QOS_UPGRADE_MODEL_PATH] = YOLO(QOS_UPGRADE_MODEL_PATH)
+            models[QOS_UPGRADE_MODEL_PATH].to(device)
+        startup_report.mark('device move')
         print(f"Model loaded successfully! Running on: {device}")
         print(f"Available classes: {model.names}")
         
+        # Precompute class-id lookups used by the vectorized post-processing
+        class_names = [model.names.get(i, str(i)) for i in range(max(model.names) + 1)]
+        vehicle_class_mask = np.array([name in VEHICLE_CLASSES for name in class_names], dtype=bool)
+        
         # Print vehicle classes that will be detected
-        vehicle_class_ids = [id for id, name in model.names.items() if name in VEHICLE_CLASSES]
+        vehicle_class_ids = np.flatnonzero(vehicle_class_mask).tolist()
         print(f"Vehicle classes to detect (class IDs): {vehicle_class_ids}")
         print(f"Vehicle class names: {[model.names[id] for id in vehicle_class_ids]}")
         
-        # Start the processing thread
-        for cameraId in camera_queues.keys():
-            t = threading.Thread(target=process_frames_thread, args=(cameraId,), daemon=True)
-            camera_threads[cameraId] = t
-            t.start()
-        print("Frame processing threads started")
+        # Start the cross-camera batch scheduler
+        scheduler = BatchScheduler(
+            camera_queues,
+            infer_batch,
+            dispatch_result,
+            max_batch_size=BATCH_MAX_SIZE,
+            max_wait_ms=BATCH_MAX_WAIT_MS,
+            stats_interval=BATCH_STATS_INTERVAL,
+            discard_fn=release_frame
+        )
+        scheduler.start()
+        print("Batch scheduler started")
+        
+        # Latency-driven per-camera frame rate / input size / model levels
+        if ENABLE_QOS:
+            levels = list(QOS_LEVELS)
+            if QOS_UPGRADE_MODEL_PATH:
+                levels.insert(0, dict(QOS_LEVELS[0], model=QOS_UPGRADE_MODEL_PATH))
+            qos = QosController(
+                levels,
+                target_latency_ms=QOS_TARGET_LATENCY_MS,
+                start_level=1 if QOS_UPGRADE_MODEL_PATH else 0,
+                violation_hold=QOS_VIOLATION_HOLD
+            )
             
         return True
     except Exception as e:
         print(f"Failed to load model: {e}")
         return False
 
+def warm_up_model():
+    """Run every batch size the scheduler can form, and the per-camera post-processing, once before serving"""
+    batch_sizes = sorted({min(2 ** i, BATCH_MAX_SIZE) for i in range(BATCH_MAX_SIZE.bit_length())})
+    # Region crops are passed as whole frames, so infer_batch runs them at their own inference size
+    shapes = warmup_shapes(camera_rois, WARMUP_FRAME_SHAPES)
+    print(f"Warming up model (shapes: {shapes}, batch sizes: {batch_sizes})...")
+    warm_up(
+        lambda frames: infer_batch(None, [(frame, None, None, 0, None) for frame in frames]),
+        shapes,
+        batch_sizes=batch_sizes,
+        iterations=WARMUP_ITERATIONS
+    )
+    
+    # Every other model and input size the QoS levels can switch a camera to
+    if qos is not None:
+        for level in qos.levels:
+            imgsz = min(MODEL_INPUT_SIZE, level.get('imgsz', MODEL_INPUT_SIZE))
+            model_path = level.get('model', MODEL_PATH)
+            if imgsz != MODEL_INPUT_SIZE or model_path != MODEL_PATH:
+                warm_up(lambda frames: models[model_path](frames, imgsz=imgsz, verbose=False),
+                        WARMUP_FRAME_SHAPES, iterations=WARMUP_ITERATIONS, label=f'{model_path} @ {imgsz}')
+
+    # Tracker association and zone tests on synthetic detections
+    vehicle_class = int(np.flatnonzero(vehicle_class_mask)[0]) if vehicle_class_mask.any() else 0
+    height, width = WARMUP_FRAME_SHAPES[0]
+    tracker = create_tracker() if ENABLE_TRACKING else None
+    zones = build_camera_zones(None, None)
+    boxes = np.array([[100, 100, 200, 180], [300, 120, 420, 220]], dtype=np.float64)
+    for step in range(3):
+        detections = np.zeros((len(boxes), 6))
+        detections[:, :4] = boxes + step * 10
+        detections[:, 4] = 0.9
+        detections[:, 5] = vehicle_class
+        boxes_int, _, class_ids, track_ids = select_vehicles(detections, tracker)
+        if track_ids is not None:
+            centers = (boxes_int[:, :2] + boxes_int[:, 2:]) / 2 / np.array([width, height])
+            zones.update(track_ids, centers - 0.01, centers, [class_names[c] for c in class_ids.tolist()])
+    startup_report.mark('warm-up')
+
 @sio.event
-def connect():
+async def connect():
     global connected
     connected = True
+    emitter.set_connected(True)
     print(f"Successfully connected to Socket.IO server: {SOCKETIO_SERVER_URL}")
     print("Waiting for 'image' events...")
 
-    sio.emit("join_all_camera")
+    # Receivers of delta updates need a full resync after a reconnect
+    for encoder in list(camera_encoders.values()):
+        if encoder is not None:
+            encoder.request_keyframe()
+
+    # Shard workers get their frames from the supervisor, so only it joins the camera rooms
+    if shard is None:
+        await sio.emit("join_all_camera")
+    else:
+        shard.join()
 
 @sio.event
-def connect_error(error):
+async def connect_error(error):
     print(f"Connection error: {error}")
 
 @sio.event
-def disconnect():
+async def disconnect():
     global connected
     connected = False
+    emitter.set_connected(False)
+    # Other workers take this worker's cameras until it is back
+    if shard is not None:
+        shard.leave()
     print("Disconnected from Socket.IO server")
     print("Will attempt to reconnect automatically...")
 
+@sio.on('violation_detect')
+async def on_violation(data):
+    """Keep cameras with a recent violation at full quality for longer"""
+    camera_id = data.get('camera_id') if isinstance(data, dict) else None
+    if shard is not None and not shard.owns(camera_id):
+        return
+    if qos is not None and camera_id is not None:
+        qos.mark_violation(camera_id)
+
 @sio.on('image')
-def on_image(data):
+async def on_image(data):
     global last_frame_time
     
     image = data['buffer']
@@ -404,104 +874,194 @@ def on_image(data):
     created_at = data['created_at']
     track_line_y = data['track_line_y']
     
+    # The supervisor only hands the encoded buffer to the worker owning the camera
+    if supervisor is not None:
+        supervisor.dispatch(cameraId, (cameraId, imageId, image, (created_at, track_line_y)))
+        return
+    
     try:
-        # Convert image data from buffer to numpy array
-        if isinstance(image, dict) and 'image' in image:
-            # If data is a dictionary with 'image' key
-            image_data = image['image']
-        else:
-            # If data is directly the image buffer
-            image_data = image
-        
-        # Convert the received image data to numpy array
-        if isinstance(image_data, str):
-            # If it's a base64 encoded string
-            image_bytes = base64.b64decode(image_data)
-        else:
-            # If it's already a binary
-            image_bytes = image_data
-        
-        # Convert bytes to image
-        try:
-            image = Image.open(io.BytesIO(image_bytes))
-            # Convert PIL image to OpenCV format (RGB to BGR)
-            frame = np.array(image)
-            frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-        except Exception as e:
-            print(f"Error decoding image: {e}")
+        # Hand the encoded buffer to the decode workers so decoding never holds this process's GIL
+        if decode_pool is not None:
+            decode_pool.submit(cameraId, imageId, image, (created_at, track_line_y))
             return
-        
-        # Get frame dimensions
-        height, width = frame.shape[:2]
-        
-        # # Resize the frame if it's too large to save memory
-        # max_dimension = 1920 # Maximum dimension to process
-        # if width > max_dimension or height > max_dimension:
-        #     scale = max_dimension / max(width, height)
-        #     frame = cv2.resize(frame, (int(width * scale), int(height * scale)))
-        
-        # Create queue and thread for new cameraId if not exist
-        if cameraId not in camera_queues:
-            camera_queues[cameraId] = queue.Queue(maxsize=10)
-            t = threading.Thread(target=process_frames_thread, args=(cameraId,), daemon=True)
-            camera_threads[cameraId] = t
-            t.start()
-        
-        # Add the frame to the model processing queue
-        try:
-            camera_queues[cameraId].put((frame.copy(), cameraId, imageId, created_at, track_line_y), block=False)
-        except queue.Full:
-            # If model queue is full, just discard this frame for processing
-            pass
+
+        # Decoding is behind; the mailbox would only keep the newest frame anyway
+        if decode_executor.full():
+            frames_dropped.inc(camera=cameraId, reason='decode_busy')
+            return
+        await decode_executor.run(decode_and_enqueue, cameraId, imageId, image, (created_at, track_line_y))
     
     except Exception as e:
         print(f"Error processing image: {e}")
 
-def maintain_connection():
-    """Thread to manage Socket.IO connection and auto-reconnect"""
-    global connected, running
-    
+def read_inbox():
+    """Decode the frames the supervisor dispatched to this shard worker (decode worker processes disabled)"""
     while running:
+        task = shard.inbox.get()
+        if task is not None:
+            decode_and_enqueue(*task)
+
+def decode_and_enqueue(cameraId, imageId, image, meta):
+    """Decode on the decode executor and queue the frame (used when the decode worker processes are disabled)"""
+    # Decode straight to BGR (at reduced scale for frames much larger than the model input)
+    try:
+        decode_start = time.time()
+        frame = decode_frame(image, target_size=MODEL_INPUT_SIZE)
+        stage_latency.observe((time.time() - decode_start) * 1000, camera=cameraId, stage='decode')
+    except Exception as e:
+        print(f"Error decoding image: {e}")
+        return
+    
+    enqueue_frame(cameraId, imageId, frame, meta)
+
+def enqueue_frame(cameraId, imageId, frame, meta):
+    """Queue a decoded frame for batched inference"""
+    created_at, track_line_y = meta
+
+    # Create queues and post-processing thread for new cameraId if not exist
+    mailbox = camera_queues.get(cameraId)
+    if mailbox is None:
+        with camera_workers_lock:
+            if cameraId not in camera_queues:
+                start_camera_worker(cameraId)
+            mailbox = camera_queues[cameraId]
+    
+    # Frames above the camera's current QoS frame rate are dropped before any work is done
+    if qos is not None and not qos.admit(cameraId, created_at):
+        release_frame((frame,))
+        frames_dropped.inc(camera=cameraId, reason='qos_throttled')
+        return
+    
+    # Replace any unprocessed frame from this camera with the newest one. Static frames go through
+    # the mailbox and scheduler too (the motion gate runs in infer_batch), so results stay in frame order
+    mailbox.put((frame, cameraId, imageId, created_at, track_line_y))
+    if scheduler is not None:
+        scheduler.notify()
+
+def emit_vehicle_crop(crop):
+    """Queue one encoded vehicle crop for sending (called from the crop encoder threads)"""
+    emitter.emit(CROP_EVENT, crop, key=crop.get('camera_id'))
+
+def print_stats():
+    print_mailbox_stats(camera_queues)
+    print_motion_stats(camera_motion_gates)
+    print_emitter_stats(emitter)
+    if qos is not None:
+        print_qos_stats(qos)
+    if crop_emitter is not None:
+        c = crop_emitter.stats()
+        print(f"[CropEmitter] crops emitted: {c['emitted']}, dropped: {c['dropped']}, "
+              f"errors: {c['errors']}, pending: {c['pending']}")
+
+def shutdown():
+    """Stop the worker threads and processes (runtime shutdown hook, the loop can still send)"""
+    global running
+    running = False
+    if scheduler is not None:
+        scheduler.stop()
+    if decode_pool is not None:
+        decode_pool.stop()
+    if crop_emitter is not None:
+        crop_emitter.stop(wait=False)
+    emitter.stop()
+    # Wake post-processing threads blocked on their result queues
+    for result_queue in list(camera_result_queues.values()):
         try:
-            if not connected:
-                try:
-                    print(f"Attempting to connect to Socket.IO server at {SOCKETIO_SERVER_URL}...")
-                    sio.connect(SOCKETIO_SERVER_URL, transports=['websocket'], wait=False)
-                except Exception as e:
-                    print(f"Failed to connect: {e}")
-                    time.sleep(5)  # Wait before retry
-            time.sleep(1)  # Check connection status periodically
-        except Exception as e:
-            print(f"Connection manager error: {e}")
-            time.sleep(1)
+            result_queue.put_nowait(None)
+        except queue.Full:
+            pass
 
 def main():
-    global running
+    global running, decode_pool, crop_emitter
+    
+    # Start decode workers first, before the model and its threads exist. A shard worker's decode
+    # workers read the encoded frames straight from its inbox.
+    if ENABLE_DECODE_POOL:
+        shard_count = SHARD_WORKERS if shard is not None else 1
+        decode_pool = DecodePool(
+            workers=worker_share(DECODE_WORKERS, shard_count),
+            slots=worker_share(DECODE_SLOTS, shard_count),
+            target_size=MODEL_INPUT_SIZE,
+            on_decode=lambda camera_id, decode_ms: stage_latency.observe(decode_ms, camera=camera_id, stage='decode'),
+            input_queue=shard.inbox if shard is not None else None
+        )
+        decode_pool.start()
+        start_forwarder(decode_pool, enqueue_frame, lambda: running)
+        startup_report.mark('decode workers')
+    elif shard is not None:
+        threading.Thread(target=read_inbox, daemon=True).start()
     
     # Load YOLO model
     if not load_model():
         print("Failed to load model. Exiting...")
+        if decode_pool is not None:
+            decode_pool.stop()
         return
     
-    # Start connection manager thread
-    connection_thread = threading.Thread(target=maintain_connection, daemon=True)
-    connection_thread.start()
-    print("Connection manager started")
+    # Pay lazy initialization now rather than on the first frame of every camera
+    warm_up_model()
+    startup_report.print()
     
-    # Keep the main thread running
-    try:
-        while running:
-            time.sleep(1)
-    except KeyboardInterrupt:
-        print("Interrupted by user. Shutting down...")
-    finally:
-        running = False
+    if ENABLE_METRICS:
+        metrics_port = METRICS_PORT + (shard.index if shard is not None else 0)
         try:
-            if sio.connected:
-                sio.disconnect()
-        except Exception as e:
-            print(f"Error during disconnect: {e}")
-        print("Server stopped.")
+            start_metrics_server(metrics_port)
+        except OSError as e:
+            print(f"Could not start metrics endpoint on port {metrics_port}: {e}")
+    
+    emitter.start()
+    
+    # Background encoder for per-vehicle crops
+    if ENABLE_VEHICLE_CROPPING:
+        crop_emitter = CropEmitter(
+            emit_vehicle_crop,
+            interval_ms=CROP_EMIT_INTERVAL * 1000,
+            quality=CROP_IMAGE_QUALITY,
+            max_size=CROP_MAX_SIZE,
+            min_size=CROP_MIN_SIZE,
+            workers=CROP_WORKERS,
+            max_pending=CROP_MAX_PENDING
+        )
+        print(f"Vehicle cropping enabled (one crop per vehicle every {CROP_EMIT_INTERVAL}s)")
+    
+    # Connection, reconnects, QoS steps and statistics all run on the runtime's event loop
+    runtime.every(MAILBOX_STATS_INTERVAL, print_stats)
+    if CAMERA_IDLE_TIMEOUT:
+        runtime.every(CAMERA_REAP_INTERVAL, reclaim_idle_cameras)
+    if qos is not None:
+        runtime.every(QOS_INTERVAL, qos.step)
+        print(f"[QoS] Controller started (target p95 latency: {QOS_TARGET_LATENCY_MS}ms, "
+              f"{len(qos.levels)} levels, step every {QOS_INTERVAL}s)")
+    runtime.on_shutdown(shutdown)
+    runtime.run()
+    print("Server stopped.")
+
+def run_shard_worker(index, membership, inbox, threads, cpus):
+    """Worker process entry point under the ShardSupervisor"""
+    global shard
+    configure_worker(index, threads, cpus)
+    shard = Shard(index, membership, inbox)
+    main()
+
+def run_supervisor():
+    """Start the shard workers, then receive every image once and dispatch it to its camera's worker"""
+    global supervisor
+    supervisor = ShardSupervisor(
+        run_shard_worker,
+        SHARD_WORKERS,
+        threads=SHARD_THREADS,
+        pin_cpus=SHARD_PIN_CPUS,
+        restart_delay=SHARD_RESTART_DELAY,
+        inbox_size=SHARD_INBOX_SIZE
+    )
+    supervisor.start()
+    runtime.every(MAILBOX_STATS_INTERVAL, supervisor.print_stats)
+    runtime.on_shutdown(supervisor.stop)
+    runtime.run()
+    print("Supervisor stopped.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    if SHARD_WORKERS > 1:
+        run_supervisor()
+    else:
+        main()
\ No newline at end of file
@@ -0,0 +1,195 @@
+"""Shared asyncio runtime for the Socket.IO services.
+
+One event loop per service owns the network side: a socketio.AsyncClient that
+connects with exponential backoff and then relies on the client's own
+reconnection, event handlers running as coroutines, and periodic jobs
+(statistics) scheduled on the loop instead of in sleeping threads.
+
+CPU-bound work (decoding, inference, OCR) runs on BoundedExecutors: thread
+pools with a cap on work in flight, so a stage that falls behind is visible
+(full()) and its producer can drop instead of growing an unbounded queue.
+Nothing polls; stages wait on queues, events or futures. Threads that are not
+on the loop (batch scheduler, decode forwarder, socket emitter) hand work to it
+with call_soon() and send().
+"""
+import asyncio
+import concurrent.futures
+import signal
+
+import socketio
+
+
+class BoundedExecutor:
+    """Thread pool for coroutines with at most max_workers running and max_pending waiting
+
+    Args:
+        name: Thread name prefix
+        max_workers: Threads running tasks
+        max_pending: Tasks allowed to wait for a thread before full() is True
+    """
+
+    def __init__(self, name, max_workers=1, max_pending=0):
+        self.name = name
+        self.max_workers = max_workers
+        self.capacity = max_workers + max_pending
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self.slots = asyncio.Semaphore(max_workers)
+        self.in_flight = 0
+        self.completed = 0
+
+    def full(self):
+        """True if another task would exceed max_workers + max_pending"""
+        return self.in_flight >= self.capacity
+
+    async def run(self, fn, *args):
+        """Run fn(*args) on the pool and return its result; waits on the loop for a free thread"""
+        self.in_flight += 1
+        try:
+            async with self.slots:
+                return await asyncio.get_running_loop().run_in_executor(self.pool, fn, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+class ServiceRuntime:
+    """Event loop, Socket.IO client and executors of one service
+
+    Args:
+        name: Service name used in log lines
+        url: Socket.IO server URL
+        reconnect_delay: Delay after the first failed connection attempt in seconds
+        reconnect_delay_max: Longest delay between attempts (doubles up to this)
+        send_timeout: Seconds send() waits for an emit from another thread to complete
+    """
+
+    def __init__(self, name, url, reconnect_delay=1, reconnect_delay_max=5, send_timeout=10.0):
+        self.name = name
+        self.url = url
+        self.reconnect_delay = reconnect_delay
+        self.reconnect_delay_max = reconnect_delay_max
+        self.send_timeout = send_timeout
+        self.sio = socketio.AsyncClient(
+            reconnection=True,
+            reconnection_attempts=0,  # Infinite retries
+            reconnection_delay=reconnect_delay,
+            reconnection_delay_max=reconnect_delay_max,
+            ssl_verify=False
+        )
+        self.executors = {}
+        self.coroutines = []  # Long-running coroutine functions started by run()
+        self.periodic = []  # (interval, fn)
+        self.shutdown_hooks = []
+        self.loop = None
+        self.stopping = None
+
+    def executor(self, name, max_workers=1, max_pending=0):
+        """Create (or return the existing) BoundedExecutor called name"""
+        if name not in self.executors:
+            self.executors[name] = BoundedExecutor(name, max_workers, max_pending)
+        return self.executors[name]
+
+    def task(self, coroutine_fn, *args):
+        """Run coroutine_fn(*args) on the loop for the lifetime of the service"""
+        self.coroutines.append((coroutine_fn, args))
+
+    def every(self, interval, fn):
+        """Call fn() on the loop every interval seconds"""
+        self.periodic.append((interval, fn))
+
+    def on_shutdown(self, fn):
+        """Call fn() from a worker thread while the loop can still send, latest registered first"""
+        self.shutdown_hooks.append(fn)
+
+    def call_soon(self, fn, *args):
+        """Schedule fn(*args) on the loop; safe from any thread"""
+        self.loop.call_soon_threadsafe(fn, *args)
+
+    def send(self, event, data):
+        """Emit from a thread outside the loop, blocking that thread until the message is written"""
+        future = asyncio.run_coroutine_threadsafe(self.sio.emit(event, data), self.loop)
+        return future.result(self.send_timeout)
+
+    def stop(self):
+        """Ask run() to shut down; safe from any thread"""
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.stopping.set)
+
+    async def _connection(self):
+        delay = self.reconnect_delay
+        while not self.stopping.is_set():
+            try:
+                print(f"Attempting to connect to Socket.IO server at {self.url}...")
+                await self.sio.connect(self.url, transports=['websocket'])
+            except Exception as e:
+                print(f"Failed to connect: {e}")
+                try:
+                    await asyncio.wait_for(self.stopping.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                delay = min(delay * 2, self.reconnect_delay_max)
+                continue
+            delay = self.reconnect_delay
+            # Returns only once the client has given up reconnecting on its own
+            await self.sio.wait()
+
+    async def _every(self, interval, fn):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                fn()
+            except Exception as e:
+                print(f"[{self.name}] Error in periodic task {getattr(fn, '__name__', fn)}: {e}")
+
+    async def _guard(self, coroutine_fn, args):
+        try:
+            await coroutine_fn(*args)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[{self.name}] {coroutine_fn.__name__} stopped with an error: {e}")
+            self.stopping.set()
+
+    async def _main(self):
+        self.loop = asyncio.get_running_loop()
+        self.stopping = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                self.loop.add_signal_handler(sig, self.stopping.set)
+            except (NotImplementedError, RuntimeError):
+                pass  # Not available on this platform; KeyboardInterrupt still ends run()
+
+        tasks = [asyncio.create_task(self._connection())]
+        tasks += [asyncio.create_task(self._guard(fn, args)) for fn, args in self.coroutines]
+        tasks += [asyncio.create_task(self._every(interval, fn)) for interval, fn in self.periodic]
+        try:
+            await self.stopping.wait()
+            print(f"[{self.name}] Shutting down...")
+        finally:
+            # Hooks may still send (flushing outboxes), so they run before the loop stops serving
+            for hook in reversed(self.shutdown_hooks):
+                try:
+                    await self.loop.run_in_executor(None, hook)
+                except Exception as e:
+                    print(f"[{self.name}] Error in shutdown hook: {e}")
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            try:
+                if self.sio.connected:
+                    await self.sio.disconnect()
+            except Exception as e:
+                print(f"Error during disconnect: {e}")
+            for executor in self.executors.values():
+                executor.shutdown()
+
+    def run(self):
+        """Serve until SIGINT/SIGTERM or stop()"""
+        try:
+            asyncio.run(self._main())
+        except KeyboardInterrupt:
+            print(f"[{self.name}] Interrupted by user")
+        print(f"[{self.name}] Stopped")
@@ -0,0 +1,304 @@
+"""Camera sharding across worker processes on one host.
+
+One Python process cannot keep a many-core CPU busy: the GIL serializes
+post-processing, and torch's default intra-op pool (one thread per core) in
+every process oversubscribes the cores. ShardSupervisor starts N worker
+processes instead. Each worker gets its own torch/OpenMP thread count and,
+optionally, its own set of CPUs. The cameras are split by a consistent-hash
+ring. The supervisor process is the only one that receives the camera images:
+it looks up each frame's owner and puts the encoded buffer on that worker's
+inbox queue, so every frame is received and parsed once, however many workers
+run. Workers keep a Socket.IO client of their own to send results.
+
+The supervisor keeps the set of live workers in shared memory. When a worker
+exits, it is removed from the ring, so its cameras move to the surviving
+workers; the other cameras keep their owner. The worker is then restarted,
+and once it rejoins (model warm, client connected) the same cameras move
+back. A worker whose client disconnects leaves the ring the same way. The
+supervisor rebuilds its ring copy only when the membership generation changes.
+"""
+import bisect
+import hashlib
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from multiprocessing.connection import wait as wait_for_exit
+
+# Workers load torch; forking a process that may already hold torch/OpenMP state is unsafe
+START_METHOD = 'spawn'
+
+
+def stable_hash(value):
+    """64-bit hash that is identical in every process (unlike hash() with PYTHONHASHSEED)"""
+    return int.from_bytes(hashlib.md5(str(value).encode('utf-8')).digest()[:8], 'big')
+
+
+class HashRing:
+    """Consistent-hash ring of worker indices
+
+    Args:
+        members: Worker indices on the ring
+        replicas: Points per member; more points spread cameras more evenly
+    """
+
+    def __init__(self, members, replicas=64):
+        self.members = sorted(members)
+        points = sorted((stable_hash(f'{member}:{replica}'), member)
+                        for member in self.members for replica in range(replicas))
+        self.hashes = [h for h, _ in points]
+        self.owners = [member for _, member in points]
+        self._cache = {}
+
+    def owner(self, key):
+        """Worker index owning key, or None for an empty ring"""
+        if not self.hashes:
+            return None
+        owner = self._cache.get(key)
+        if owner is None:
+            i = bisect.bisect(self.hashes, stable_hash(key)) % len(self.hashes)
+            owner = self.owners[i]
+            self._cache[key] = owner
+        return owner
+
+
+class ShardMembership:
+    """Live-worker set shared by the supervisor and its workers
+
+    Args:
+        worker_count: Number of worker slots
+        replicas: Ring points per worker
+    """
+
+    def __init__(self, worker_count, replicas=64, context=None):
+        context = context or mp.get_context(START_METHOD)
+        self.worker_count = worker_count
+        self.replicas = replicas
+        self.alive = context.Array('b', worker_count)
+        self.generation = context.Value('q', 0)
+        self._ring = None
+        self._ring_generation = -1
+
+    def _set(self, index, alive):
+        with self.generation.get_lock():
+            if bool(self.alive[index]) != alive:
+                self.alive[index] = 1 if alive else 0
+                self.generation.value += 1
+
+    def join(self, index):
+        self._set(index, True)
+
+    def leave(self, index):
+        self._set(index, False)
+
+    def members(self):
+        with self.generation.get_lock():
+            return [i for i in range(self.worker_count) if self.alive[i]]
+
+    def ring(self):
+        """HashRing of the current live workers, rebuilt only when membership changed"""
+        generation = self.generation.value
+        if generation != self._ring_generation:
+            self._ring = HashRing(self.members(), self.replicas)
+            self._ring_generation = generation
+        return self._ring
+
+    def owner(self, camera_id):
+        return self.ring().owner(camera_id)
+
+
+class Shard:
+    """A worker's view of the sharding: which cameras it handles
+
+    Args:
+        index: This worker's index
+        membership: ShardMembership shared with the supervisor
+        inbox: Queue the supervisor puts this worker's frames on, as
+            (camera_id, image_id, buffer, meta)
+    """
+
+    def __init__(self, index, membership, inbox=None):
+        self.index = index
+        self.membership = membership
+        self.inbox = inbox
+
+    @property
+    def count(self):
+        return self.membership.worker_count
+
+    def owns(self, camera_id):
+        return self.membership.owner(camera_id) == self.index
+
+    def join(self):
+        """Take over this worker's cameras (call once the model is warm and the client connected)"""
+        self.membership.join(self.index)
+        print(f"[Shard {self.index}] Joined (live workers: {self.membership.members()})")
+
+    def leave(self):
+        """Hand this worker's cameras to the other live workers"""
+        self.membership.leave(self.index)
+        print(f"[Shard {self.index}] Left (live workers: {self.membership.members()})")
+
+
+def cpu_sets(worker_count, cpus=None):
+    """Split the usable CPUs into worker_count contiguous, equally sized sets"""
+    if cpus is None:
+        cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count() or 1))
+    if worker_count >= len(cpus):
+        return [[cpus[i % len(cpus)]] for i in range(worker_count)]
+    per_worker = len(cpus) // worker_count
+    return [cpus[i * per_worker:(i + 1) * per_worker] for i in range(worker_count)]
+
+
+def configure_worker(index, threads=None, cpus=None):
+    """Pin the current process to cpus and cap torch/cv2 threads (call at the start of the worker target)
+
+    Under spawn the worker has already re-imported the service script, and with it torch, before
+    the target runs, so the OpenMP/MKL thread pools are sized by the environment ShardSupervisor
+    sets before starting the process; setting it again here only covers libraries loaded later.
+    """
+    if cpus and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cpus)
+    if threads:
+        for name in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+            os.environ[name] = str(threads)
+        try:
+            import torch
+            torch.set_num_threads(threads)
+            torch.set_num_interop_threads(1)
+        except (ImportError, RuntimeError):
+            pass  # No torch, or its inter-op pool is already running
+        try:
+            import cv2
+            cv2.setNumThreads(threads)
+        except ImportError:
+            pass
+    print(f"[Shard {index}] pid {os.getpid()}, threads: {threads or 'default'}, "
+          f"cpus: {cpus if cpus else 'any'}")
+
+
+def worker_share(total, worker_count, minimum=1):
+    """One worker's part of a host-wide budget (e.g. decode processes or slots)"""
+    return max(minimum, total // max(1, worker_count))
+
+
+class ShardSupervisor:
+    """Start, watch and restart worker processes
+
+    Args:
+        target: Worker entry point, called as target(index, membership, inbox, threads, cpus, *args) in
+            the worker
+        worker_count: Number of worker processes
+        args: Extra arguments for target
+        threads: torch/OpenMP threads per worker (default: CPUs // worker_count)
+        pin_cpus: Give each worker its own contiguous set of CPUs
+        restart_delay: Seconds before a worker that exited is started again
+        inbox_size: Frames waiting per worker inbox before dispatch() drops new ones
+    """
+
+    def __init__(self, target, worker_count, args=(), threads=None, pin_cpus=False, restart_delay=2.0,
+                 inbox_size=8):
+        self.context = mp.get_context(START_METHOD)
+        self.target = target
+        self.worker_count = worker_count
+        self.args = args
+        self.membership = ShardMembership(worker_count, context=self.context)
+        self.cpu_sets = cpu_sets(worker_count) if pin_cpus else [None] * worker_count
+        cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else (os.cpu_count() or 1)
+        self.threads = threads or max(1, cpus // worker_count)
+        self.restart_delay = restart_delay
+        self.processes = [None] * worker_count
+        self.restarts = [0] * worker_count
+        self.inbox_size = inbox_size
+        self.inboxes = [None] * worker_count
+        self.dispatched = [0] * worker_count
+        self.dropped_full = [0] * worker_count
+        self.dropped_no_owner = 0
+        self.running = False
+        self.watcher = None
+
+    def _start(self, index):
+        # Environment is inherited at spawn, before torch is imported in the worker
+        for name in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+            os.environ[name] = str(self.threads)
+        # A fresh inbox per start: an exited worker may have died holding the old queue's lock
+        self.inboxes[index] = self.context.Queue(maxsize=self.inbox_size)
+        p = self.context.Process(
+            target=self.target,
+            args=(index, self.membership, self.inboxes[index], self.threads, self.cpu_sets[index]) + tuple(self.args),
+            name=f'shard-{index}',
+            daemon=False
+        )
+        p.start()
+        self.processes[index] = p
+
+    def dispatch(self, camera_id, item):
+        """Put item on the inbox of camera_id's owner; returns False if it was dropped"""
+        owner = self.membership.owner(camera_id)
+        if owner is None:
+            self.dropped_no_owner += 1
+            return False
+        try:
+            self.inboxes[owner].put_nowait(item)
+        except queue.Full:
+            self.dropped_full[owner] += 1
+            return False
+        self.dispatched[owner] += 1
+        return True
+
+    def start(self):
+        """Start every worker and a thread restarting the ones that exit"""
+        self.running = True
+        print(f"[ShardSupervisor] Starting {self.worker_count} workers "
+              f"({self.threads} threads each{', pinned' if self.cpu_sets[0] else ''})")
+        for index in range(self.worker_count):
+            self._start(index)
+        self.watcher = threading.Thread(target=self._watch, daemon=True)
+        self.watcher.start()
+
+    def _watch(self):
+        while self.running:
+            sentinels = {p.sentinel: index for index, p in enumerate(self.processes)}
+            for sentinel in wait_for_exit(list(sentinels), timeout=1.0):
+                if not self.running:
+                    return
+                index = sentinels[sentinel]
+                p = self.processes[index]
+                p.join()
+                # Cameras of the dead worker move to the others until it rejoins
+                self.membership.leave(index)
+                self.restarts[index] += 1
+                print(f"[ShardSupervisor] Worker {index} exited with code {p.exitcode}, "
+                      f"restarting in {self.restart_delay}s (restart #{self.restarts[index]}, "
+                      f"live workers: {self.membership.members()})")
+                time.sleep(self.restart_delay)
+                if self.running:
+                    self._start(index)
+
+    def run(self):
+        """Start every worker and restart the ones that exit until interrupted"""
+        self.start()
+        try:
+            while self.running:
+                self.watcher.join(timeout=1.0)
+        except KeyboardInterrupt:
+            print("[ShardSupervisor] Interrupted by user. Stopping workers...")
+        finally:
+            self.stop()
+
+    def print_stats(self):
+        print(f"[ShardSupervisor] frames dispatched per worker: {self.dispatched}, "
+              f"dropped (inbox full): {self.dropped_full}, dropped (no live worker): {self.dropped_no_owner}, "
+              f"live workers: {self.membership.members()}")
+
+    def stop(self, timeout=5):
+        self.running = False
+        for p in self.processes:
+            if p is not None and p.is_alive():
+                p.terminate()  # SIGTERM: the worker's runtime shuts down cleanly
+        for p in self.processes:
+            if p is not None:
+                p.join(timeout=timeout)
+                if p.is_alive():
+                    p.kill()
@@ -0,0 +1,304 @@
+"""Non-blocking Socket.IO sending from a dedicated thread.
+
+Emitting from an inference thread used to wait for the websocket, so a slow or
+reconnecting connection stalled inference. SocketEmitter gives every
+event type a bounded outbox and sends from one background thread; emit() only
+appends to the outbox. Each outbox has a policy for what happens when updates
+arrive faster than they can be sent:
+
+    latest    one pending update per key (camera); a newer update supersedes the
+              queued one, optionally merged into it with merge(old, new)
+    reliable  must-deliver (violations); FIFO, nothing is superseded, and when the
+              outbox is full emit() waits up to reliable_timeout before giving up;
+              an update whose send keeps failing is retried with exponential
+              backoff and dropped (logged) after max_send_attempts tries
+    drop      FIFO; when full the oldest pending update is dropped and
+              on_drop(key) is called (e.g. to schedule a resync)
+
+Reliable outboxes are always drained first, then the oldest pending update of
+the other outboxes; a reliable outbox waiting out a retry backoff is skipped
+until then, so it does not hold up the others. While disconnected (set_connected(False)) nothing is taken
+out, so latest outboxes keep coalescing and reliable events are sent after
+reconnecting. The sender thread sleeps on a condition until there is something
+to send and a connection to send it on.
+"""
+import threading
+import time
+from collections import OrderedDict, deque
+
+LATEST = 'latest'
+RELIABLE = 'reliable'
+DROP = 'drop'
+
+
+class Outbox:
+    """Pending updates of one event type
+
+    Args:
+        event: Socket.IO event name
+        policy: LATEST, RELIABLE or DROP
+        maxsize: Pending updates (LATEST: pending keys) kept at most
+        merge: Optional merge(old_payload, new_payload) for LATEST when an update is superseded
+        on_drop: Optional on_drop(key) called when an update is dropped without being sent
+    """
+
+    def __init__(self, event, policy=LATEST, maxsize=64, merge=None, on_drop=None):
+        if policy not in (LATEST, RELIABLE, DROP):
+            raise ValueError(f"Unknown outbox policy: {policy}")
+        self.event = event
+        self.policy = policy
+        self.maxsize = maxsize
+        self.merge = merge
+        self.on_drop = on_drop
+        # LATEST: key -> [payload, enqueued_at]; others: deque of (key, payload, enqueued_at)
+        self.pending = OrderedDict() if policy == LATEST else deque()
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.errors = 0
+        self.failures = 0  # Consecutive failed sends of the update at the front (RELIABLE)
+        self.retry_at = 0.0  # Not sent from before this time (RELIABLE backoff)
+
+    def __len__(self):
+        return len(self.pending)
+
+    def full(self):
+        return len(self.pending) >= self.maxsize
+
+    def head_time(self):
+        """enqueued_at of the update that would be sent next"""
+        if self.policy == LATEST:
+            return next(iter(self.pending.values()))[1]
+        return self.pending[0][2]
+
+    def put(self, key, payload, now):
+        """Add an update, returning the key of an update dropped to make room (or None)"""
+        if self.policy == LATEST:
+            entry = self.pending.get(key)
+            if entry is not None:
+                # Keeps its place and age in the outbox, only the payload is replaced
+                entry[0] = self.merge(entry[0], payload) if self.merge is not None else payload
+                self.coalesced += 1
+                return None
+            dropped = None
+            if self.full():
+                dropped = self.pending.popitem(last=False)[0]
+                self.dropped += 1
+            self.pending[key] = [payload, now]
+            return dropped
+
+        dropped = None
+        if self.full():
+            dropped = self.pending.popleft()[0]
+            self.dropped += 1
+        self.pending.append((key, payload, now))
+        return dropped
+
+    def take(self):
+        """Remove and return the next (key, payload, enqueued_at)"""
+        if self.policy == LATEST:
+            key, (payload, enqueued_at) = self.pending.popitem(last=False)
+            return key, payload, enqueued_at
+        return self.pending.popleft()
+
+    def put_back(self, item):
+        """Return an update that failed to send to the front of a reliable outbox"""
+        self.pending.appendleft(item)
+
+
+class SocketEmitter:
+    """Background sender for a Socket.IO client
+
+    Args:
+        send: send(event, payload) writing one message, blocking until done (e.g. ServiceRuntime.send)
+        on_send: Optional on_send(event, queued_ms, send_ms) called after every update sent
+        reliable_timeout: Seconds emit() waits for room in a full reliable outbox
+        default_maxsize: Size of the DROP outbox created for events that were not registered
+        max_send_attempts: Failed sends after which a reliable update is dropped
+        retry_backoff: Seconds before the first retry of a failed reliable update, doubled per failure
+        max_retry_backoff: Longest wait between two retries
+    """
+
+    def __init__(self, send, on_send=None, reliable_timeout=1.0, default_maxsize=64, max_send_attempts=5,
+                 retry_backoff=0.1, max_retry_backoff=5.0):
+        self.send = send
+        self.on_send = on_send
+        self.reliable_timeout = reliable_timeout
+        self.default_maxsize = default_maxsize
+        self.max_send_attempts = max_send_attempts
+        self.retry_backoff = retry_backoff
+        self.max_retry_backoff = max_retry_backoff
+        self.outboxes = {}
+        self.cond = threading.Condition()
+        self.connected = False
+        self.running = False
+        self.thread = None
+
+    def set_connected(self, connected):
+        """Called from the client's connect/disconnect handlers"""
+        with self.cond:
+            self.connected = connected
+            self.cond.notify_all()
+
+    def register(self, event, policy=LATEST, maxsize=64, merge=None, on_drop=None):
+        with self.cond:
+            self.outboxes[event] = Outbox(event, policy, maxsize, merge, on_drop)
+        return self.outboxes[event]
+
+    def emit(self, event, payload, key=None):
+        """Queue an update for sending; returns False if it had to be dropped
+
+        Never blocks, except for a full reliable outbox (up to reliable_timeout).
+        """
+        dropped = None
+        with self.cond:
+            outbox = self.outboxes.get(event)
+            if outbox is None:
+                outbox = Outbox(event, DROP, self.default_maxsize)
+                self.outboxes[event] = outbox
+            if outbox.policy == RELIABLE:
+                deadline = time.time() + self.reliable_timeout
+                while outbox.full():
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        outbox.dropped += 1
+                        print(f"[SocketEmitter] '{event}' outbox full for {self.reliable_timeout}s, dropping update")
+                        return False
+                    self.cond.wait(remaining)
+            dropped = outbox.put(key, payload, time.time())
+            self.cond.notify_all()
+        if dropped is not None and outbox.on_drop is not None:
+            outbox.on_drop(dropped)
+        return True
+
+    def _next(self, now):
+        """Outbox to send from next (reliable first, then the oldest pending update) and, when there
+        is none, how long until a reliable outbox's backoff ends (or None)"""
+        oldest = None
+        wait = None
+        for outbox in self.outboxes.values():
+            if not len(outbox):
+                continue
+            if outbox.policy == RELIABLE:
+                if outbox.retry_at <= now:
+                    return outbox, None
+                wait = outbox.retry_at - now if wait is None else min(wait, outbox.retry_at - now)
+                continue
+            if oldest is None or outbox.head_time() < oldest.head_time():
+                oldest = outbox
+        return oldest, wait
+
+    def _send_failed(self, outbox, item, error):
+        """Put a failed reliable update back with a backoff, or drop it after max_send_attempts"""
+        key = item[0]
+        with self.cond:
+            outbox.errors += 1
+            if outbox.policy == RELIABLE:
+                outbox.failures += 1
+                if outbox.failures < self.max_send_attempts:
+                    outbox.put_back(item)
+                    backoff = min(self.retry_backoff * 2 ** (outbox.failures - 1), self.max_retry_backoff)
+                    outbox.retry_at = time.time() + backoff
+                    print(f"[SocketEmitter] Error sending '{outbox.event}' (attempt {outbox.failures}/"
+                          f"{self.max_send_attempts}, retrying in {backoff:.1f}s): {error}")
+                    return
+                outbox.failures = 0
+                outbox.retry_at = 0.0
+                outbox.dropped += 1
+                self.cond.notify_all()  # Room for a waiting reliable emit(), and stop() may be done
+                print(f"[SocketEmitter] ERROR: dropping '{outbox.event}' update for {key} after "
+                      f"{self.max_send_attempts} failed sends: {error}")
+            else:
+                print(f"[SocketEmitter] Error sending '{outbox.event}': {error}")
+        if outbox.on_drop is not None:
+            outbox.on_drop(key)
+        if outbox.policy != RELIABLE:
+            time.sleep(0.1)  # Usually a dropped connection; give the reconnect a moment
+
+    def _run(self):
+        while self.running:
+            with self.cond:
+                outbox, wait = self._next(time.time()) if self.connected else (None, None)
+                if outbox is None:
+                    self.cond.wait(wait)
+                    continue
+                item = outbox.take()
+                self.cond.notify_all()  # Room in the outbox for a waiting reliable emit()
+
+            key, payload, enqueued_at = item
+            send_start = time.time()
+            try:
+                self.send(outbox.event, payload)
+            except Exception as e:
+                self._send_failed(outbox, item, e)
+                continue
+
+            send_end = time.time()
+            with self.cond:
+                outbox.sent += 1
+                outbox.failures = 0
+                self.cond.notify_all()  # Wakes stop() waiting for the outboxes to drain
+            if self.on_send is not None:
+                self.on_send(outbox.event, (send_start - enqueued_at) * 1000, (send_end - send_start) * 1000)
+
+    def start(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self, flush_timeout=2.0):
+        """Stop the sender thread after trying to send what is still pending for up to flush_timeout seconds"""
+        with self.cond:
+            self.cond.wait_for(
+                lambda: not self.connected or not any(len(o) for o in self.outboxes.values()), flush_timeout)
+            self.running = False
+            self.cond.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout=1)
+
+    def stats(self):
+        with self.cond:
+            return {
+                event: {
+                    'policy': outbox.policy,
+                    'depth': len(outbox),
+                    'sent': outbox.sent,
+                    'coalesced': outbox.coalesced,
+                    'dropped': outbox.dropped,
+                    'errors': outbox.errors,
+                }
+                for event, outbox in self.outboxes.items()
+            }
+
+
+def register_emitter_metrics(registry, emitter):
+    """Expose outbox depth, discarded updates and send latency of an emitter in a metrics registry"""
+    registry.gauge('yolo_outbox_depth', 'Updates waiting to be sent per event', ('event',),
+                   collect=lambda: {(event, ): s['depth'] for event, s in emitter.stats().items()})
+
+    def collect_outbox_dropped():
+        dropped = {}
+        for event, s in emitter.stats().items():
+            for reason in ('coalesced', 'dropped', 'errors'):
+                dropped[(event, reason)] = s[reason]
+        return dropped
+
+    registry.counter('yolo_outbox_discarded_total', 'Updates superseded, dropped or failed per event',
+                     ('event', 'reason'), collect=collect_outbox_dropped)
+    send_latency = registry.histogram('yolo_emit_latency_ms', 'Time updates spend in the outbox and being sent',
+                                      ('event', 'stage'))
+
+    def on_send(event, queued_ms, send_ms):
+        send_latency.observe(queued_ms, event=event, stage='queued')
+        send_latency.observe(send_ms, event=event, stage='send')
+
+    emitter.on_send = on_send
+
+
+def print_emitter_stats(emitter):
+    """Print one line of sent, superseded and dropped updates per event"""
+    for event, s in emitter.stats().items():
+        print(f"[SocketEmitter] '{event}' ({s['policy']}): sent {s['sent']}, pending {s['depth']}, "
+              f"superseded {s['coalesced']}, dropped {s['dropped']}, errors {s['errors']}")
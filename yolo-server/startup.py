@@ -0,0 +1,76 @@
+"""Startup phase timing and model warm-up shared by the yolo-server services.
+
+Import this module before the heavy imports of a service: the StartupReport
+created at that point measures every later phase (imports, weight load, device
+move, warm-up) as the time between two mark() calls, and print() shows the
+split once the service is ready to join its Socket.IO rooms.
+
+warm_up() runs a model on synthetic frames of the shapes (and batch sizes) the
+service will see, so CUDA context creation, cuDNN algorithm selection, allocator
+growth and lazy module initialization happen before the first real frame.
+"""
+import time
+
+import numpy as np
+
+WARMUP_FILL = 114  # Letterbox gray, so warm-up frames go through the same padding path as real ones
+
+
+class StartupReport:
+    """Wall-clock split of a service's startup into named phases
+
+    Args:
+        service: Name shown in the report
+    """
+
+    def __init__(self, service):
+        self.service = service
+        self.start = time.perf_counter()
+        self.last = self.start
+        self.phases = []
+
+    def mark(self, phase):
+        """Close the current phase: everything since the previous mark is attributed to it"""
+        now = time.perf_counter()
+        self.phases.append((phase, (now - self.last) * 1000))
+        self.last = now
+
+    def total_ms(self):
+        return (self.last - self.start) * 1000
+
+    def print(self):
+        total = self.total_ms()
+        print(f"[Startup] {self.service} ready in {total:.0f}ms")
+        for phase, ms in self.phases:
+            share = 100.0 * ms / total if total else 0.0
+            print(f"[Startup]   {phase:<16} {ms:>9.1f}ms {share:>5.1f}%")
+
+
+def warmup_frames(shape, count=1):
+    """count synthetic BGR frames of (height, width) shape"""
+    height, width = shape
+    return [np.full((height, width, 3), WARMUP_FILL, dtype=np.uint8) for _ in range(count)]
+
+
+def warm_up(run, shapes, batch_sizes=(1,), iterations=2, label='model'):
+    """Run `run(frames)` for every shape and batch size and print per-call timings
+
+    The first call of each combination pays the lazy initialization; later
+    iterations show the steady-state latency the service will start with.
+
+    Returns:
+        Dict of (shape, batch_size) -> list of per-iteration ms
+    """
+    timings = {}
+    for shape in shapes:
+        for batch_size in batch_sizes:
+            frames = warmup_frames(shape, batch_size)
+            times = []
+            for _ in range(iterations):
+                start = time.perf_counter()
+                run(frames)
+                times.append((time.perf_counter() - start) * 1000)
+            timings[(tuple(shape), batch_size)] = times
+            print(f"[Warm-up] {label} {shape[1]}x{shape[0]} batch {batch_size}: "
+                  + ", ".join(f"{ms:.1f}" for ms in times) + "ms")
+    return timings
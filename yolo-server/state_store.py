@@ -0,0 +1,90 @@
+"""Bounded per-camera state with TTL eviction.
+
+Per-track bookkeeping (which tracks were already counted on which line, when a
+track's last crop was sent) used to be pruned only when a track's trail
+expired. A key whose track never showed up again, or was never added to a
+trail, stayed forever. On a long-running deployment, memory then grew with
+every vehicle ever seen.
+
+TTLStore is a map from key to last-touched time in frame time (ms, the
+created_at of the events). It is ordered oldest first, so expire() only looks
+at the front. It also has a hard max_entries: when the store is full, the
+oldest key is evicted, whatever the clock says. Writing a key refreshes it.
+"""
+from collections import OrderedDict
+
+
+class TTLStore:
+    """Ordered key -> timestamp map with TTL expiry and a size bound
+
+    Args:
+        ttl_ms: Keys not written for this long (frame time) are removed by expire(); None: no TTL
+        max_entries: Keys kept at most; the oldest is evicted beyond this
+    """
+
+    def __init__(self, ttl_ms=None, max_entries=4096):
+        self.ttl_ms = ttl_ms
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.expired = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __iter__(self):
+        return iter(list(self.entries))
+
+    def __getitem__(self, key):
+        return self.entries[key]
+
+    def __setitem__(self, key, timestamp):
+        self.entries[key] = timestamp
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evicted += 1
+
+    def __delitem__(self, key):
+        del self.entries[key]
+
+    def get(self, key, default=None):
+        return self.entries.get(key, default)
+
+    def expire(self, now):
+        """Remove keys last written more than ttl_ms before now, returning how many were removed"""
+        if self.ttl_ms is None:
+            return 0
+        cutoff = now - self.ttl_ms
+        removed = 0
+        while self.entries:
+            key, timestamp = next(iter(self.entries.items()))
+            if timestamp >= cutoff:
+                break
+            self.entries.popitem(last=False)
+            removed += 1
+        self.expired += removed
+        return removed
+
+    def remove_if(self, predicate):
+        """Remove every key for which predicate(key) is True"""
+        for key in [k for k in self.entries if predicate(k)]:
+            del self.entries[key]
+
+    def stats(self):
+        return {'entries': len(self.entries), 'expired': self.expired, 'evicted': self.evicted}
+
+
+def array_nbytes(*objects):
+    """Bytes held by the NumPy array attributes of objects (preallocated per-camera state)"""
+    total = 0
+    for obj in objects:
+        if obj is None:
+            continue
+        for value in vars(obj).values():
+            if hasattr(value, 'nbytes') and hasattr(value, 'dtype'):
+                total += value.nbytes
+    return total
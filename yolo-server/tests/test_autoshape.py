@@ -0,0 +1,82 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+torch = pytest.importorskip('torch')
+pytest.importorskip('ultralytics')
+
+# The vendored yolov5 imports its own top-level models/ and utils/ packages
+YOLOV5_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'yolov5')
+sys.path.insert(0, YOLOV5_DIR)
+
+from models.common import AutoShape, Detections  # noqa: E402
+from models.yolo import Model  # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def autoshape():
+    torch.manual_seed(0)
+    model = AutoShape(Model(os.path.join(YOLOV5_DIR, 'models', 'yolov5n.yaml'), nc=3), verbose=False)
+    model.names = {0: 'a', 1: 'b', 2: 'c'}
+    model.conf = 0.0  # Random weights: keep whatever NMS lets through
+    return model
+
+
+def images():
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 255, (96, 128, 3), dtype=np.uint8), rng.integers(0, 255, (64, 64, 3), dtype=np.uint8)]
+
+
+def test_minimal_matches_detections(autoshape):
+    autoshape.minimal = False
+    results = autoshape(images(), size=64)
+    autoshape.minimal = True
+    try:
+        minimal = autoshape(images(), size=64)
+    finally:
+        autoshape.minimal = False
+
+    assert isinstance(minimal, list) and len(minimal) == 2
+    for pred, expected in zip(minimal, results.pred):
+        assert isinstance(pred, np.ndarray)
+        assert pred.dtype == np.float32
+        assert pred.shape == (len(expected), 6)
+        np.testing.assert_allclose(pred, expected.float().numpy(), rtol=1e-5, atol=1e-4)
+
+
+def test_minimal_empty_batch_entry(autoshape):
+    autoshape.minimal = True
+    autoshape.conf = 1.0  # Scores are sigmoids below 1: nothing passes
+    try:
+        minimal = autoshape(images(), size=64)
+    finally:
+        autoshape.minimal = False
+        autoshape.conf = 0.0
+    assert [pred.shape for pred in minimal] == [(0, 6), (0, 6)]
+
+
+def make_detections():
+    ims = [np.zeros((100, 200, 3), dtype=np.uint8)]
+    pred = [torch.tensor([[10.0, 20.0, 50.0, 60.0, 0.9, 1.0]])]
+    return Detections(ims, pred, names={0: 'a', 1: 'b'}, shape=(1, 3, 64, 64))
+
+
+def test_detection_formats_are_computed_on_access():
+    results = make_detections()
+    assert 'xywh' not in vars(results)
+
+    assert results.xywh[0][0, :4].tolist() == [30.0, 40.0, 40.0, 40.0]
+    assert 'xywh' in vars(results)
+    np.testing.assert_allclose(results.xyxyn[0][0, :4].numpy(), [0.05, 0.2, 0.25, 0.6])
+    np.testing.assert_allclose(results.xywhn[0][0, :4].numpy(), [0.15, 0.4, 0.2, 0.4])
+    assert results.files == ['image0.jpg']
+
+
+def test_pandas_copy_keeps_the_original_tensors():
+    results = make_detections()
+    frames = results.pandas()
+    assert frames.xyxy[0]['name'].tolist() == ['b']
+    assert frames.xywhn[0]['width'].tolist() == pytest.approx([0.2])
+    assert isinstance(results.xywh[0], torch.Tensor)
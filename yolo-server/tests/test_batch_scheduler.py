@@ -0,0 +1,76 @@
+import threading
+
+from batch_scheduler import BatchScheduler, percentile
+from frame_mailbox import FrameMailbox
+
+
+def test_percentile():
+    assert percentile([], 95) == 0.0
+    assert percentile([5, 1, 3, 2, 4], 50) == 3
+    assert percentile(range(1, 101), 95) == 95
+
+
+def run_batches(mailboxes, infer_fn, expected, **kwargs):
+    results = []
+    discarded = []
+    done = threading.Event()
+
+    def dispatch(camera_id, item, result, inference_ms):
+        results.append((camera_id, item, result))
+        if len(results) + len(discarded) >= expected:
+            done.set()
+
+    def discard(item):
+        discarded.append(item)
+        if len(results) + len(discarded) >= expected:
+            done.set()
+
+    scheduler = BatchScheduler(mailboxes, infer_fn, dispatch, stats_interval=0, discard_fn=discard, **kwargs)
+    scheduler.start()
+    scheduler.notify()
+    done.wait(timeout=5)
+    scheduler.stop()
+    return scheduler, results, discarded
+
+
+def test_one_batch_over_all_cameras_with_newest_frames():
+    mailboxes = {camera_id: FrameMailbox() for camera_id in 'abc'}
+    for camera_id, mailbox in mailboxes.items():
+        mailbox.put(f'{camera_id}1')
+        mailbox.put(f'{camera_id}2')
+    batches = []
+
+    def infer(camera_ids, items):
+        batches.append(list(camera_ids))
+        return [item.upper() for item in items]
+
+    scheduler, results, _ = run_batches(mailboxes, infer, 3, max_batch_size=8, max_wait_ms=50)
+    assert batches == [['a', 'b', 'c']]
+    assert sorted(results) == [('a', 'a2', 'A2'), ('b', 'b2', 'B2'), ('c', 'c2', 'C2')]
+    assert scheduler.stats.snapshot()['total_frames'] == 3
+
+
+def test_batch_size_is_capped():
+    mailboxes = {camera_id: FrameMailbox() for camera_id in 'abcd'}
+    for camera_id, mailbox in mailboxes.items():
+        mailbox.put(camera_id)
+    batches = []
+
+    def infer(camera_ids, items):
+        batches.append(len(items))
+        return items
+
+    run_batches(mailboxes, infer, 4, max_batch_size=2, max_wait_ms=50)
+    assert batches == [2, 2]
+
+
+def test_frames_of_a_failed_batch_are_discarded():
+    mailboxes = {'a': FrameMailbox()}
+    mailboxes['a'].put('frame')
+
+    def infer(camera_ids, items):
+        raise RuntimeError('inference failed')
+
+    scheduler, results, discarded = run_batches(mailboxes, infer, 1, max_wait_ms=0)
+    assert results == []
+    assert discarded == ['frame']
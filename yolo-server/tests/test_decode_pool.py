@@ -0,0 +1,86 @@
+import contextlib
+import sys
+
+import cv2
+import numpy as np
+import pytest
+
+from decode_pool import DecodePool, main_script_hidden
+
+
+def jpeg(width, height, value=128):
+    return cv2.imencode('.jpg', np.full((height, width, 3), value, dtype=np.uint8))[1].tobytes()
+
+
+@contextlib.contextmanager
+def running_pool(**kwargs):
+    pool = DecodePool(workers=1, **kwargs)
+    pool.start()
+    try:
+        yield pool
+    finally:
+        pool.stop()
+
+
+def decoded(pool):
+    result = pool.get(timeout=20)
+    assert result is not None
+    return result
+
+
+def test_frames_are_views_of_shared_slots():
+    with running_pool(slots=2, slot_bytes=64 * 48 * 3) as pool:
+        pool.submit('cam', 'img1', jpeg(64, 48, 200), meta=('meta',))
+        camera_id, image_id, frame, meta = decoded(pool)
+        assert (camera_id, image_id, meta) == ('cam', 'img1', ('meta',))
+        assert frame.shape == (48, 64, 3) and abs(int(frame.mean()) - 200) < 3
+        assert not frame.flags.owndata
+        assert pool.stats()['slots_lent'] == 1
+        assert pool.release(frame)
+        assert not pool.release(frame)
+        assert pool.stats()['slots_lent'] == 0
+
+
+def test_capped_frames_are_resized_into_their_slot():
+    with running_pool(slots=1, slot_bytes=100 * 50 * 3, max_dimension=100) as pool:
+        pool.submit('cam', 'img1', jpeg(400, 200))
+        frame = decoded(pool)[2]
+        assert frame.shape == (50, 100, 3) and not frame.flags.owndata
+        pool.release(frame)
+
+
+def test_frames_without_a_free_slot_are_dropped():
+    with running_pool(slots=1, slot_bytes=32 * 32 * 3) as pool:
+        pool.submit('cam', 'img1', jpeg(32, 32))
+        held = decoded(pool)[2]
+        pool.submit('cam', 'img2', jpeg(32, 32))
+        assert pool.get(timeout=2) is None
+        assert pool.stats()['dropped_no_slot'] == 1
+        pool.release(held)
+        pool.submit('cam', 'img3', jpeg(32, 32))
+        assert decoded(pool)[1] == 'img3'
+
+
+def test_oversized_frames_are_sent_through_the_queue():
+    with running_pool(slots=1, slot_bytes=16 * 16 * 3) as pool:
+        pool.submit('cam', 'big', jpeg(64, 64))
+        frame = decoded(pool)[2]
+        assert frame.shape == (64, 64, 3)
+        assert pool.stats()['oversized'] == 1
+        assert not pool.release(frame)
+
+
+def test_undecodable_buffers_are_counted():
+    with running_pool(slots=1, slot_bytes=16 * 16 * 3) as pool:
+        pool.submit('cam', 'bad', b'not a jpeg')
+        pool.submit('cam', 'good', jpeg(16, 16))
+        assert decoded(pool)[1] == 'good'
+        assert pool.stats()['errors'] == 1
+
+
+def test_main_script_is_hidden_only_while_starting():
+    main = sys.modules['__main__']
+    file, spec = getattr(main, '__file__', None), main.__spec__
+    with main_script_hidden():
+        assert getattr(main, '__file__', None) is None and main.__spec__ is None
+    assert getattr(main, '__file__', None) == file and main.__spec__ is spec
@@ -0,0 +1,66 @@
+import base64
+
+import cv2
+import numpy as np
+import pytest
+
+from frame_decode import FramePool, decode_frame, jpeg_dimensions, reduction_factor, to_bytes
+
+
+def jpeg(width, height):
+    image = np.zeros((height, width, 3), dtype=np.uint8)
+    image[:, :width // 2] = (0, 0, 255)
+    return cv2.imencode('.jpg', image)[1].tobytes()
+
+
+def test_jpeg_dimensions_from_header():
+    assert jpeg_dimensions(jpeg(320, 200)) == (320, 200)
+    assert jpeg_dimensions(cv2.imencode('.png', np.zeros((4, 4, 3), np.uint8))[1].tobytes()) is None
+
+
+def test_reduction_factor_keeps_long_side_at_target():
+    assert reduction_factor(1920, 1080, 640) == 2
+    assert reduction_factor(5120, 2880, 640) == 8
+    assert reduction_factor(1000, 600, 640) == 1
+    assert reduction_factor(1920, 1080, None) == 1
+
+
+def test_event_buffer_formats():
+    data = jpeg(16, 16)
+    assert to_bytes(data) is data
+    assert to_bytes(base64.b64encode(data).decode()) == data
+    assert to_bytes({'image': data}) is data
+
+
+def test_large_jpeg_is_decoded_at_reduced_scale():
+    frame = decode_frame(jpeg(1920, 1080), target_size=640)
+    assert frame.shape == (540, 960, 3)
+    assert frame[0, 0].tolist()[2] > 200  # Still BGR
+
+
+def test_invalid_buffer_raises():
+    with pytest.raises(ValueError):
+        decode_frame(b'not an image')
+
+
+def test_capped_frame_is_resized_into_a_lent_buffer():
+    pool = FramePool(max_buffers=1)
+    frame = decode_frame(jpeg(800, 400), max_dimension=400, pool=pool)
+    assert frame.shape == (200, 400, 3)
+    assert pool.stats() == {'allocated': 1, 'lent': 1, 'exhausted': 0}
+
+    # The only buffer is lent out: the next frame is allocated by the decoder instead
+    other = decode_frame(jpeg(800, 400), max_dimension=400, pool=pool)
+    assert other.shape == frame.shape and pool.stats()['exhausted'] == 1
+
+    assert pool.release(frame) and not pool.release(other)
+    again = decode_frame(jpeg(800, 400), max_dimension=400, pool=pool)
+    assert again is frame  # Reused, not reallocated
+    assert pool.stats()['allocated'] == 1
+
+
+def test_frame_within_cap_is_not_pooled():
+    pool = FramePool()
+    frame = decode_frame(jpeg(320, 200), max_dimension=400, pool=pool)
+    assert frame.shape == (200, 320, 3)
+    assert pool.stats()['lent'] == 0
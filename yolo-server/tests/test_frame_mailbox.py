@@ -0,0 +1,73 @@
+import queue
+import threading
+import time
+
+import pytest
+
+from frame_mailbox import FrameMailbox, MailboxGroup, now_ms
+
+
+def test_newest_frame_wins():
+    discarded = []
+    mailbox = FrameMailbox(on_discard=discarded.append)
+    for frame in range(3):
+        mailbox.put(frame)
+    assert mailbox.qsize() == 1
+    assert mailbox.get(block=False) == 2
+    assert discarded == [0, 1]
+    with pytest.raises(queue.Empty):
+        mailbox.get(block=False)
+    stats = mailbox.stats()
+    assert (stats['received'], stats['delivered'], stats['superseded'], stats['dropped']) == (3, 1, 2, 2)
+
+
+def test_stale_frame_is_dropped():
+    discarded = []
+    mailbox = FrameMailbox(max_age_ms=50, on_discard=discarded.append)
+    mailbox.put('old')
+    time.sleep(0.1)
+    with pytest.raises(queue.Empty):
+        mailbox.get(block=False)
+    assert discarded == ['old']
+    assert mailbox.stats()['expired'] == 1
+
+
+def test_age_is_corrected_for_clock_offset():
+    # The sender's clock runs 10 s behind: the smallest seen delay is taken as offset, not as age
+    mailbox = FrameMailbox(max_age_ms=500, timestamp=lambda item: item['created_at'])
+    mailbox.put({'created_at': now_ms() - 10_000})
+    assert mailbox.get(block=False) is not None
+    assert mailbox.stats()['clock_offset_ms'] >= 10_000
+
+
+def test_get_waits_for_a_frame():
+    mailbox = FrameMailbox()
+    threading.Timer(0.05, mailbox.put, args=('frame',)).start()
+    assert mailbox.get(timeout=2) == 'frame'
+    with pytest.raises(queue.Empty):
+        mailbox.get(timeout=0.01)
+
+
+def test_group_drains_cameras_round_robin():
+    delivered = []
+    group = MailboxGroup(on_deliver=lambda camera_id, wait_ms, age_ms: delivered.append(camera_id))
+    group.put('a', 'a1')
+    group.put('a', 'a2')
+    group.put('b', 'b1')
+    assert [group.get(block=False), group.get(block=False)] == ['a2', 'b1']
+    assert delivered == ['a', 'b']
+    group.put('a', 'a3')
+    group.put('b', 'b2')
+    # Camera b does not wait behind a
+    assert [group.get(block=False), group.get(block=False)] == ['a3', 'b2']
+    assert group.stats()['a']['superseded'] == 1
+
+
+def test_group_reaps_idle_cameras():
+    group = MailboxGroup()
+    group.put('idle', 1)
+    group.get(block=False)
+    group.put('busy', 1)
+    time.sleep(0.05)
+    assert group.reap(0.01) == ['idle']
+    assert list(group.mailboxes) == ['busy']
@@ -0,0 +1,73 @@
+import urllib.request
+
+from metrics import Registry, start_metrics_server, startup_collector
+from startup import StartupReport
+
+
+def test_counter_and_gauge_render():
+    registry = Registry()
+    frames = registry.counter('frames_total', 'Frames', ('camera',))
+    depth = registry.gauge('depth', 'Queue depth')
+    frames.inc(camera='a')
+    frames.inc(2, camera='a')
+    frames.inc(camera='b"1')
+    depth.set(4)
+    assert registry.render() == (
+        '# HELP frames_total Frames\n# TYPE frames_total counter\n'
+        'frames_total{camera="a"} 3\nframes_total{camera="b\\"1"} 1\n'
+        '# HELP depth Queue depth\n# TYPE depth gauge\ndepth 4\n'
+    )
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    latency = registry.histogram('latency_ms', 'Latency', ('stage',), buckets=(1, 10))
+    for value in (0.5, 5, 50):
+        latency.observe(value, stage='decode')
+    lines = registry.render().splitlines()[2:]
+    assert lines == [
+        'latency_ms_bucket{stage="decode",le="1"} 1',
+        'latency_ms_bucket{stage="decode",le="10"} 2',
+        'latency_ms_bucket{stage="decode",le="+Inf"} 3',
+        'latency_ms_sum{stage="decode"} 55.5',
+        'latency_ms_count{stage="decode"} 3',
+    ]
+
+
+def test_collected_values_and_failing_collectors():
+    registry = Registry()
+    registry.gauge('slots', 'Slots', ('camera',), collect=lambda: {('a',): 2})
+    registry.gauge('broken', 'Broken', collect=lambda: 1 / 0)
+    text = registry.render()
+    assert 'slots{camera="a"} 2' in text
+    assert '# broken collection failed: division by zero' in text
+
+
+def test_forget_drops_a_camera_everywhere():
+    registry = Registry()
+    frames = registry.counter('frames_total', 'Frames', ('camera',))
+    latency = registry.histogram('latency_ms', 'Latency', ('camera', 'stage'))
+    frames.inc(camera='a')
+    frames.inc(camera='b')
+    latency.observe(3, camera='a', stage='decode')
+    assert registry.forget('camera', 'a') == 2
+    assert 'camera="a"' not in registry.render()
+
+
+def test_startup_collector():
+    report = StartupReport('test')
+    report.phases = [('imports', 1500.0)]
+    assert startup_collector(report)() == {('imports',): 1.5}
+
+
+def test_metrics_endpoint():
+    registry = Registry()
+    registry.counter('hits_total', 'Hits').inc()
+    server = start_metrics_server(0, registry=registry)
+    try:
+        url = f'http://127.0.0.1:{server.server_address[1]}/metrics'
+        with urllib.request.urlopen(url, timeout=5) as response:
+            assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+            assert 'hits_total 1' in response.read().decode()
+    finally:
+        server.shutdown()
@@ -0,0 +1,42 @@
+import numpy as np
+
+from motion_gate import MotionGate
+
+
+def scene(box_x=None):
+    frame = np.full((270, 480, 3), 60, dtype=np.uint8)
+    if box_x is not None:
+        frame[100:180, box_x:box_x + 80] = 230
+    return frame
+
+
+def test_static_frames_skip_inference():
+    gate = MotionGate(max_skip_ms=10_000)
+    assert gate.check(scene(), 0)  # First frame sets the background
+    assert not gate.check(scene(), 40)
+    assert not gate.check(scene(), 80)
+    stats = gate.stats()
+    assert (stats['frames'], stats['skipped']) == (3, 2)
+
+
+def test_moving_object_needs_inference():
+    gate = MotionGate(max_skip_ms=10_000)
+    gate.check(scene(), 0)
+    assert gate.check(scene(box_x=100), 40)
+    assert gate.stats()['changed_fraction'] > 0.002
+
+
+def test_static_camera_still_runs_every_max_skip_ms():
+    gate = MotionGate(max_skip_ms=1000)
+    decisions = [gate.check(scene(), t) for t in range(0, 2001, 250)]
+    assert decisions == [True, False, False, False, True, False, False, False, True]
+
+
+def test_saved_time_estimate():
+    gate = MotionGate(max_skip_ms=10_000)
+    for t in range(3):
+        gate.check(scene(), t)
+    gate.record_inference(20.0)
+    gate.record_inference(30.0)
+    assert gate.stats()['inference_ms_per_frame'] == 25.0
+    assert gate.stats()['saved_ms'] == 50.0
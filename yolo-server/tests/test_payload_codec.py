@@ -0,0 +1,146 @@
+import numpy as np
+import pytest
+
+from payload_codec import DeltaEncoder, build_full_payload, flatten_counts, msgpack
+from track_history import TrackHistory
+
+CLASS_NAMES = ['car', 'truck', 'bus']
+
+
+class Receiver:
+    """Rebuilds the full state from a stream of delta updates, like the dashboard does"""
+
+    def __init__(self):
+        self.trails = {}
+        self.counts = {}
+        self.classes = None
+        self.seq = 0
+
+    def apply(self, update):
+        if msgpack is not None and isinstance(update, bytes):
+            update = msgpack.unpackb(update, raw=False)
+        assert update['seq'] == self.seq + 1
+        self.seq = update['seq']
+        if update['keyframe']:
+            self.trails = {}
+            self.counts = {}
+            self.classes = update['classes']
+        points = np.frombuffer(update['points'], dtype='<i4').reshape(-1, 5)
+        for track_id, x, y, dt_ms, class_id in points.tolist():
+            self.trails.setdefault(track_id, []).append((x, y, update['created_at'] + dt_ms, class_id))
+        self.counts.update(update['counts'])
+        detections = np.frombuffer(update['detections'], dtype='<f4').reshape(-1, 5)
+        meta = np.frombuffer(update['detection_meta'], dtype='<i4').reshape(-1, 2)
+        crossings = np.frombuffer(update['crossings'], dtype='<i4').reshape(-1, 2)
+        return update, detections, meta, crossings
+
+
+def expected_trails(history, now):
+    trails = {}
+    for track_id, xy, times, class_ids in history.recent(history.max_tracks, now):
+        trails[track_id] = [(int(x), int(y), int(t), int(c))
+                            for (x, y), t, c in zip(xy.tolist(), times.tolist(), class_ids.tolist())]
+    return trails
+
+
+def encode_frame(encoder, history, created_at, counts, crossings=()):
+    boxes = np.array([[0.1, 0.2, 0.3, 0.4], [0.5, 0.5, 0.7, 0.9]])
+    return encoder.encode(
+        'cam1', f'img{created_at}', created_at, 300, 12.345, 1280, 720,
+        boxes, np.array([0.9, 0.75]), np.array([0, 2]), np.array([7, 8]),
+        history.recent(history.max_tracks, created_at), counts, {'car': 1, 'bus': 1, 'truck': 0}, list(crossings))
+
+
+@pytest.mark.parametrize('use_msgpack', [False, True])
+def test_delta_round_trip_rebuilds_trails_and_counts(use_msgpack):
+    if use_msgpack and msgpack is None:
+        pytest.skip('msgpack not installed')
+    encoder = DeltaEncoder(CLASS_NAMES, keyframe_interval=100, use_msgpack=use_msgpack)
+    history = TrackHistory(max_tracks=8, max_points=50, max_age=10_000)
+    receiver = Receiver()
+    counts = flatten_counts(0, 0, {name: 0 for name in CLASS_NAMES}, {name: 0 for name in CLASS_NAMES})
+
+    for frame in range(6):
+        now = 1_000_000 + frame * 40
+        history.append(7, 100 + frame, 200 + 2 * frame, now, 0)
+        if frame >= 2:
+            history.append(8, 600, 400 - frame, now, 2)
+        if frame == 4:
+            counts = dict(counts, total_down=1, **{'down.bus': 1})
+        update, detections, meta, crossings = receiver.apply(
+            encode_frame(encoder, history, now, counts, [(8, 1)] if frame == 4 else ()))
+
+        assert update['keyframe'] == (frame == 0)
+        assert receiver.trails == expected_trails(history, now)
+        assert receiver.counts == counts
+        np.testing.assert_allclose(detections[:, :4], [[0.1, 0.2, 0.3, 0.4], [0.5, 0.5, 0.7, 0.9]], rtol=1e-6)
+        assert meta.tolist() == [[7, 0], [8, 2]]
+        assert crossings.tolist() == ([[8, 1]] if frame == 4 else [])
+    assert receiver.classes == CLASS_NAMES
+
+
+def test_delta_sends_only_new_points_and_changed_counts():
+    encoder = DeltaEncoder(CLASS_NAMES, keyframe_interval=100, use_msgpack=False)
+    history = TrackHistory(max_tracks=8, max_points=50, max_age=10_000)
+    counts = {'total_up': 0, 'total_down': 0}
+    history.append(1, 10, 10, 1000)
+    history.append(1, 11, 12, 1040)
+    first = encode_frame(encoder, history, 1040, counts)
+    history.append(1, 12, 14, 1080)
+    second = encode_frame(encoder, history, 1080, counts)
+
+    assert len(np.frombuffer(first['points'], dtype='<i4')) == 2 * 5
+    assert np.frombuffer(second['points'], dtype='<i4').tolist() == [1, 12, 14, 0, 0]
+    assert first['counts'] == counts
+    assert second['counts'] == {}
+    assert 'classes' not in second
+
+
+def test_requested_keyframe_resends_full_state():
+    encoder = DeltaEncoder(CLASS_NAMES, keyframe_interval=100, use_msgpack=False)
+    history = TrackHistory(max_tracks=8, max_points=50, max_age=10_000)
+    counts = {'total_up': 3, 'total_down': 1}
+    history.append(1, 10, 10, 1000)
+    encode_frame(encoder, history, 1000, counts)
+    history.append(1, 11, 11, 1040)
+    encoder.request_keyframe()
+
+    # A receiver that missed every earlier update resynchronizes from the keyframe alone
+    receiver = Receiver()
+    receiver.seq = encoder.sequence
+    receiver.apply(encode_frame(encoder, history, 1040, counts))
+    assert receiver.trails == expected_trails(history, 1040)
+    assert receiver.counts == counts
+
+
+def test_keyframe_interval():
+    encoder = DeltaEncoder(CLASS_NAMES, keyframe_interval=3, use_msgpack=False)
+    history = TrackHistory()
+    keyframes = [encode_frame(encoder, history, 1000 + i, {})['keyframe'] for i in range(7)]
+    assert keyframes == [True, False, False, True, False, False, True]
+
+
+def test_predicted_frames_are_flagged():
+    encoder = DeltaEncoder(CLASS_NAMES, use_msgpack=False)
+    history = TrackHistory()
+    boxes = np.array([[0.1, 0.2, 0.3, 0.4]])
+    update = encoder.encode('cam1', 'img1', 1000, 300, 0.0, 1280, 720, boxes, np.array([0.9]), np.array([0]),
+                            np.array([7]), [], {}, {}, [], predicted=True)
+    assert update['predicted'] is True
+    assert encode_frame(encoder, history, 1040, {})['predicted'] is False
+
+    payload = build_full_payload('cam1', 'img1', 300, [], 0.0, 1280, 720, 1000, 0, 0, {}, {}, {}, [], [],
+                                 CLASS_NAMES, predicted=True)
+    assert payload['predicted'] is True
+
+
+def test_track_epoch_is_sent():
+    encoder = DeltaEncoder(CLASS_NAMES, use_msgpack=False)
+    boxes = np.array([[0.1, 0.2, 0.3, 0.4]])
+    update = encoder.encode('cam1', 'img1', 1000, 300, 0.0, 1280, 720, boxes, np.array([0.9]), np.array([0]),
+                            np.array([7]), [], {}, {}, [], track_epoch='a1b2')
+    assert update['track_epoch'] == 'a1b2'
+
+    payload = build_full_payload('cam1', 'img1', 300, [], 0.0, 1280, 720, 1000, 0, 0, {}, {}, {}, [], [],
+                                 CLASS_NAMES, track_epoch='a1b2')
+    assert payload['track_epoch'] == 'a1b2'
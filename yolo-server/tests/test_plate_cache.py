@@ -0,0 +1,69 @@
+from plate_cache import PlateCache, PlateVotes
+
+
+def test_votes_pick_the_best_character_per_position():
+    votes = PlateVotes()
+    votes.add('51A-123', [0.9] * 7)
+    votes.add('51A-128', [0.9, 0.9, 0.9, 1.0, 0.9, 0.9, 0.3])
+    votes.add('51A-123', [0.9] * 7)
+    text, readings, agreement = votes.consensus()
+    assert (text, readings) == ('51A-123', 3)
+    assert agreement == 1.8 / 2.1
+
+
+def test_most_common_layout_wins():
+    votes = PlateVotes()
+    votes.add('51A12345', [1.0] * 8)
+    votes.add('51A-1234', [1.0] * 8)
+    votes.add('51A-1235', [1.0] * 8)
+    assert votes.consensus()[:2] == ('51A-1234', 2)
+
+
+def test_cache_serves_a_plate_once_readings_agree():
+    cache = PlateCache(ttl=60, confident_readings=2, min_agreement=0.7)
+    assert cache.get('cam', 'e1', 1, now=0) is None
+    cache.add('cam', 'e1', 1, '30F-55555', [0.9] * 9, now=0)
+    assert cache.get('cam', 'e1', 1, now=1) is None
+    cache.add('cam', 'e1', 1, '30F-55555', [0.9] * 9, now=2)
+    assert cache.get('cam', 'e1', 1, now=3) == '30F-55555'
+    assert cache.get('cam', 'e1', 2, now=3) is None
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['readings']) == (1, 3, 2)
+
+
+def test_disagreeing_readings_are_not_served():
+    cache = PlateCache(confident_readings=2, min_agreement=0.7)
+    cache.add('cam', 'e1', 1, '30F-55555', [0.9] * 9, now=0)
+    cache.add('cam', 'e1', 1, '30F-55556', [0.9] * 9, now=0)
+    assert cache.get('cam', 'e1', 1, now=0) is None
+
+
+def test_entries_expire_and_are_bounded():
+    cache = PlateCache(ttl=10, confident_readings=1, max_entries=2)
+    cache.add('cam', 'e1', 1, '30F-55555', [1.0] * 9, now=0)
+    assert cache.get('cam', 'e1', 1, now=11) is None
+    for track_id in range(3):
+        cache.add('cam', 'e1', track_id, '30F-55555', [1.0] * 9, now=20)
+    assert cache.stats()['entries'] == 2
+    assert cache.get('cam', 'e1', 0, now=20) is None
+
+
+def test_add_returns_the_reading_and_the_consensus():
+    cache = PlateCache(confident_readings=1)
+    cache.add('cam', 'e1', 1, '30F-55555', [0.9] * 9, now=0)
+    cache.add('cam', 'e1', 1, '30F-55555', [0.9] * 9, now=0)
+    assert cache.add('cam', 'e1', 1, '30F-55556', [0.9] * 9, now=0) == ('30F-55556', '30F-55555')
+
+
+def test_reused_track_id_of_a_new_tracker_misses():
+    cache = PlateCache(confident_readings=1)
+    cache.add('cam', 'e1', 1, '30F-55555', [1.0] * 9, now=0)
+    assert cache.get('cam', 'e1', 1, now=1) == '30F-55555'
+    assert cache.get('cam', 'e2', 1, now=1) is None
+
+
+def test_hits_do_not_extend_an_entry():
+    cache = PlateCache(ttl=10, confident_readings=1)
+    cache.add('cam', 'e1', 1, '30F-55555', [1.0] * 9, now=0)
+    assert cache.get('cam', 'e1', 1, now=9) == '30F-55555'
+    assert cache.get('cam', 'e1', 1, now=11) is None
@@ -0,0 +1,65 @@
+import pytest
+
+from qos import QosController
+
+LEVELS = [{'max_fps': 10, 'imgsz': 640}, {'max_fps': 5, 'imgsz': 480}, {'max_fps': 2, 'imgsz': 320}]
+
+
+def feed(controller, camera_id, latency_ms, count=10):
+    for _ in range(count):
+        controller.observe(camera_id, latency_ms)
+
+
+def test_admit_enforces_the_level_frame_rate():
+    controller = QosController(LEVELS, start_level=1)
+    assert [controller.admit('cam', t) for t in (0, 100, 190, 400)] == [True, False, True, True]
+    assert controller.stats()['cam']['throttled'] == 1
+
+
+def test_overload_downgrades_the_lowest_priority_camera():
+    controller = QosController(LEVELS, target_latency_ms=500)
+    feed(controller, 'busy', 800)
+    feed(controller, 'quiet', 100)
+    controller.set_near_line('busy', 2)
+    assert controller.step() == ('quiet', 0, 1, 'p95 latency 800ms > target 500ms')
+    # Old samples are dropped, so nothing moves until new ones arrive
+    assert controller.step() is None
+
+
+def test_violation_keeps_a_camera_at_its_level_longest():
+    controller = QosController(LEVELS, target_latency_ms=500)
+    feed(controller, 'a', 800)
+    feed(controller, 'b', 800)
+    controller.mark_violation('a')
+    controller.set_near_line('b', 1)
+    assert controller.step()[0] == 'b'
+
+
+def test_headroom_upgrades_the_highest_priority_camera():
+    controller = QosController(LEVELS, target_latency_ms=500, start_level=2, headroom=0.6)
+    feed(controller, 'a', 100)
+    feed(controller, 'b', 100)
+    controller.set_near_line('b', 1)
+    assert controller.step()[:3] == ('b', 2, 1)
+    assert controller.level('b') == LEVELS[1]
+
+
+def test_between_headroom_and_target_nothing_moves():
+    controller = QosController(LEVELS, target_latency_ms=500, start_level=1)
+    feed(controller, 'a', 400)
+    assert controller.step() is None
+
+
+def test_cameras_without_enough_samples_are_not_judged():
+    controller = QosController(LEVELS, min_samples=10)
+    feed(controller, 'a', 5000, count=9)
+    assert controller.step() is None
+
+
+def test_forget_and_validation():
+    controller = QosController(LEVELS, start_level=2)
+    controller.admit('cam', 0)
+    controller.forget('cam')
+    assert controller.stats() == {}
+    with pytest.raises(ValueError):
+        QosController([])
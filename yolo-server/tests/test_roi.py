@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from roi import RegionOfInterest, inference_size, load_rois
+
+
+def test_inference_size_rounds_up_to_stride_and_caps():
+    assert inference_size((270, 480), 640) == 480
+    assert inference_size((100, 130), 640) == 160
+    assert inference_size((1080, 1920), 640) == 640
+    assert inference_size((10, 10), 640) == 32
+
+
+def test_box_region_crop_is_a_view_with_offset():
+    roi = RegionOfInterest([[0.25, 0.5], [0.75, 1.0]])
+    frame = np.zeros((200, 400, 3), dtype=np.uint8)
+    crop, offset = roi.crop(frame)
+    assert crop.shape == (100, 200, 3) and offset == (100, 100)
+    assert np.shares_memory(crop, frame)
+
+
+def test_detections_are_shifted_back_to_frame_pixels():
+    roi = RegionOfInterest([[0.25, 0.5], [0.75, 1.0]])
+    detections = np.array([[10, 20, 30, 40, 0.9, 2]], dtype=np.float64)
+    shifted = roi.to_frame(detections, (100, 100), 400, 200)
+    assert shifted[0, :4].tolist() == [110, 120, 130, 140]
+    assert detections[0, 0] == 10  # Input left untouched
+
+
+def test_polygon_region_drops_detections_centered_outside():
+    roi = RegionOfInterest([[0, 0], [1, 0], [0, 1]])  # Upper-left triangle
+    frame_detections = np.array([[10, 10, 30, 30, 0.9, 0], [350, 170, 390, 190, 0.8, 0]], dtype=np.float64)
+    kept = roi.to_frame(frame_detections, (0, 0), 400, 200)
+    assert kept[:, 4].tolist() == [0.9]
+
+
+def test_load_rois_and_validation():
+    rois = load_rois({'cam': [[0, 0], [1, 1]]})
+    assert rois['cam'].rect(100, 50) == (0, 0, 100, 50)
+    with pytest.raises(ValueError):
+        RegionOfInterest([[0.5, 0.5]])
@@ -0,0 +1,54 @@
+import multiprocessing as mp
+
+from sharding import HashRing, ShardMembership, cpu_sets, stable_hash, worker_share
+
+CAMERAS = [f'camera-{i}' for i in range(200)]
+
+
+def test_stable_hash_is_deterministic():
+    assert stable_hash('camera-1') == stable_hash('camera-1') != stable_hash('camera-2')
+
+
+def test_every_member_gets_a_share():
+    ring = HashRing([0, 1, 2, 3])
+    owners = [ring.owner(camera) for camera in CAMERAS]
+    assert set(owners) == {0, 1, 2, 3}
+    assert min(owners.count(member) for member in range(4)) > len(CAMERAS) / 4 / 3
+
+
+def test_removing_a_member_only_moves_its_cameras():
+    before = HashRing([0, 1, 2, 3])
+    after = HashRing([0, 1, 3])
+    for camera in CAMERAS:
+        if before.owner(camera) != 2:
+            assert after.owner(camera) == before.owner(camera)
+        else:
+            assert after.owner(camera) in (0, 1, 3)
+
+
+def test_empty_ring_has_no_owner():
+    assert HashRing([]).owner('camera-1') is None
+
+
+def test_membership_rebuilds_ring_on_change():
+    membership = ShardMembership(3, context=mp.get_context('spawn'))
+    assert membership.owner('camera-1') is None
+    membership.join(0)
+    membership.join(2)
+    assert membership.members() == [0, 2]
+    ring = membership.ring()
+    assert membership.ring() is ring
+    membership.leave(0)
+    assert membership.ring() is not ring
+    assert {membership.owner(camera) for camera in CAMERAS} == {2}
+
+
+def test_cpu_sets_split_cpus_contiguously():
+    assert cpu_sets(2, cpus=[0, 1, 2, 3, 4]) == [[0, 1], [2, 3]]
+
+
+def test_worker_share_splits_host_budget():
+    assert worker_share(32, 1) == 32
+    assert worker_share(32, 4) == 8
+    assert worker_share(2, 4) == 1
+    assert worker_share(2, 4, minimum=2) == 2
@@ -0,0 +1,141 @@
+import threading
+import time
+
+from socket_emitter import DROP, LATEST, RELIABLE, Outbox, SocketEmitter
+
+
+class Recorder:
+    """send() that records what was sent and can be told to fail"""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.attempts = 0
+        self.sent = []
+        self.lock = threading.Lock()
+
+    def __call__(self, event, payload):
+        with self.lock:
+            self.attempts += 1
+            if self.failures:
+                self.failures -= 1
+                raise ConnectionError('send failed')
+            self.sent.append((event, payload))
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+def test_latest_outbox_coalesces_per_key():
+    merged = []
+    outbox = Outbox('car_detected', LATEST, merge=lambda old, new: merged.append((old, new)) or new)
+    outbox.put(1, 'a', 0.0)
+    outbox.put(2, 'b', 1.0)
+    outbox.put(1, 'c', 2.0)
+
+    assert len(outbox) == 2
+    assert outbox.coalesced == 1
+    assert merged == [('a', 'c')]
+    assert outbox.take() == (1, 'c', 0.0)  # Keeps its place and age
+
+
+def test_drop_outbox_drops_oldest_when_full():
+    outbox = Outbox('delta', DROP, maxsize=2)
+    assert outbox.put(1, 'a', 0.0) is None
+    outbox.put(2, 'b', 1.0)
+    assert outbox.put(3, 'c', 2.0) == 1
+    assert outbox.dropped == 1
+    assert [outbox.take()[1] for _ in range(2)] == ['b', 'c']
+
+
+def test_nothing_is_sent_while_disconnected():
+    send = Recorder()
+    emitter = SocketEmitter(send)
+    emitter.register('car_detected', LATEST)
+    emitter.start()
+    try:
+        emitter.emit('car_detected', 'a', key=1)
+        emitter.emit('car_detected', 'b', key=1)
+        time.sleep(0.05)
+        assert send.sent == []
+
+        emitter.set_connected(True)
+        assert wait_until(lambda: send.sent)
+        assert send.sent == [('car_detected', 'b')]
+    finally:
+        emitter.stop()
+
+
+def test_reliable_update_is_retried_until_sent():
+    send = Recorder(failures=2)
+    emitter = SocketEmitter(send, retry_backoff=0.01)
+    emitter.register('violation', RELIABLE)
+    emitter.set_connected(True)
+    emitter.start()
+    try:
+        emitter.emit('violation', 'plate', key=7)
+        assert wait_until(lambda: send.sent)
+        assert send.sent == [('violation', 'plate')]
+        stats = emitter.stats()['violation']
+        assert stats['errors'] == 2
+        assert stats['dropped'] == 0
+    finally:
+        emitter.stop()
+
+
+def test_reliable_update_is_dropped_after_max_attempts():
+    send = Recorder(failures=3)
+    dropped = []
+    emitter = SocketEmitter(send, max_send_attempts=3, retry_backoff=0.01)
+    emitter.register('violation', RELIABLE, on_drop=dropped.append)
+    emitter.set_connected(True)
+    emitter.start()
+    try:
+        emitter.emit('violation', 'stuck', key=1)
+        emitter.emit('violation', 'next', key=2)
+        assert wait_until(lambda: send.sent)
+        assert send.attempts == 4
+        assert send.sent == [('violation', 'next')]
+        assert dropped == [1]
+        stats = emitter.stats()['violation']
+        assert stats['dropped'] == 1
+        assert stats['errors'] == 3
+    finally:
+        emitter.stop()
+
+
+def test_backoff_does_not_hold_up_other_outboxes():
+    sent = []
+
+    def send(event, payload):
+        if event == 'violation':
+            raise ConnectionError('rejected')
+        sent.append(payload)
+
+    emitter = SocketEmitter(send, max_send_attempts=100, retry_backoff=0.5, max_retry_backoff=0.5)
+    emitter.register('violation', RELIABLE)
+    emitter.register('car_detected', LATEST)
+    emitter.set_connected(True)
+    emitter.start()
+    try:
+        emitter.emit('violation', 'stuck', key=1)
+        time.sleep(0.05)
+        emitter.emit('car_detected', 'frame', key=1)
+        assert wait_until(lambda: sent, timeout=0.3)
+        assert emitter.stats()['violation']['errors'] == 1
+    finally:
+        emitter.set_connected(False)
+        emitter.stop()
+
+
+def test_full_reliable_outbox_gives_up_after_timeout():
+    emitter = SocketEmitter(Recorder(), reliable_timeout=0.05)
+    emitter.register('violation', RELIABLE, maxsize=1)
+    assert emitter.emit('violation', 'a', key=1)
+    assert not emitter.emit('violation', 'b', key=2)
+    assert emitter.stats()['violation']['dropped'] == 1
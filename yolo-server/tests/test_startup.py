@@ -0,0 +1,31 @@
+from roi import load_rois, warmup_shapes
+from startup import StartupReport, warm_up, warmup_frames
+
+
+def test_warm_up_runs_every_shape_and_batch_size():
+    calls = []
+    timings = warm_up(lambda frames: calls.append((frames[0].shape, len(frames))), [(4, 6), (8, 8)],
+                      batch_sizes=(1, 2), iterations=2)
+    assert calls == [((4, 6, 3), 1)] * 2 + [((4, 6, 3), 2)] * 2 + [((8, 8, 3), 1)] * 2 + [((8, 8, 3), 2)] * 2
+    assert set(timings) == {((4, 6), 1), ((4, 6), 2), ((8, 8), 1), ((8, 8), 2)}
+    assert all(len(times) == 2 for times in timings.values())
+
+
+def test_warmup_frames_use_letterbox_gray():
+    frames = warmup_frames((2, 3), count=2)
+    assert len(frames) == 2 and frames[0].shape == (2, 3, 3) and (frames[0] == 114).all()
+
+
+def test_warmup_shapes_include_region_crops():
+    rois = load_rois({'cam1': [[0.0, 0.5], [0.5, 1.0]], 'cam2': [[0.0, 0.5], [0.5, 1.0]],
+                      'cam3': [[0.25, 0.0], [1.0, 0.0], [1.0, 1.0]]})
+    assert warmup_shapes(rois, [(540, 960)]) == [(540, 960), (270, 480), (540, 720)]
+    assert warmup_shapes({}, [(540, 960)]) == [(540, 960)]
+
+
+def test_startup_report_phases():
+    report = StartupReport('test')
+    report.mark('imports')
+    report.mark('model')
+    assert [phase for phase, _ in report.phases] == ['imports', 'model']
+    assert abs(sum(ms for _, ms in report.phases) - report.total_ms()) < 1e-6
@@ -0,0 +1,28 @@
+from state_store import TTLStore
+
+
+def test_expire_removes_keys_older_than_ttl():
+    store = TTLStore(ttl_ms=100)
+    store['a'] = 0
+    store['b'] = 50
+    store['a'] = 80  # Writing refreshes the key
+    assert store.expire(170) == 1
+    assert list(store) == ['a']
+    assert store.stats() == {'entries': 1, 'expired': 1, 'evicted': 0}
+
+
+def test_oldest_key_is_evicted_beyond_max_entries():
+    store = TTLStore(max_entries=2)
+    for i, key in enumerate('abc'):
+        store[key] = i
+    assert list(store) == ['b', 'c']
+    assert store.evicted == 1
+    assert store.expire(10 ** 9) == 0  # No TTL
+
+
+def test_remove_if():
+    store = TTLStore()
+    for key in [(1, 'x'), (2, 'x'), (1, 'y')]:
+        store[key] = 0
+    store.remove_if(lambda key: key[0] == 1)
+    assert list(store) == [(2, 'x')]
@@ -0,0 +1,48 @@
+import numpy as np
+
+from track_history import TrackHistory
+
+
+def test_ring_keeps_newest_points_oldest_first():
+    history = TrackHistory(max_tracks=4, max_points=3, max_age=100)
+    for t in range(5):
+        history.append(1, t, 10 * t, t, class_id=t % 2)
+    xy, times, class_ids = history.points(1)
+    assert times.tolist() == [2, 3, 4]
+    assert xy.tolist() == [[2, 20], [3, 30], [4, 40]]
+    assert class_ids.tolist() == [0, 1, 0]
+    assert history.last_position(1) == (4.0, 40.0)
+
+
+def test_old_points_are_masked_and_old_tracks_expired():
+    history = TrackHistory(max_tracks=4, max_points=10, max_age=10)
+    history.append(1, 0, 0, 0)
+    history.append(1, 1, 1, 8)
+    history.append(2, 5, 5, 20)
+    assert history.points(1, now=15)[1].tolist() == [8]
+    assert history.expire(20) == 1
+    assert 1 not in history and 2 in history
+
+
+def test_recent_returns_newest_tracks_first():
+    history = TrackHistory(max_tracks=8, max_points=5, max_age=1000)
+    for track_id, t in [(1, 10), (2, 30), (3, 20), (4, 5)]:
+        history.append(track_id, 0, 0, t)
+    assert [track[0] for track in history.recent(2)] == [2, 3]
+    assert [track[0] for track in history.recent(10)] == [2, 3, 1, 4]
+
+
+def test_full_history_reuses_least_recent_slot():
+    history = TrackHistory(max_tracks=2, max_points=5, max_age=1000)
+    history.append(1, 0, 0, 10)
+    history.append(2, 0, 0, 20)
+    history.append(3, 0, 0, 30)
+    assert 1 not in history and len(history) == 2
+
+
+def test_last_positions():
+    history = TrackHistory()
+    history.append(1, 3, 4, 0)
+    positions = history.last_positions([1, 99])
+    assert positions[0].tolist() == [3, 4]
+    assert np.isnan(positions[1]).all()
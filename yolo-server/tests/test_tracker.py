@@ -0,0 +1,73 @@
+import numpy as np
+
+from tracker import CameraTracker, greedy_match, iou_matrix
+
+
+def moving_boxes(step):
+    return np.array([[100 + 5 * step, 100, 200 + 5 * step, 180],
+                     [400, 300 - 4 * step, 480, 380 - 4 * step]], dtype=np.float64)
+
+
+def test_iou_matrix():
+    iou = iou_matrix(np.array([[0, 0, 10, 10]]), np.array([[0, 0, 10, 10], [5, 0, 15, 10], [20, 20, 30, 30]]))
+    np.testing.assert_allclose(iou, [[1.0, 1 / 3, 0.0]])
+
+
+def test_greedy_match_takes_best_pairs_above_threshold():
+    rows, cols = greedy_match(np.array([[0.9, 0.8], [0.85, 0.1]]), 0.2)
+    assert sorted(zip(rows.tolist(), cols.tolist())) == [(0, 0)]
+
+
+def test_ids_stay_with_moving_objects():
+    tracker = CameraTracker()
+    ids = None
+    for step in range(10):
+        tracks = tracker.update(moving_boxes(step), np.array([0.9, 0.8]), np.array([2, 7]))
+        assert len(tracks) == 2
+        order = np.argsort(tracks[:, 7])
+        current = tracks[order, 4].astype(np.int64).tolist()
+        assert ids is None or current == ids
+        ids = current
+        assert tracks[order, 6].tolist() == [2, 7]
+    assert len(set(ids)) == 2
+
+
+def test_large_track_ids_are_exact():
+    tracker = CameraTracker()
+    tracker.next_id = 2 ** 24 + 1  # Not representable in float32
+    tracks = tracker.update(moving_boxes(0), np.array([0.9, 0.8]), np.array([2, 2]))
+    assert tracks.dtype == np.float64
+    assert sorted(tracks[:, 4].astype(np.int64).tolist()) == [2 ** 24 + 1, 2 ** 24 + 2]
+
+
+def test_predict_coasts_tracks_and_ages_them_out():
+    tracker = CameraTracker(track_buffer=3)
+    for step in range(3):
+        tracker.update(moving_boxes(step), np.array([0.9, 0.8]), np.array([2, 2]))
+    predicted = tracker.predict()
+    assert len(predicted) == 2
+    assert (predicted[:, 7] == -1).all()
+    # Kept moving by the motion model
+    assert predicted[:, 0].min() > moving_boxes(2)[0, 0]
+
+    for _ in range(3):
+        tracker.predict()
+    assert tracker.active_count == 0
+    assert len(tracker.predict()) == 0
+
+
+def test_lost_track_is_recovered_within_buffer():
+    tracker = CameraTracker(track_buffer=30)
+    box = np.array([[100, 100, 200, 180]], dtype=np.float64)
+    first = tracker.update(box, [0.9], [2])
+    tracker.update(np.zeros((0, 4)), [], [])
+    again = tracker.update(box, [0.9], [2])
+    assert again[0, 4] == first[0, 4]
+
+
+def test_epoch_changes_when_track_ids_restart():
+    tracker = CameraTracker()
+    first = tracker.epoch
+    assert CameraTracker().epoch != first
+    tracker.reset()
+    assert tracker.epoch != first
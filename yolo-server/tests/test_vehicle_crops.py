@@ -0,0 +1,52 @@
+import cv2
+import numpy as np
+
+from vehicle_crops import CropEmitter, encode_crop, fit_size
+
+CLASS_NAMES = ['car', 'truck']
+
+
+def test_fit_size_only_scales_down():
+    assert fit_size(600, 300, 300) == (300, 150)
+    assert fit_size(100, 50, 300) == (100, 50)
+
+
+def test_encode_crop_produces_a_fitting_jpeg():
+    crop = np.full((200, 400, 3), 90, dtype=np.uint8)
+    decoded = cv2.imdecode(np.frombuffer(encode_crop(crop, 100, 85), np.uint8), cv2.IMREAD_COLOR)
+    assert decoded.shape == (50, 100, 3)
+
+
+def test_crops_are_rate_limited_per_track_and_skip_small_boxes():
+    emitter = CropEmitter(lambda crop: None, interval_ms=1000, min_size=24)
+    last_crop_times = {}
+    boxes = np.array([[0, 0, 100, 60], [0, 0, 10, 10], [50, 50, 150, 150]])
+    track_ids = np.array([1, 2, 3])
+    assert emitter.select(last_crop_times, boxes, track_ids, 0) == [0, 2]
+    assert emitter.select(last_crop_times, boxes, track_ids, 500) == []
+    assert emitter.select(last_crop_times, boxes[:1], track_ids[:1], 1000) == [0]
+    emitter.stop()
+
+
+def test_submitted_crops_are_padded_encoded_and_emitted():
+    emitted = []
+    emitter = CropEmitter(emitted.append, padding=0.1, max_size=300)
+    frame = np.zeros((200, 400, 3), dtype=np.uint8)
+    queued = emitter.submit({}, frame, np.array([[100, 50, 200, 150]]), np.array([7]), np.array([1]),
+                            np.array([0.8]), CLASS_NAMES, {'camera_id': 'cam', 'image_id': 'img', 'created_at': 0})
+    emitter.stop()
+    assert queued == 1 and len(emitted) == 1
+    crop = emitted[0]
+    assert (crop['camera_id'], crop['track_id'], crop['class']) == ('cam', 7, 'truck')
+    assert crop['bbox'] == {'x1': 90 / 400, 'y1': 40 / 200, 'x2': 210 / 400, 'y2': 160 / 200}
+    assert (crop['crop_width'], crop['crop_height']) == (120, 120)
+    assert crop['image_data'][:2] == b'\xff\xd8'
+    assert emitter.stats()['emitted'] == 1
+
+
+def test_crops_beyond_max_pending_are_dropped():
+    emitter = CropEmitter(lambda crop: None, max_pending=0)
+    queued = emitter.submit({}, np.zeros((100, 100, 3), np.uint8), np.array([[0, 0, 50, 50]]), np.array([1]),
+                            np.array([0]), np.array([0.9]), CLASS_NAMES, {'created_at': 0})
+    emitter.stop()
+    assert queued == 0 and emitter.stats()['dropped'] == 1
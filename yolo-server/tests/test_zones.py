@@ -0,0 +1,122 @@
+import numpy as np
+import pytest
+
+from zones import CameraZones, CountingLine, PolygonZone, ZoneEngine, horizontal_line, parse_zones
+
+CLASS_NAMES = ['car', 'truck']
+
+
+def points(*xy):
+    return np.array(xy, dtype=np.float64).reshape(-1, 2)
+
+
+def test_line_crossing_direction():
+    engine = ZoneEngine([horizontal_line('middle', 0.5)])
+    direction = engine.crossings(points((0.5, 0.4), (0.5, 0.6), (0.5, 0.4)),
+                                 points((0.5, 0.6), (0.5, 0.4), (0.5, 0.45)))
+    # Downward is +1 for a line drawn left to right, upward is -1, staying on one side is 0
+    assert direction[:, 0].tolist() == [1, -1, 0]
+
+
+def test_crossing_must_pass_between_segment_endpoints():
+    engine = ZoneEngine([CountingLine('short', (0.2, 0.5), (0.4, 0.5))])
+    direction = engine.crossings(points((0.3, 0.4), (0.6, 0.4), (0.1, 0.4)),
+                                 points((0.3, 0.6), (0.6, 0.6), (0.5, 0.6)))
+    # Through the segment, past its end, and diagonally across it
+    assert direction[:, 0].tolist() == [1, 0, 1]
+
+
+def test_crossing_ending_on_the_line_is_counted_once():
+    engine = ZoneEngine([horizontal_line('middle', 0.5)])
+    assert engine.crossings(points((0.5, 0.4)), points((0.5, 0.5)))[0, 0] == 0
+    assert engine.crossings(points((0.5, 0.5)), points((0.5, 0.6)))[0, 0] == 1
+
+
+def test_unknown_previous_position_never_crosses():
+    engine = ZoneEngine([horizontal_line('middle', 0.5)])
+    assert engine.crossings(points((np.nan, np.nan)), points((0.5, 0.6)))[0, 0] == 0
+
+
+def test_line_directions_filter():
+    engine = ZoneEngine([CountingLine('in', (0, 0.5), (1, 0.5), 'forward'),
+                         CountingLine('out', (0, 0.5), (1, 0.5), 'backward')])
+    direction = engine.crossings(points((0.5, 0.4), (0.5, 0.6)), points((0.5, 0.6), (0.5, 0.4)))
+    assert direction.tolist() == [[1, 0], [0, -1]]
+
+
+def test_polygon_contains():
+    engine = ZoneEngine(polygons=[PolygonZone('square', [(0.2, 0.2), (0.6, 0.2), (0.6, 0.6), (0.2, 0.6)]),
+                                  PolygonZone('triangle', [(0, 0), (1, 0), (0, 1)])])
+    inside = engine.contains(points((0.4, 0.4), (0.8, 0.8), (0.1, 0.1)))
+    assert inside.tolist() == [[True, True], [False, False], [False, True]]
+
+
+def test_camera_zones_counts_each_crossing_once():
+    zones = CameraZones([horizontal_line('middle', 0.5)], [], CLASS_NAMES)
+    track_ids = np.array([1, 2])
+    crossings, _ = zones.update(track_ids, points((0.5, 0.4), (0.2, 0.6)), points((0.5, 0.6), (0.2, 0.4)),
+                                ['car', 'truck'], now=1000)
+    assert crossings == [(1, 1, 'middle', 'car'), (2, -1, 'middle', 'truck')]
+
+    # Jitter back and forth over the line does not count the same track twice
+    zones.update(track_ids[:1], points((0.5, 0.6)), points((0.5, 0.4)), ['car'], now=1040)
+    crossings, _ = zones.update(track_ids[:1], points((0.5, 0.4)), points((0.5, 0.6)), ['car'], now=1080)
+    assert crossings == []
+    total_up, total_down, by_type_up, by_type_down = zones.totals()
+    assert (total_up, total_down) == (2, 1)
+    assert by_type_down == {'car': 1, 'truck': 0}
+    assert by_type_up == {'car': 1, 'truck': 1}
+
+
+def test_counted_crossings_expire():
+    zones = CameraZones([horizontal_line('middle', 0.5)], [], CLASS_NAMES, counted_ttl_ms=1000)
+    zones.update(np.array([1]), points((0.5, 0.4)), points((0.5, 0.6)), ['car'], now=0)
+    assert zones.expire(2000) == 1
+    crossings, _ = zones.update(np.array([1]), points((0.5, 0.4)), points((0.5, 0.6)), ['car'], now=2000)
+    assert len(crossings) == 1
+
+
+def test_polygon_enter_and_exit():
+    zones = CameraZones([], [PolygonZone('box', [(0.2, 0.2), (0.6, 0.2), (0.6, 0.6), (0.2, 0.6)])], CLASS_NAMES)
+    track_ids = np.array([5])
+    _, state = zones.update(track_ids, points((0.1, 0.1)), points((0.4, 0.4)), ['car'])
+    assert state['box'] == {'occupancy': 1, 'by_type': {'car': 1, 'truck': 0}, 'entered': [5], 'exited': []}
+    _, state = zones.update(track_ids, points((0.4, 0.4)), points((0.45, 0.4)), ['car'])
+    assert state['box']['entered'] == [] and state['box']['occupancy'] == 1
+    _, state = zones.update(track_ids, points((0.45, 0.4)), points((0.8, 0.8)), ['car'])
+    assert state['box']['exited'] == [5] and state['box']['occupancy'] == 0
+
+
+def test_predicted_positions_count_nothing():
+    zones = CameraZones([horizontal_line('middle', 0.5)],
+                        [PolygonZone('box', [(0.2, 0.2), (0.6, 0.2), (0.6, 0.6), (0.2, 0.6)])], CLASS_NAMES)
+    track_ids = np.array([3])
+    crossings, state = zones.update(track_ids, points((0.4, 0.4)), points((0.4, 0.55)), ['car'], predicted=True)
+    assert crossings == []
+    assert state['box']['occupancy'] == 1 and state['box']['entered'] == []
+
+    # The track entering for real is still reported once it is detected
+    _, state = zones.update(track_ids, points((0.4, 0.55)), points((0.4, 0.45)), ['car'])
+    assert state['box']['entered'] == [3]
+
+
+def test_forget_drops_state_of_dead_tracks():
+    zones = CameraZones([horizontal_line('middle', 0.5)],
+                        [PolygonZone('box', [(0, 0), (1, 0), (1, 1), (0, 1)])], CLASS_NAMES)
+    zones.update(np.array([1, 2]), points((0.5, 0.4), (0.5, 0.4)), points((0.5, 0.6), (0.5, 0.6)), ['car', 'car'])
+    zones.forget(lambda track_id: track_id == 2)
+    assert list(zones.inside) == [2]
+    assert all(key[0] == 2 for key in zones.counted)
+
+
+def test_parse_zones():
+    lines, polygons = parse_zones([
+        {'type': 'line', 'name': 'stop', 'points': [[0, 0.5], [1, 0.5]], 'directions': 'forward'},
+        {'type': 'polygon', 'points': [[0, 0], [1, 0], [1, 1]]},
+    ])
+    assert [(line.name, line.directions) for line in lines] == [('stop', 'forward')]
+    assert [polygon.name for polygon in polygons] == ['polygon_1']
+    with pytest.raises(ValueError):
+        parse_zones([{'type': 'circle'}])
+    with pytest.raises(ValueError):
+        parse_zones([{'type': 'line', 'points': [[0, 0], [1, 1]], 'directions': 'sideways'}])
@@ -0,0 +1,137 @@
+"""Fixed-capacity per-object position history on NumPy ring buffers.
+
+TrackHistory keeps the last max_points (x, y, t, class id) samples of up to
+max_tracks objects in preallocated arrays. Appending a point is O(1), points
+older than max_age are masked out on read instead of being deleted, expired
+tracks are released with one vectorized comparison, and the most recently
+seen tracks are selected with argpartition (O(n)) rather than a full sort.
+
+Times can be in any unit as long as max_age and the `now` passed in use the
+same one (server.py uses the event created_at in milliseconds).
+"""
+import numpy as np
+
+
+class TrackHistory:
+    """Ring-buffer history of object positions keyed by track id
+
+    Args:
+        max_tracks: Number of objects that can be tracked at once (oldest is evicted beyond that)
+        max_points: Points kept per object
+        max_age: Points and objects older than this are expired
+    """
+
+    def __init__(self, max_tracks=128, max_points=30, max_age=5.0):
+        self.max_tracks = max_tracks
+        self.max_points = max_points
+        self.max_age = max_age
+
+        self.xy = np.zeros((max_tracks, max_points, 2), dtype=np.float64)
+        self.times = np.zeros((max_tracks, max_points), dtype=np.float64)
+        self.class_ids = np.zeros((max_tracks, max_points), dtype=np.int32)
+        self.head = np.zeros(max_tracks, dtype=np.int64)  # Next write position in each ring
+        self.count = np.zeros(max_tracks, dtype=np.int64)  # Valid points in each ring
+        self.track_ids = np.full(max_tracks, -1, dtype=np.int64)
+        self.last_time = np.full(max_tracks, -np.inf)
+        self.slots = {}  # track_id -> slot
+        self.free_slots = list(range(max_tracks - 1, -1, -1))
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __contains__(self, track_id):
+        return track_id in self.slots
+
+    def _release(self, slot):
+        del self.slots[int(self.track_ids[slot])]
+        self.track_ids[slot] = -1
+        self.count[slot] = 0
+        self.head[slot] = 0
+        self.last_time[slot] = -np.inf
+        self.free_slots.append(int(slot))
+
+    def _slot_for(self, track_id):
+        slot = self.slots.get(track_id)
+        if slot is not None:
+            return slot
+        if not self.free_slots:
+            # Full: reuse the slot of the object seen longest ago
+            self._release(int(np.argmin(self.last_time)))
+        slot = self.free_slots.pop()
+        self.slots[track_id] = slot
+        self.track_ids[slot] = track_id
+        return slot
+
+    def last_position(self, track_id):
+        """Most recent (x, y) of a track, or None if it has no history"""
+        slot = self.slots.get(track_id)
+        if slot is None or self.count[slot] == 0:
+            return None
+        index = (self.head[slot] - 1) % self.max_points
+        return float(self.xy[slot, index, 0]), float(self.xy[slot, index, 1])
+
+    def last_positions(self, track_ids):
+        """(N, 2) most recent positions of several tracks, NaN rows for tracks without history"""
+        positions = np.full((len(track_ids), 2), np.nan)
+        slots = np.array([self.slots.get(t, -1) for t in track_ids], dtype=np.int64)
+        known = slots >= 0
+        known[known] = self.count[slots[known]] > 0
+        index = (self.head[slots[known]] - 1) % self.max_points
+        positions[known] = self.xy[slots[known], index]
+        return positions
+
+    def append(self, track_id, x, y, t, class_id=0):
+        """Record a new point for a track in O(1)"""
+        slot = self._slot_for(track_id)
+        index = self.head[slot]
+        self.xy[slot, index, 0] = x
+        self.xy[slot, index, 1] = y
+        self.times[slot, index] = t
+        self.class_ids[slot, index] = class_id
+        self.head[slot] = (index + 1) % self.max_points
+        if self.count[slot] < self.max_points:
+            self.count[slot] += 1
+        self.last_time[slot] = t
+
+    def expire(self, now):
+        """Release every track whose newest point is older than max_age"""
+        expired = np.flatnonzero((self.track_ids >= 0) & (now - self.last_time > self.max_age))
+        for slot in expired.tolist():
+            self._release(slot)
+        return len(expired)
+
+    def points(self, track_id, now=None):
+        """Points of a track, oldest first, as (xy (K, 2), times (K,), class_ids (K,))"""
+        slot = self.slots.get(track_id)
+        if slot is None:
+            return np.zeros((0, 2)), np.zeros(0), np.zeros(0, dtype=np.int32)
+        return self._slot_points(slot, now)
+
+    def _slot_points(self, slot, now):
+        count = int(self.count[slot])
+        order = (self.head[slot] - count + np.arange(count)) % self.max_points
+        times = self.times[slot, order]
+        if now is not None:
+            order = order[now - times <= self.max_age]
+            times = self.times[slot, order]
+        return self.xy[slot, order], times, self.class_ids[slot, order]
+
+    def recent(self, n, now=None):
+        """The n most recently seen tracks, newest first
+
+        Returns:
+            List of (track_id, xy (K, 2), times (K,), class_ids (K,)) with points oldest first
+        """
+        live = np.flatnonzero(self.track_ids >= 0)
+        if now is not None:
+            live = live[now - self.last_time[live] <= self.max_age]
+        if len(live) > n:
+            live = live[np.argpartition(-self.last_time[live], n - 1)[:n]]
+        live = live[np.argsort(-self.last_time[live], kind='stable')]
+
+        tracks = []
+        for slot in live.tolist():
+            xy, times, class_ids = self._slot_points(slot, now)
+            if len(times):
+                tracks.append((int(self.track_ids[slot]), xy, times, class_ids))
+        return tracks
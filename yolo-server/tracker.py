@@ -0,0 +1,323 @@
+"""ByteTrack-style multi-object tracker on preallocated NumPy arrays.
+
+Each camera owns one CameraTracker. Track state (Kalman mean/covariance, ids,
+scores, classes, ages) lives in fixed-capacity arrays, and every step of an
+update - prediction, IoU computation, association and correction - runs on all
+tracks at once. The tracker only needs plain detection arrays, so detection
+can run batched across cameras and tracking stays cheap CPU work that never
+touches the model.
+
+Track ids start again at 1 for every new tracker (a new camera thread, a
+restarted process or shard, a reclaimed idle camera) and after reset(), so a
+consumer that keys state on track ids must also key on the tracker's epoch, a
+random id regenerated each time numbering restarts.
+"""
+import os
+
+import numpy as np
+
+# Kalman noise weights relative to box size (same as ByteTrack)
+STD_WEIGHT_POSITION = 1.0 / 20
+STD_WEIGHT_VELOCITY = 1.0 / 160
+
+# Track states
+FREE = 0
+TRACKED = 1
+LOST = 2
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """Pairwise IoU between (N, 4) and (M, 4) xyxy boxes"""
+    if len(boxes_a) == 0 or len(boxes_b) == 0:
+        return np.zeros((len(boxes_a), len(boxes_b)), dtype=np.float32)
+    tl = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    br = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    inter = np.clip(br - tl, 0, None).prod(axis=2)
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def greedy_match(similarity, threshold):
+    """Greedy one-to-one matching on a similarity matrix
+
+    Repeatedly takes the best remaining pair until none reaches the threshold.
+
+    Returns:
+        (rows, cols) index arrays of the matched pairs
+    """
+    rows, cols = [], []
+    if similarity.size == 0:
+        return np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64)
+    sim = similarity.copy()
+    for _ in range(min(sim.shape)):
+        flat = int(np.argmax(sim))
+        row, col = divmod(flat, sim.shape[1])
+        if sim[row, col] < threshold:
+            break
+        rows.append(row)
+        cols.append(col)
+        sim[row, :] = -1.0
+        sim[:, col] = -1.0
+    return np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64)
+
+
+def xyxy_to_xywh(boxes):
+    xywh = np.empty_like(boxes)
+    xywh[:, 0] = (boxes[:, 0] + boxes[:, 2]) / 2
+    xywh[:, 1] = (boxes[:, 1] + boxes[:, 3]) / 2
+    xywh[:, 2] = boxes[:, 2] - boxes[:, 0]
+    xywh[:, 3] = boxes[:, 3] - boxes[:, 1]
+    return xywh
+
+
+def xywh_to_xyxy(boxes):
+    xyxy = np.empty_like(boxes)
+    xyxy[:, :2] = boxes[:, :2] - boxes[:, 2:4] / 2
+    xyxy[:, 2:] = boxes[:, :2] + boxes[:, 2:4] / 2
+    return xyxy
+
+
+def new_epoch():
+    """Random id telling apart the track id sequences of different trackers"""
+    return os.urandom(6).hex()
+
+
+class CameraTracker:
+    """Tracker state for a single camera
+
+    Args:
+        max_tracks: Capacity of the preallocated track arrays
+        frame_rate: Camera frame rate, used to scale how long lost tracks are kept
+        track_buffer: Frames a lost track is kept at 30 FPS before it is removed
+        track_high_thresh: Minimum confidence for the first association round
+        track_low_thresh: Minimum confidence for the second association round
+        new_track_thresh: Minimum confidence to start a new track
+        match_thresh: Minimum (score-fused) IoU for the first association round
+    """
+
+    def __init__(self, max_tracks=128, frame_rate=30, track_buffer=30, track_high_thresh=0.5,
+                 track_low_thresh=0.1, new_track_thresh=0.6, match_thresh=0.2):
+        self.max_tracks = max_tracks
+        self.max_time_lost = max(1, int(frame_rate / 30.0 * track_buffer))
+        self.track_high_thresh = track_high_thresh
+        self.track_low_thresh = track_low_thresh
+        self.new_track_thresh = new_track_thresh
+        self.match_thresh = match_thresh
+        self.second_match_thresh = 0.5
+
+        # Preallocated track state
+        self.mean = np.zeros((max_tracks, 8), dtype=np.float64)  # cx, cy, w, h and their velocities
+        self.covariance = np.zeros((max_tracks, 8, 8), dtype=np.float64)
+        self.state = np.full(max_tracks, FREE, dtype=np.int8)
+        self.track_ids = np.zeros(max_tracks, dtype=np.int64)
+        self.scores = np.zeros(max_tracks, dtype=np.float32)
+        self.classes = np.zeros(max_tracks, dtype=np.float32)
+        self.hits = np.zeros(max_tracks, dtype=np.int32)
+        self.time_since_update = np.zeros(max_tracks, dtype=np.int32)
+        self.activated = np.zeros(max_tracks, dtype=bool)
+
+        self.frame_id = 0
+        self.next_id = 1
+        self.epoch = new_epoch()
+
+        # Constant-velocity motion model
+        self._motion = np.eye(8)
+        self._motion[:4, 4:] = np.eye(4)
+
+    def reset(self):
+        self.state[:] = FREE
+        self.activated[:] = False
+        self.frame_id = 0
+        self.next_id = 1
+        self.epoch = new_epoch()
+
+    @property
+    def active_count(self):
+        return int(np.count_nonzero(self.state != FREE))
+
+    def _predict(self, slots):
+        if len(slots) == 0:
+            return
+        mean = self.mean[slots]
+        # Lost tracks should not keep growing or shrinking
+        lost = self.state[slots] == LOST
+        mean[lost, 6:8] = 0
+
+        w = mean[:, 2]
+        h = mean[:, 3]
+        std = np.stack([
+            STD_WEIGHT_POSITION * w, STD_WEIGHT_POSITION * h, STD_WEIGHT_POSITION * w, STD_WEIGHT_POSITION * h,
+            STD_WEIGHT_VELOCITY * w, STD_WEIGHT_VELOCITY * h, STD_WEIGHT_VELOCITY * w, STD_WEIGHT_VELOCITY * h,
+        ], axis=1)
+        noise = np.zeros((len(slots), 8, 8))
+        idx = np.arange(8)
+        noise[:, idx, idx] = std ** 2
+
+        self.mean[slots] = mean @ self._motion.T
+        self.covariance[slots] = self._motion @ self.covariance[slots] @ self._motion.T + noise
+
+    def _correct(self, slots, measurements):
+        """Kalman update of the given slots with (M, 4) xywh measurements"""
+        if len(slots) == 0:
+            return
+        mean = self.mean[slots]
+        cov = self.covariance[slots]
+
+        w = mean[:, 2]
+        h = mean[:, 3]
+        std = np.stack([
+            STD_WEIGHT_POSITION * w, STD_WEIGHT_POSITION * h, STD_WEIGHT_POSITION * w, STD_WEIGHT_POSITION * h,
+        ], axis=1)
+        idx = np.arange(4)
+        projected_cov = cov[:, :4, :4].copy()
+        projected_cov[:, idx, idx] += std ** 2
+
+        # K = P H^T S^-1, with H selecting the first four state entries
+        gain = cov[:, :, :4] @ np.linalg.inv(projected_cov)
+        innovation = measurements - mean[:, :4]
+        self.mean[slots] = mean + np.einsum('nij,nj->ni', gain, innovation)
+        self.covariance[slots] = cov - gain @ projected_cov @ gain.transpose(0, 2, 1)
+
+    def _initiate(self, boxes_xywh, scores, classes):
+        """Start tracks in free slots, returning the slots used (detections beyond capacity are dropped)"""
+        free = np.flatnonzero(self.state == FREE)
+        count = min(len(free), len(boxes_xywh))
+        if count == 0:
+            return free[:0]
+        slots = free[:count]
+        boxes_xywh = boxes_xywh[:count]
+
+        w = boxes_xywh[:, 2]
+        h = boxes_xywh[:, 3]
+        std = np.stack([
+            2 * STD_WEIGHT_POSITION * w, 2 * STD_WEIGHT_POSITION * h,
+            2 * STD_WEIGHT_POSITION * w, 2 * STD_WEIGHT_POSITION * h,
+            10 * STD_WEIGHT_VELOCITY * w, 10 * STD_WEIGHT_VELOCITY * h,
+            10 * STD_WEIGHT_VELOCITY * w, 10 * STD_WEIGHT_VELOCITY * h,
+        ], axis=1)
+        self.mean[slots, :4] = boxes_xywh
+        self.mean[slots, 4:] = 0
+        self.covariance[slots] = 0
+        idx = np.arange(8)
+        self.covariance[slots[:, None], idx, idx] = std ** 2
+
+        self.state[slots] = TRACKED
+        self.track_ids[slots] = np.arange(self.next_id, self.next_id + count)
+        self.next_id += count
+        self.scores[slots] = scores[:count]
+        self.classes[slots] = classes[:count]
+        self.hits[slots] = 1
+        self.time_since_update[slots] = 0
+        # Only tracks from the very first frame are trusted without a second hit
+        self.activated[slots] = self.frame_id == 1
+        return slots
+
+    def predict(self):
+        """Advance all tracks by one frame without detections (the frame was not run through the model)
+
+        Tracks are moved by their motion model only. The frame still counts as one without a match,
+        so coasting tracks age like unmatched ones and are freed after max_time_lost frames; the next
+        update() marks them lost. Positions from here are estimates and should not count crossings.
+
+        Returns:
+            (K, 8) array in the update() layout for every confirmed tracked track, detection_index -1
+        """
+        self.frame_id += 1
+        live = np.flatnonzero(self.state != FREE)
+        self._predict(live)
+        self.time_since_update[live] += 1
+        expired = live[self.time_since_update[live] > self.max_time_lost]
+        self.state[expired] = FREE
+        live = live[self.state[live] != FREE]
+
+        slots = live[(self.state[live] == TRACKED) & self.activated[live]]
+        output = np.empty((len(slots), 8), dtype=np.float64)
+        output[:, :4] = xywh_to_xyxy(self.mean[slots, :4])
+        output[:, 4] = self.track_ids[slots]
+        output[:, 5] = self.scores[slots]
+        output[:, 6] = self.classes[slots]
+        output[:, 7] = -1
+        return output
+
+    def update(self, boxes, scores, classes):
+        """Advance all tracks by one frame and associate them with new detections
+
+        Args:
+            boxes: (N, 4) xyxy detection boxes in pixels
+            scores: (N,) detection confidences
+            classes: (N,) detection class ids
+
+        Returns:
+            (K, 8) array of [x1, y1, x2, y2, track_id, score, class, detection_index] for every
+            confirmed track matched in this frame, the same layout ultralytics trackers return.
+            float64, so track ids stay exact far beyond float32's 2^24
+        """
+        self.frame_id += 1
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        scores = np.asarray(scores, dtype=np.float32).reshape(-1)
+        classes = np.asarray(classes, dtype=np.float32).reshape(-1)
+
+        live = np.flatnonzero(self.state != FREE)
+        self._predict(live)
+        self.time_since_update[live] += 1
+
+        high = np.flatnonzero(scores >= self.track_high_thresh)
+        low = np.flatnonzero((scores >= self.track_low_thresh) & (scores < self.track_high_thresh))
+        matched_slots = []
+        matched_dets = []
+
+        # First association: all live tracks against high-confidence detections
+        track_boxes = xywh_to_xyxy(self.mean[live, :4])
+        similarity = iou_matrix(track_boxes, boxes[high]) * scores[high][None, :]
+        rows, cols = greedy_match(similarity, self.match_thresh)
+        matched_slots.append(live[rows])
+        matched_dets.append(high[cols])
+
+        # Second association: remaining tracked (not lost) tracks against low-confidence detections
+        unmatched = np.ones(len(live), dtype=bool)
+        unmatched[rows] = False
+        remaining = live[unmatched]
+        remaining = remaining[self.state[remaining] == TRACKED]
+        if len(remaining) and len(low):
+            similarity = iou_matrix(xywh_to_xyxy(self.mean[remaining, :4]), boxes[low])
+            rows2, cols2 = greedy_match(similarity, self.second_match_thresh)
+            matched_slots.append(remaining[rows2])
+            matched_dets.append(low[cols2])
+
+        matched_slots = np.concatenate(matched_slots)
+        matched_dets = np.concatenate(matched_dets)
+
+        # Correct matched tracks with their detections
+        self._correct(matched_slots, xyxy_to_xywh(boxes[matched_dets]))
+        self.state[matched_slots] = TRACKED
+        self.scores[matched_slots] = scores[matched_dets]
+        self.classes[matched_slots] = classes[matched_dets]
+        self.hits[matched_slots] += 1
+        self.time_since_update[matched_slots] = 0
+        self.activated[matched_slots] = True
+
+        # Unmatched tracks become lost, and are freed once lost for too long
+        unmatched_live = live[self.time_since_update[live] > 0]
+        self.state[unmatched_live] = LOST
+        self.state[unmatched_live[~self.activated[unmatched_live]]] = FREE
+        expired = unmatched_live[self.time_since_update[unmatched_live] > self.max_time_lost]
+        self.state[expired] = FREE
+
+        # Start new tracks from confident unmatched detections
+        used = np.zeros(len(scores), dtype=bool)
+        used[matched_dets] = True
+        new_dets = np.flatnonzero(~used & (scores >= self.new_track_thresh))
+        new_slots = self._initiate(xyxy_to_xywh(boxes[new_dets]), scores[new_dets], classes[new_dets])
+        confirmed = self.activated[new_slots]
+
+        # Report confirmed tracks seen in this frame
+        output_slots = np.concatenate([matched_slots, new_slots[confirmed]])
+        output_dets = np.concatenate([matched_dets, new_dets[:len(new_slots)][confirmed]])
+        output = np.empty((len(output_slots), 8), dtype=np.float64)
+        output[:, :4] = xywh_to_xyxy(self.mean[output_slots, :4])
+        output[:, 4] = self.track_ids[output_slots]
+        output[:, 5] = self.scores[output_slots]
+        output[:, 6] = self.classes[output_slots]
+        output[:, 7] = output_dets
+        return output
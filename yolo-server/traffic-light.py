@@ -1,13 +1,23 @@
+# Created before the heavy imports so the startup report can time them
+from startup import StartupReport, warm_up
+startup_report = StartupReport('traffic light')
+
+import asyncio
 import cv2
+import os
 import numpy as np
-import socketio
-import base64
 import time
-import threading
 from ultralytics import YOLO
 import queue
-import io
-from PIL import Image
+from frame_decode import FramePool, decode_frame
+from decode_pool import DecodePool, start_forwarder
+from frame_mailbox import MailboxGroup, print_mailbox_stats
+from roi import inference_size, load_rois, warmup_shapes
+from metrics import REGISTRY, start_metrics_server, startup_collector
+from rate_log import RateLimitedLog
+from socket_emitter import LATEST, SocketEmitter, print_emitter_stats, register_emitter_metrics
+from service_runtime import ServiceRuntime
+startup_report.mark('imports')
 
 # ---------------------------------------------------------------------------- #
 #                              Model configuration                             #
@@ -15,13 +25,50 @@ from PIL import Image
 MODEL_PATH = "./models/mhiot-dentinhieu-best-new-nano.pt"
 # MODEL_PATH = "./models/mhiot-dentinhieu-best-new.pt"
 CONFIDENCE_THRESHOLD = 0.4 
-SOCKETIO_SERVER_URL = 'wss://172.28.31.150:3000'
+MODEL_INPUT_SIZE = 640  # Large JPEGs are decoded at reduced scale down to this size
+MAX_FRAME_DIMENSION = 1280  # Maximum dimension to process
+
+# Decode worker processes (frames handed back through shared memory)
+ENABLE_DECODE_POOL = True
+DECODE_WORKERS = 1
+DECODE_SLOTS = 16  # Each frame keeps its slot until processed or dropped: at least two per camera
+DECODE_THREADS = 2  # Decode executor threads when the worker processes are disabled
+
+# Per-camera frame mailboxes (newest frame wins)
+MAX_FRAME_AGE_MS = 1000  # Frames older than this are dropped instead of processed
+MAILBOX_STATS_INTERVAL = 30.0  # Seconds between per-camera drop/age reports
+CAMERA_IDLE_TIMEOUT = 300.0  # Seconds without an image before a camera's mailbox and state are released (None: never)
+CAMERA_REAP_INTERVAL = 30.0  # Seconds between idle camera checks
+
+# Warm-up run before joining the camera rooms
+WARMUP_FRAME_SHAPES = [(540, 960)]  # (height, width) of decoded frames; 1080p JPEGs decode at 1/2 scale
+WARMUP_ITERATIONS = 2  # Passes per shape
+SOCKETIO_SERVER_URL = os.environ.get('SOCKETIO_SERVER_URL', 'wss://172.28.31.150:3000')  # replay.py points it at a stand-in
 ENABLE_GPU = True
 
+# Observability: Prometheus-style /metrics on localhost, per-frame logs at most once per LOG_INTERVAL
+ENABLE_METRICS = True
+METRICS_PORT = 9101
+LOG_INTERVAL = 5.0  # Seconds between two per-frame log lines of the same camera
+
+# Results are sent by a background thread; only the latest light state per camera is kept while the socket is slow
+OUTBOX_SIZE = 64  # Cameras with a pending update
+
+# Per-camera box around the signal head in normalized (0-1) image coordinates,
+# [[x1, y1], [x2, y2]]. Only this region is run through the model (at a matching
+# smaller input size); cameras not listed use the full frame.
+CAMERA_ROIS = {
+    # 'camera-id': [[0.62, 0.05], [0.78, 0.30]],
+}
+
 # ---------------------------------------------------------------------------- #
 #                         Socketio client configuration                        #
 # ---------------------------------------------------------------------------- #
-sio = socketio.Client(reconnection=True, reconnection_attempts=0, reconnection_delay=1, reconnection_delay_max=3000, ssl_verify=False)
+# Event loop for Socket.IO I/O and scheduling; decoding and inference run on bounded executors
+runtime = ServiceRuntime('traffic light', SOCKETIO_SERVER_URL, reconnect_delay=1, reconnect_delay_max=3)
+sio = runtime.sio
+decode_executor = runtime.executor('decode', max_workers=DECODE_THREADS, max_pending=DECODE_THREADS)
+inference_executor = runtime.executor('inference', max_workers=1)  # One model, one frame at a time
 print(f"Initializing Socket.IO client to connect to {SOCKETIO_SERVER_URL}")
 
 # ---------------------------------------------------------------------------- #
@@ -33,121 +80,198 @@ model = None
 last_frame_time = 0
 MAX_FPS = 30
 
-# Queue for model processing
-model_frame_queue = queue.Queue(maxsize=10)
+frame_log = RateLimitedLog(LOG_INTERVAL)
+rate_limited_frames = 0  # Frames skipped by the MAX_FPS limit in on_image
+decode_busy_frames = 0  # Frames skipped because the decode executor was full
+
+# Metrics (read at scrape time where the value already lives elsewhere)
+stage_latency = REGISTRY.histogram(
+    'yolo_stage_latency_ms', 'Latency of each pipeline stage per camera in milliseconds', ('camera', 'stage'))
+frame_age = REGISTRY.histogram(
+    'yolo_frame_age_ms', 'Skew-corrected time from image event creation to emitted result', ('camera',))
+frames_processed = REGISTRY.counter('yolo_frames_processed_total', 'Frames run through the model per camera', ('camera',))
+
+# Resize buffers, each lent to one frame until it is processed, superseded or expired
+frame_pool = FramePool(max_buffers=32)
+decode_pool = None
+
+def release_frame(frame_data):
+    """Return a frame's buffer (resize buffer or shared-memory slot) once the frame was processed or dropped"""
+    frame_pool.release(frame_data[0])
+    if decode_pool is not None:
+        decode_pool.release(frame_data[0])
+
+# Newest frame per camera for model processing; frame tuples carry created_at at index 3.
+# frames_ready is set (on the loop) whenever a frame is put.
+frames_ready = asyncio.Event()
+model_frame_queue = MailboxGroup(
+    max_age_ms=MAX_FRAME_AGE_MS,
+    timestamp=lambda item: item[3],
+    on_deliver=lambda camera_id, wait_ms, age_ms: stage_latency.observe(wait_ms, camera=camera_id, stage='queue_wait'),
+    on_discard=release_frame
+)
+camera_rois = load_rois(CAMERA_ROIS)
+
+def collect_dropped():
+    dropped = {('all', 'rate_limited'): rate_limited_frames, ('all', 'decode_busy'): decode_busy_frames}
+    for camera_id, mailbox in list(model_frame_queue.mailboxes.items()):
+        s = mailbox.stats()
+        dropped[(camera_id, 'superseded')] = s['superseded']
+        dropped[(camera_id, 'expired')] = s['expired']
+    if decode_pool is not None:
+        s = decode_pool.stats()
+        dropped[('all', 'decode_input_full')] = s['dropped_input']
+        dropped[('all', 'decode_no_slot')] = s['dropped_no_slot']
+        dropped[('all', 'decode_error')] = s['errors']
+    return dropped
+
+def collect_queue_depth():
+    depth = {(camera_id, 'mailbox'): mailbox.qsize() for camera_id, mailbox in list(model_frame_queue.mailboxes.items())}
+    if decode_pool is not None:
+        try:
+            depth[('all', 'decode_input')] = decode_pool.input_queue.qsize()
+        except NotImplementedError:
+            pass
+    return depth
+
+REGISTRY.counter('yolo_frames_dropped_total', 'Frames dropped per camera and reason', ('camera', 'reason'),
+                 collect=collect_dropped)
+REGISTRY.gauge('yolo_queue_depth', 'Items waiting per camera and queue', ('camera', 'queue'), collect=collect_queue_depth)
+REGISTRY.counter('yolo_decode_oversized_total', 'Decoded frames pickled through a queue because they exceed a shared slot',
+                 collect=lambda: {(): decode_pool.stats()['oversized']} if decode_pool is not None else {})
+REGISTRY.gauge('yolo_decode_slots_lent', 'Shared frame slots held by frames not yet processed or dropped',
+               collect=lambda: {(): decode_pool.stats()['slots_lent']} if decode_pool is not None else {})
+emitter = SocketEmitter(runtime.send)
+emitter.register('traffic_light', LATEST, maxsize=OUTBOX_SIZE)
+register_emitter_metrics(REGISTRY, emitter)
+
+REGISTRY.gauge('yolo_startup_phase_seconds', 'Startup wall time per phase (imports, weight load, device move, warm-up)',
+               ('phase',), collect=startup_collector(startup_report))
 
 def get_model_path():
     return MODEL_PATH
 
-def process_frames_thread():
-    """Thread function to process frames with the model in the background"""
-    global running, model
-    
-    print("Starting frame processing thread")
-    
-    while running:
-        try:
-            # Try to get a frame from the model queue, non-blocking
-            try:
-                frame_data = model_frame_queue.get(block=False)
-                if frame_data is None:
-                    time.sleep(0.01)
-                    continue
-            except queue.Empty:
-                time.sleep(0.01)
-                continue
-            
-            frame, cameraId, imageId, created_at = frame_data
-            
-            # Skip processing if model isn't loaded
-            if model is None:
-                time.sleep(0.01)
-                continue
-                
-            # Process the frame with YOLO
-            start_time = time.time()
-            results = model(frame, verbose=False)
-            inference_time = (time.time() - start_time) * 1000  # Convert to milliseconds
-            
-            height, width = frame.shape[:2]
-            
-            # Process detection results
-            detected_signs = []
-            
-            has_detections = False  # Flag to track if any objects were detected
-            
-            for result in results:
-                boxes = result.boxes
-                for box in boxes:
-                    confidence = float(box.conf[0])
-                    cls_id = int(box.cls[0])
-                    
-                    # Check if the detected object meets confidence threshold
-                    if confidence >= CONFIDENCE_THRESHOLD:
-                        has_detections = True
-                        # Get bounding box coordinates
-                        x1, y1, x2, y2 = map(int, box.xyxy[0])
-                        
-                        class_name = model.names[cls_id]
-                        
-                        # Calculate relative coordinates (0-1 range)
-                        rel_x1 = x1 / width
-                        rel_y1 = y1 / height
-                        rel_x2 = x2 / width
-                        rel_y2 = y2 / height
-                        
-                        # Add detection to results
-                        detection_info = {
-                            'class': class_name,
-                            'confidence': float(confidence),
-                            'bbox': {
-                                'x1': float(rel_x1),  # Normalized coordinates (0-1)
-                                'y1': float(rel_y1),
-                                'x2': float(rel_x2),
-                                'y2': float(rel_y2),
-                                'width': float(rel_x2 - rel_x1),
-                                'height': float(rel_y2 - rel_y1)
-                            }
-                        }
-                        
-                        detected_signs.append(detection_info)
-            
-            # Print message whether objects were detected or not
-            if has_detections:
-                print(f"Traffic Sign Detection: {len(detected_signs)} signs detected")
-            else:
-                print("Traffic Sign Detection: No traffic signs detected in this frame")
-            
-            # Prepare response with detection results
-            if len(detected_signs) > 0:
-                max_confidence = max(detected_signs, key=lambda x: x['confidence'])
-                traffic_status = max_confidence['class']
-
-                response = {
-                    'cameraId': cameraId,
-                    'imageId': imageId,
-                    'traffic_status': traffic_status,
-                    'detections': detected_signs,
-                    'inference_time': inference_time,
-                    'image_dimensions': {
-                        'width': width,
-                        'height': height
-                    },
-                    'created_at': created_at,
+def process_frame(frame_data):
+    """Run the model on one frame and emit the detected traffic light state (runs on the inference executor)"""
+    frame, cameraId, imageId, created_at = frame_data
+
+    # Skip processing if model isn't loaded
+    if model is None:
+        return
+
+    # Only the signal head region goes to the model when the camera has one
+    roi = camera_rois.get(cameraId)
+    if roi is not None:
+        model_input, (offset_x, offset_y) = roi.crop(frame)
+    else:
+        model_input, offset_x, offset_y = frame, 0, 0
+
+    # Process the frame with YOLO
+    start_time = time.time()
+    results = model(model_input, imgsz=inference_size(model_input.shape, MODEL_INPUT_SIZE), verbose=False)
+    inference_time = (time.time() - start_time) * 1000  # Convert to milliseconds
+    stage_latency.observe(inference_time, camera=cameraId, stage='inference')
+    frames_processed.inc(camera=cameraId)
+    post_process_start = time.time()
+
+    height, width = frame.shape[:2]
+
+    # Process detection results
+    detected_signs = []
+
+    has_detections = False  # Flag to track if any objects were detected
+
+    for result in results:
+        boxes = result.boxes
+        for box in boxes:
+            confidence = float(box.conf[0])
+            cls_id = int(box.cls[0])
+
+            # Check if the detected object meets confidence threshold
+            if confidence >= CONFIDENCE_THRESHOLD:
+                has_detections = True
+                # Get bounding box coordinates in the full frame
+                x1, y1, x2, y2 = map(int, box.xyxy[0])
+                x1, x2 = x1 + offset_x, x2 + offset_x
+                y1, y2 = y1 + offset_y, y2 + offset_y
+
+                class_name = model.names[cls_id]
+
+                # Calculate relative coordinates (0-1 range)
+                rel_x1 = x1 / width
+                rel_y1 = y1 / height
+                rel_x2 = x2 / width
+                rel_y2 = y2 / height
+
+                # Add detection to results
+                detection_info = {
+                    'class': class_name,
+                    'confidence': float(confidence),
+                    'bbox': {
+                        'x1': float(rel_x1),  # Normalized coordinates (0-1)
+                        'y1': float(rel_y1),
+                        'x2': float(rel_x2),
+                        'y2': float(rel_y2),
+                        'width': float(rel_x2 - rel_x1),
+                        'height': float(rel_y2 - rel_y1)
+                    }
                 }
 
-                # Emit detection results back to the server
-                sio.emit('traffic_light', response)
-                print(f"Detected {len(detected_signs)} traffic signs, inference time: {inference_time:.2f}ms")
-            else:
-                continue
+                detected_signs.append(detection_info)
+
+    # Per-frame summary, at most one line per camera every LOG_INTERVAL
+    frame_log.log('frame_processed', key=cameraId, camera=cameraId, signs=len(detected_signs),
+                  inference_ms=inference_time)
+
+    # Prepare response with detection results
+    if len(detected_signs) > 0:
+        max_confidence = max(detected_signs, key=lambda x: x['confidence'])
+        traffic_status = max_confidence['class']
+
+        response = {
+            'cameraId': cameraId,
+            'imageId': imageId,
+            'traffic_status': traffic_status,
+            'detections': detected_signs,
+            'inference_time': inference_time,
+            'image_dimensions': {
+                'width': width,
+                'height': height
+            },
+            'created_at': created_at,
+        }
+
+        emit_start = time.time()
+        stage_latency.observe((emit_start - post_process_start) * 1000, camera=cameraId, stage='post_process')
 
-                    
-        except Exception as e:
-            print(f"Error in processing thread: {e}")
-            time.sleep(0.1)  # Prevent tight loop if there's an error
+        # Emit detection results back to the server
+        emitter.emit('traffic_light', response, key=cameraId)
+        stage_latency.observe((time.time() - emit_start) * 1000, camera=cameraId, stage='emit')
+        mailbox = model_frame_queue.mailboxes.get(cameraId)
+        if mailbox is not None:  # None once the camera was reclaimed
+            frame_age.observe(mailbox.age_of(created_at), camera=cameraId)
+    else:
+        stage_latency.observe((time.time() - post_process_start) * 1000, camera=cameraId, stage='post_process')
+
+async def process_frames():
+    """Hand the newest frame of each camera, round-robin, to the inference executor"""
+    print("Starting frame processing task")
     
-    print("Frame processing thread stopped")
+    while True:
+        await frames_ready.wait()
+        frames_ready.clear()
+        # Drain every mailbox; frames arriving meanwhile set frames_ready again
+        while True:
+            try:
+                frame_data = model_frame_queue.get(block=False)
+            except queue.Empty:
+                break
+            try:
+                await inference_executor.run(process_frame, frame_data)
+            except Exception as e:
+                print(f"Error in processing task: {e}")
+            finally:
+                release_frame(frame_data)
 
 def load_model():
     global model
@@ -171,10 +295,14 @@ def load_model():
             except Exception as e:
                 print(f"Error checking GPU: {e}. Falling back to CPU.")
 
+        startup_report.mark('device check')
+
         # Load the model with the selected device
         print(f"Loading model on device: {device}")
         model = YOLO(model_path)
+        startup_report.mark('weight load')
         model.to(device)
+        startup_report.mark('device move')
         print(f"Model loaded successfully! Running on: {device}")
         print(f"Available classes: {model.names}")
         
@@ -183,53 +311,47 @@ def load_model():
         print(f"Failed to load model: {e}")
         return False
 
+def warm_up_model():
+    """Run the frame shapes the service will see once before serving"""
+    shapes = warmup_shapes(camera_rois, WARMUP_FRAME_SHAPES)
+    print(f"Warming up model (shapes: {shapes})...")
+    # Frames (or their region crops) are processed one at a time at their inference size, as in process_frame
+    warm_up(lambda frames: model(frames[0], imgsz=inference_size(frames[0].shape, MODEL_INPUT_SIZE), verbose=False),
+            shapes, iterations=WARMUP_ITERATIONS)
+    startup_report.mark('warm-up')
+
 # Socket.IO event handlers
 @sio.event
-def connect():
+async def connect():
     global connected
     connected = True
+    emitter.set_connected(True)
     print(f"Successfully connected to Socket.IO server: {SOCKETIO_SERVER_URL}")
     print("Waiting for 'image' events...")
 
-    sio.emit("join_all_camera")
+    await sio.emit("join_all_camera")
 
 @sio.event
-def connect_error(error):
+async def connect_error(error):
     print(f"Connection error: {error}")
 
 @sio.event
-def disconnect():
+async def disconnect():
     global connected
     connected = False
+    emitter.set_connected(False)
     print("Disconnected from Socket.IO server")
     print("Will attempt to reconnect automatically...")
 
-# Function to handle connection management
-def maintain_connection():
-    global connected, running
-    
-    while running:
-        try:
-            if not connected:
-                try:
-                    print(f"Attempting to connect to Socket.IO server at {SOCKETIO_SERVER_URL}...")
-                    sio.connect(SOCKETIO_SERVER_URL, transports=['websocket'])
-                except Exception as e:
-                    print(f"Failed to connect: {e}")
-                    time.sleep(5)  # Wait before retry
-            time.sleep(1)  # Check connection status periodically
-        except Exception as e:
-            print(f"Connection manager error: {e}")
-            time.sleep(1)
-
 # Image processing function
 @sio.on('image')
-def on_image(data):
-    global last_frame_time
+async def on_image(data):
+    global last_frame_time, rate_limited_frames, decode_busy_frames
     
     # Limit frame processing rate to avoid overload
     current_time = time.time()
     if current_time - last_frame_time < 1.0/MAX_FPS:
+        rate_limited_frames += 1
         return  # Skip this frame to maintain reasonable frame rate
     
     last_frame_time = current_time
@@ -240,84 +362,100 @@ def on_image(data):
     created_at = data['created_at']
     
     try:
-        # Convert image data from buffer to numpy array
-        if isinstance(image, dict) and 'image' in image:
-            # If data is a dictionary with 'image' key
-            image_data = image['image']
-        else:
-            # If data is directly the image buffer
-            image_data = image
-        
-        # Convert the received image data to numpy array
-        if isinstance(image_data, str):
-            # If it's a base64 encoded string
-            image_bytes = base64.b64decode(image_data)
-        else:
-            # If it's already a binary
-            image_bytes = image_data
-        
-        # Convert bytes to image
-        try:
-            image = Image.open(io.BytesIO(image_bytes))
-            # Convert PIL image to OpenCV format (RGB to BGR)
-            frame = np.array(image)
-            frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-        except Exception as e:
-            print(f"Error decoding image: {e}")
+        # Hand the encoded buffer to the decode workers so decoding never holds this process's GIL
+        if decode_pool is not None:
+            decode_pool.submit(cameraId, imageId, image, created_at)
             return
-        
-        # Get frame dimensions
-        height, width = frame.shape[:2]
-        
-        # Resize the frame if it's too large to save memory
-        max_dimension = 1280  # Maximum dimension to process
-        if width > max_dimension or height > max_dimension:
-            scale = max_dimension / max(width, height)
-            frame = cv2.resize(frame, (int(width * scale), int(height * scale)))
-        
-        # Add the frame to the model processing queue
-        try:
-            model_frame_queue.put((frame.copy(), cameraId, imageId, created_at), block=False)
-        except queue.Full:
-            # If model queue is full, just discard this frame for processing
-            pass
+
+        # Decoding is behind; the mailbox would only keep the newest frame anyway
+        if decode_executor.full():
+            decode_busy_frames += 1
+            return
+        await decode_executor.run(decode_and_enqueue, cameraId, imageId, image, created_at)
     
     except Exception as e:
         print(f"Error processing image: {e}")
 
-def main():
+def decode_and_enqueue(cameraId, imageId, image, created_at):
+    """Decode on the decode executor and queue the frame (used when the decode worker processes are disabled)"""
+    # Decode straight to BGR, reduced in the DCT domain and capped at MAX_FRAME_DIMENSION
+    try:
+        decode_start = time.time()
+        frame = decode_frame(image, target_size=MODEL_INPUT_SIZE, max_dimension=MAX_FRAME_DIMENSION, pool=frame_pool)
+    except Exception as e:
+        print(f"Error decoding image: {e}")
+        return
+    stage_latency.observe((time.time() - decode_start) * 1000, camera=cameraId, stage='decode')
+    
+    enqueue_frame(cameraId, imageId, frame, created_at)
+
+def enqueue_frame(cameraId, imageId, frame, created_at):
+    """Replace any unprocessed frame from this camera with the newest one (from any thread)"""
+    model_frame_queue.put(cameraId, (frame, cameraId, imageId, created_at))
+    runtime.call_soon(frames_ready.set)
+
+def reclaim_idle_cameras():
+    """Release the mailboxes and per-camera metrics of cameras without an image for CAMERA_IDLE_TIMEOUT"""
+    for camera_id in model_frame_queue.reap(CAMERA_IDLE_TIMEOUT):
+        frame_log.forget(camera_id)
+        REGISTRY.forget('camera', camera_id)
+        print(f"[Camera {camera_id}] No images for {CAMERA_IDLE_TIMEOUT:.0f}s, mailbox and state released")
+
+def print_stats():
+    print_mailbox_stats(model_frame_queue.mailboxes)
+    print_emitter_stats(emitter)
+
+def shutdown():
+    """Stop the worker threads and processes (runtime shutdown hook, the loop can still send)"""
     global running
+    running = False
+    emitter.stop()
+    if decode_pool is not None:
+        decode_pool.stop()
+
+def main():
+    global running, decode_pool
+    
+    # Start decode workers first, before the model and its threads exist
+    if ENABLE_DECODE_POOL:
+        decode_pool = DecodePool(
+            workers=DECODE_WORKERS,
+            slots=DECODE_SLOTS,
+            target_size=MODEL_INPUT_SIZE,
+            max_dimension=MAX_FRAME_DIMENSION,
+            on_decode=lambda camera_id, decode_ms: stage_latency.observe(decode_ms, camera=camera_id, stage='decode')
+        )
+        decode_pool.start()
+        start_forwarder(decode_pool, enqueue_frame, lambda: running)
+        startup_report.mark('decode workers')
     
     # Load YOLO model
     if not load_model():
         print("Failed to load model. Exiting...")
+        if decode_pool is not None:
+            decode_pool.stop()
         return
     
-    # Start connection manager thread
-    connection_thread = threading.Thread(target=maintain_connection, daemon=True)
-    connection_thread.start()
-    print("Connection manager started")
+    # Pay lazy initialization now rather than on the first frame
+    warm_up_model()
+    startup_report.print()
     
-    # Start processing thread
-    processing_thread = threading.Thread(target=process_frames_thread, daemon=True)
-    processing_thread.start()
-    print("Processing thread started")
+    if ENABLE_METRICS:
+        try:
+            start_metrics_server(METRICS_PORT)
+        except OSError as e:
+            print(f"Could not start metrics endpoint on port {METRICS_PORT}: {e}")
     
-    # Keep the main thread running
-    try:
-        while running:
-            time.sleep(0.1)
-    except KeyboardInterrupt:
-        print("Interrupted by user. Shutting down...")
-    finally:
-        running = False
-        if sio.connected:
-            sio.disconnect()
-        
-        # Wait for thread to finish
-        processing_thread.join(timeout=2)
-        
-        print("Application stopped.")
+    emitter.start()
+    
+    # Connection, reconnects, frame scheduling and statistics all run on the runtime's event loop
+    runtime.task(process_frames)
+    runtime.every(MAILBOX_STATS_INTERVAL, print_stats)
+    if CAMERA_IDLE_TIMEOUT:
+        runtime.every(CAMERA_REAP_INTERVAL, reclaim_idle_cameras)
+    runtime.on_shutdown(shutdown)
+    runtime.run()
+    print("Application stopped.")
 
 if __name__ == "__main__":
     main()
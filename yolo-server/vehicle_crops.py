@@ -0,0 +1,156 @@
+"""Per-vehicle JPEG crops cut from decoded frames.
+
+CropEmitter takes the tracked vehicles of a frame, keeps at most one crop per
+track every `interval` ms of frame time, copies the (small) crop regions out of
+the frame on the calling thread and leaves resizing and JPEG encoding to a
+thread pool (cv2 releases the GIL for both). Each finished crop is passed to
+emit_fn as one dict whose 'image_data' holds the JPEG bytes, the field
+license_plate.detect_license_plate_from_car_event reads. No service consumes
+the emitted crops yet, so server.py leaves cropping disabled by default.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+
+def fit_size(width, height, max_size):
+    """Dimensions scaled down (never up) so the longer side is at most max_size"""
+    scale = min(1.0, max_size / float(max(width, height)))
+    return max(1, int(round(width * scale))), max(1, int(round(height * scale)))
+
+
+def encode_crop(crop, max_size, quality):
+    """Resize a BGR crop to fit max_size and encode it as JPEG bytes"""
+    height, width = crop.shape[:2]
+    size = fit_size(width, height, max_size)
+    if size != (width, height):
+        crop = cv2.resize(crop, size, interpolation=cv2.INTER_AREA)
+    ok, encoded = cv2.imencode('.jpg', crop, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+    if not ok:
+        raise ValueError("Failed to encode vehicle crop")
+    return encoded.tobytes()
+
+
+class CropEmitter:
+    """Rate-limited, background-encoded vehicle crops
+
+    Args:
+        emit_fn: Called as emit_fn(crop_dict) from a pool thread for each encoded crop
+        interval_ms: Minimum frame time between two crops of the same track
+        quality: JPEG quality (0-100)
+        max_size: Longer side of emitted crops in pixels
+        min_size: Boxes smaller than this on either side are skipped
+        padding: Fraction of the box size added around each side of the crop
+        workers: Encoder threads
+        max_pending: Crops waiting to be encoded before new ones are dropped
+    """
+
+    def __init__(self, emit_fn, interval_ms=1000, quality=85, max_size=300, min_size=24, padding=0.05,
+                 workers=2, max_pending=32):
+        self.emit_fn = emit_fn
+        self.interval_ms = interval_ms
+        self.quality = quality
+        self.max_size = max_size
+        self.min_size = min_size
+        self.padding = padding
+        self.max_pending = max_pending
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='crop')
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.emitted = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def select(self, last_crop_times, boxes, track_ids, created_at):
+        """Indices of vehicles due for a crop, updating last_crop_times (track_id -> created_at)"""
+        sizes = boxes[:, 2:] - boxes[:, :2]
+        large_enough = (sizes >= self.min_size).all(axis=1)
+        due = []
+        for index in np.flatnonzero(large_enough).tolist():
+            track_id = int(track_ids[index])
+            last = last_crop_times.get(track_id)
+            if last is not None and created_at - last < self.interval_ms:
+                continue
+            last_crop_times[track_id] = created_at
+            due.append(index)
+        return due
+
+    def submit(self, last_crop_times, frame, boxes, track_ids, class_ids, confidences, class_names, meta):
+        """Queue crops of the vehicles in a frame that are due for one
+
+        Args:
+            last_crop_times: The camera's track_id -> created_at of its last crop
+            frame: Decoded BGR frame the boxes refer to
+            boxes, track_ids, class_ids, confidences: Per-vehicle arrays for this frame
+            class_names: Class id -> name
+            meta: Dict of camera_id, image_id, created_at copied into every crop
+
+        Returns:
+            Number of crops queued
+        """
+        if track_ids is None or len(boxes) == 0:
+            return 0
+        height, width = frame.shape[:2]
+        due = self.select(last_crop_times, boxes, track_ids, meta['created_at'])
+        if not due:
+            return 0
+
+        # Padded boxes clipped to the frame, computed for all due vehicles at once
+        selected = boxes[due].astype(np.float64)
+        pad = (selected[:, 2:] - selected[:, :2]) * self.padding
+        padded = np.hstack([selected[:, :2] - pad, selected[:, 2:] + pad])
+        padded = np.clip(np.rint(padded), 0, [width, height, width, height]).astype(np.int64)
+
+        queued = 0
+        for index, (x1, y1, x2, y2) in zip(due, padded.tolist()):
+            with self.lock:
+                if self.pending >= self.max_pending:
+                    self.dropped += 1
+                    continue
+                self.pending += 1
+            # Copy only the crop so the frame can be released before encoding
+            crop = frame[y1:y2, x1:x2].copy()
+            info = dict(meta)
+            info.update({
+                'track_id': int(track_ids[index]),
+                'class': class_names[int(class_ids[index])],
+                'confidence': float(confidences[index]),
+                'bbox': {
+                    'x1': x1 / width,  # Normalized coordinates (0-1) of the padded crop
+                    'y1': y1 / height,
+                    'x2': x2 / width,
+                    'y2': y2 / height
+                }
+            })
+            self.executor.submit(self._encode_and_emit, crop, info)
+            queued += 1
+        return queued
+
+    def _encode_and_emit(self, crop, info):
+        try:
+            info['image_data'] = encode_crop(crop, self.max_size, self.quality)
+            info['crop_width'], info['crop_height'] = fit_size(crop.shape[1], crop.shape[0], self.max_size)
+            self.emit_fn(info)
+            with self.lock:
+                self.emitted += 1
+        except Exception as e:
+            with self.lock:
+                self.errors += 1
+            print(f"[CropEmitter] Error emitting crop for track {info.get('track_id')}: {e}")
+        finally:
+            with self.lock:
+                self.pending -= 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                'emitted': self.emitted,
+                'dropped': self.dropped,
+                'errors': self.errors,
+                'pending': self.pending,
+            }
+
+    def stop(self, wait=True):
+        self.executor.shutdown(wait=wait)
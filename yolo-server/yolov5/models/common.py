@@ -10,6 +10,7 @@ import warnings
 import zipfile
 from collections import OrderedDict, namedtuple
 from copy import copy
+from functools import cached_property
 from pathlib import Path
 from urllib.parse import urlparse
 
@@ -823,6 +824,7 @@ class AutoShape(nn.Module):
     classes = None  # (optional list) filter by class, i.e. = [0, 15, 16] for COCO persons, cats and dogs
     max_det = 1000  # maximum number of detections per image
     amp = False  # Automatic Mixed Precision (AMP) inference
+    minimal = False  # return per-image (N, 6) numpy predictions instead of a Detections object (inference loops)
 
     def __init__(self, model, verbose=True):
         """Initializes YOLOv5 model for inference, setting up attributes and preparing model for evaluation."""
@@ -889,7 +891,8 @@ class AutoShape(nn.Module):
                     im = np.asarray(exif_transpose(im))
                 elif isinstance(im, Image.Image):  # PIL Image
                     im, f = np.asarray(exif_transpose(im)), getattr(im, "filename", f) or f
-                files.append(Path(f).with_suffix(".jpg").name)
+                if not self.minimal:
+                    files.append(Path(f).with_suffix(".jpg").name)
                 if im.shape[0] < 5:  # image in CHW
                     im = im.transpose((1, 2, 0))  # reverse dataloader .transpose(2, 0, 1)
                 im = im[..., :3] if im.ndim == 3 else cv2.cvtColor(im, cv2.COLOR_GRAY2BGR)  # enforce 3ch input
@@ -922,30 +925,62 @@ class AutoShape(nn.Module):
                 for i in range(n):
                     scale_boxes(shape1, y[i][:, :4], shape0[i])
 
+            if self.minimal:  # one device-to-host copy for the batch, no Detections bookkeeping
+                return np.split(torch.cat(y).float().cpu().numpy(), np.cumsum([len(p) for p in y[:-1]]))
             return Detections(ims, y, files, dt, self.names, x.shape)
 
 
 class Detections:
     """Manages YOLOv5 detection results with methods for visualization, saving, cropping, and exporting detections."""
 
-    def __init__(self, ims, pred, files, times=(0, 0, 0), names=None, shape=None):
-        """Initializes the YOLOv5 Detections class with image info, predictions, filenames, timing and normalization."""
+    def __init__(self, ims, pred, files=None, times=(0, 0, 0), names=None, shape=None):
+        """
+        Initializes the YOLOv5 Detections class with image info, predictions, filenames and timing.
+
+        xywh, xyxyn, xywhn, their normalizations, default filenames (files=None) and timestamps are computed on first
+        access and cached.
+        """
         super().__init__()
-        d = pred[0].device  # device
-        gn = [torch.tensor([*(im.shape[i] for i in [1, 0, 1, 0]), 1, 1], device=d) for im in ims]  # normalizations
         self.ims = ims  # list of images as numpy arrays
         self.pred = pred  # list of tensors pred[0] = (xyxy, conf, cls)
         self.names = names  # class names
-        self.files = files  # image filenames
+        self._files = files  # image filenames, None for image0.jpg, image1.jpg, ...
         self.times = times  # profiling times
         self.xyxy = pred  # xyxy pixels
-        self.xywh = [xyxy2xywh(x) for x in pred]  # xywh pixels
-        self.xyxyn = [x / g for x, g in zip(self.xyxy, gn)]  # xyxy normalized
-        self.xywhn = [x / g for x, g in zip(self.xywh, gn)]  # xywh normalized
         self.n = len(self.pred)  # number of images (batch size)
-        self.t = tuple(x.t / self.n * 1e3 for x in times)  # timestamps (ms)
         self.s = tuple(shape)  # inference BCHW shape
 
+    @cached_property
+    def files(self):
+        """Image filenames."""
+        return self._files if self._files is not None else [f"image{i}.jpg" for i in range(self.n)]
+
+    @cached_property
+    def t(self):
+        """Per-image pre-process, inference and NMS timestamps (ms)."""
+        return tuple(x.t / self.n * 1e3 for x in self.times)
+
+    @cached_property
+    def gn(self):
+        """Per-image normalization gains (w, h, w, h, 1, 1)."""
+        d = self.pred[0].device  # device
+        return [torch.tensor([*(im.shape[i] for i in [1, 0, 1, 0]), 1, 1], device=d) for im in self.ims]
+
+    @cached_property
+    def xywh(self):
+        """xywh pixels."""
+        return [xyxy2xywh(x) for x in self.pred]
+
+    @cached_property
+    def xyxyn(self):
+        """xyxy normalized."""
+        return [x / g for x, g in zip(self.xyxy, self.gn)]
+
+    @cached_property
+    def xywhn(self):
+        """xywh normalized."""
+        return [x / g for x, g in zip(self.xywh, self.gn)]
+
     def _run(self, pprint=False, show=False, save=False, crop=False, render=False, labels=True, save_dir=Path("")):
         """Executes model predictions, displaying and/or saving outputs with optional crops and labels."""
         s, crops = "", []
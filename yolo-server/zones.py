@@ -0,0 +1,297 @@
+"""Counting lines and polygon zones evaluated for all tracks at once.
+
+Geometry is in normalized (0-1) image coordinates, so zones stay valid when a
+camera's frames are decoded at a different scale. A CountingLine runs from
+`start` to `end`; a track crossing it from the left of that direction to the
+right (seen in image coordinates, y pointing down) is a +1 crossing, the other
+way is -1. For a line drawn left to right, +1 is "down" and -1 is "up", the same
+convention the single counting line used. A PolygonZone reports which tracks are
+inside it and which entered or left it in the current frame.
+
+ZoneEngine does the geometry: every movement segment against every line is one
+broadcast orientation test, and every point against every polygon edge is one
+broadcast ray-casting test, so a frame costs a handful of NumPy operations
+regardless of how many zones and tracks there are. CameraZones adds the
+per-camera state on top (what has been counted, who is inside what).
+"""
+import numpy as np
+
+from state_store import TTLStore
+
+DIRECTIONS = {'both': (1, -1), 'forward': (1,), 'backward': (-1,)}
+
+
+class CountingLine:
+    """Directed counting line
+
+    Args:
+        name: Key the line's counts are reported under
+        start, end: (x, y) endpoints in normalized coordinates
+        directions: 'both', 'forward' (+1 only) or 'backward' (-1 only)
+    """
+
+    def __init__(self, name, start, end, directions='both'):
+        if directions not in DIRECTIONS:
+            raise ValueError(f"Unknown line directions '{directions}' for line '{name}'")
+        self.name = name
+        self.start = (float(start[0]), float(start[1]))
+        self.end = (float(end[0]), float(end[1]))
+        self.directions = directions
+
+
+class PolygonZone:
+    """Closed polygon zone
+
+    Args:
+        name: Key the zone's occupancy is reported under
+        points: Three or more (x, y) vertices in normalized coordinates
+    """
+
+    def __init__(self, name, points):
+        if len(points) < 3:
+            raise ValueError(f"Polygon zone '{name}' needs at least 3 points")
+        self.name = name
+        self.points = [(float(x), float(y)) for x, y in points]
+
+
+def parse_zones(specs):
+    """Build (lines, polygons) from config dicts
+
+    Each spec is {'type': 'line', 'name', 'points': [start, end], 'directions'} or
+    {'type': 'polygon', 'name', 'points': [...]}.
+    """
+    lines, polygons = [], []
+    for index, spec in enumerate(specs):
+        kind = spec.get('type', 'line')
+        name = spec.get('name', f'{kind}_{index}')
+        if kind == 'line':
+            start, end = spec['points']
+            lines.append(CountingLine(name, start, end, spec.get('directions', 'both')))
+        elif kind == 'polygon':
+            polygons.append(PolygonZone(name, spec['points']))
+        else:
+            raise ValueError(f"Unknown zone type '{kind}'")
+    return lines, polygons
+
+
+def horizontal_line(name, y):
+    """Full-width line at normalized height y, drawn left to right (+1 is downward)"""
+    return CountingLine(name, (0.0, y), (1.0, y))
+
+
+def cross(ax, ay, bx, by):
+    return ax * by - ay * bx
+
+
+class ZoneEngine:
+    """Vectorized crossing and containment tests for a fixed set of lines and polygons"""
+
+    def __init__(self, lines=(), polygons=()):
+        self.lines = list(lines)
+        self.polygons = list(polygons)
+
+        # Lines as (L,) arrays of endpoints and direction vectors
+        if self.lines:
+            ends = np.array([line.start + line.end for line in self.lines], dtype=np.float64)
+        else:
+            ends = np.zeros((0, 4))
+        self.line_start = ends[:, :2]
+        self.line_vector = ends[:, 2:] - ends[:, :2]
+        allowed = np.zeros((len(self.lines), 2), dtype=bool)  # columns: +1 allowed, -1 allowed
+        for i, line in enumerate(self.lines):
+            allowed[i, 0] = 1 in DIRECTIONS[line.directions]
+            allowed[i, 1] = -1 in DIRECTIONS[line.directions]
+        self.line_allowed = allowed
+
+        # Polygon edges padded to the largest vertex count; padding edges are masked out
+        vertices = max((len(polygon.points) for polygon in self.polygons), default=0)
+        self.edge_start = np.zeros((len(self.polygons), vertices, 2))
+        self.edge_end = np.zeros((len(self.polygons), vertices, 2))
+        self.edge_valid = np.zeros((len(self.polygons), vertices), dtype=bool)
+        for i, polygon in enumerate(self.polygons):
+            points = np.array(polygon.points)
+            count = len(points)
+            self.edge_start[i, :count] = points
+            self.edge_end[i, :count] = np.roll(points, -1, axis=0)
+            self.edge_valid[i, :count] = True
+
+    def crossings(self, prev_points, curr_points):
+        """Direction of each movement crossing each line
+
+        Args:
+            prev_points, curr_points: (N, 2) normalized positions; rows of prev_points
+                containing NaN (no previous position) never cross
+
+        Returns:
+            (N, L) int8 array of +1, -1 or 0, with disallowed directions zeroed
+        """
+        n, count = len(curr_points), len(self.lines)
+        if n == 0 or count == 0:
+            return np.zeros((n, count), dtype=np.int8)
+        prev = prev_points[:, None, :]
+        curr = curr_points[:, None, :]
+        start = self.line_start[None, :, :]
+        vector = self.line_vector[None, :, :]
+
+        # Side of the (infinite) line each endpoint of the movement is on
+        side_prev = cross(vector[..., 0], vector[..., 1], prev[..., 0] - start[..., 0], prev[..., 1] - start[..., 1])
+        side_curr = cross(vector[..., 0], vector[..., 1], curr[..., 0] - start[..., 0], curr[..., 1] - start[..., 1])
+        forward = (side_prev <= 0) & (side_curr > 0)
+        backward = (side_prev >= 0) & (side_curr < 0)
+
+        # The movement must also pass between the line's endpoints
+        move_x = curr[..., 0] - prev[..., 0]
+        move_y = curr[..., 1] - prev[..., 1]
+        o_start = cross(move_x, move_y, start[..., 0] - prev[..., 0], start[..., 1] - prev[..., 1])
+        o_end = cross(move_x, move_y, start[..., 0] + vector[..., 0] - prev[..., 0],
+                      start[..., 1] + vector[..., 1] - prev[..., 1])
+        within = o_start * o_end <= 0
+
+        direction = np.zeros((n, count), dtype=np.int8)
+        direction[forward & within & self.line_allowed[None, :, 0]] = 1
+        direction[backward & within & self.line_allowed[None, :, 1]] = -1
+        return direction
+
+    def line_distances(self, points):
+        """(N, L) distance of each point to each line segment, in normalized units"""
+        n, count = len(points), len(self.lines)
+        if n == 0 or count == 0:
+            return np.zeros((n, count))
+        offset = points[:, None, :] - self.line_start[None, :, :]
+        length_sq = np.maximum((self.line_vector ** 2).sum(axis=1), 1e-12)
+        t = np.clip((offset * self.line_vector[None]).sum(axis=2) / length_sq[None], 0.0, 1.0)
+        return np.linalg.norm(offset - t[..., None] * self.line_vector[None], axis=2)
+
+    def contains(self, points):
+        """(N, P) bool array: whether each point lies inside each polygon (even-odd rule)"""
+        n, count = len(points), len(self.polygons)
+        if n == 0 or count == 0:
+            return np.zeros((n, count), dtype=bool)
+        px = points[:, 0][:, None, None]
+        py = points[:, 1][:, None, None]
+        x1, y1 = self.edge_start[None, ..., 0], self.edge_start[None, ..., 1]
+        x2, y2 = self.edge_end[None, ..., 0], self.edge_end[None, ..., 1]
+
+        straddles = (y1 > py) != (y2 > py)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x_at_py = x1 + (py - y1) * (x2 - x1) / (y2 - y1)
+        hits = straddles & (px < x_at_py) & self.edge_valid[None]
+        return (hits.sum(axis=2) % 2).astype(bool)
+
+
+class CameraZones:
+    """Per-camera counting and occupancy state on top of a ZoneEngine
+
+    Args:
+        lines, polygons: The camera's CountingLines and PolygonZones
+        class_names: Vehicle class names counted per line and zone
+        counted_ttl_ms: Frame time after which a counted crossing is forgotten (None: only by forget())
+        max_counted: Counted crossings remembered at most
+    """
+
+    def __init__(self, lines, polygons, class_names, counted_ttl_ms=None, max_counted=4096):
+        self.engine = ZoneEngine(lines, polygons)
+        self.class_names = list(class_names)
+        self.line_counts = {
+            line.name: {'up': 0, 'down': 0,
+                        'by_type_up': {name: 0 for name in self.class_names},
+                        'by_type_down': {name: 0 for name in self.class_names}}
+            for line in self.engine.lines
+        }
+        # (track_id, line index, direction) already counted -> created_at of the crossing
+        self.counted = TTLStore(counted_ttl_ms, max_counted)
+        self.inside = {}  # track_id -> (P,) bool containment in the previous frame
+
+    @property
+    def lines(self):
+        return self.engine.lines
+
+    @property
+    def polygons(self):
+        return self.engine.polygons
+
+    def update(self, track_ids, prev_points, curr_points, track_classes, now=0.0, predicted=False):
+        """Evaluate one frame
+
+        Args:
+            track_ids: (N,) ids of the tracks in this frame
+            prev_points: (N, 2) previous normalized positions (NaN where unknown)
+            curr_points: (N, 2) current normalized positions
+            track_classes: N class names
+            now: Frame time (ms) the crossings are remembered from
+            predicted: The positions are tracker predictions, not detections: occupancy is reported,
+                but no crossings are counted and no zone is entered or exited
+
+        Returns:
+            new_crossings: List of (track_id, direction, line name, class name) counted this frame
+            zones: Dict of polygon name -> {'occupancy', 'by_type', 'entered', 'exited'}
+        """
+        if predicted:
+            direction = np.zeros((len(track_ids), len(self.engine.lines)), dtype=np.int8)
+        else:
+            direction = self.engine.crossings(prev_points, curr_points)
+        new_crossings = []
+        for row, col in zip(*np.nonzero(direction)):
+            track_id = int(track_ids[row])
+            crossing_direction = int(direction[row, col])
+            key = (track_id, int(col), crossing_direction)
+            if key in self.counted:
+                continue
+            self.counted[key] = now
+            line = self.engine.lines[col]
+            counts = self.line_counts[line.name]
+            side = 'down' if crossing_direction == 1 else 'up'
+            counts[side] += 1
+            vehicle_type = track_classes[row]
+            if vehicle_type in counts['by_type_' + side]:
+                counts['by_type_' + side][vehicle_type] += 1
+            new_crossings.append((track_id, crossing_direction, line.name, vehicle_type))
+
+        inside = self.engine.contains(curr_points)
+        zones = {}
+        if self.engine.polygons:
+            empty = np.zeros(len(self.engine.polygons), dtype=bool)
+            prev_inside = np.array([self.inside.get(int(t), empty) for t in track_ids]).reshape(inside.shape)
+            if predicted:
+                prev_inside = inside
+            entered = inside & ~prev_inside
+            exited = prev_inside & ~inside
+            for col, polygon in enumerate(self.engine.polygons):
+                rows = np.flatnonzero(inside[:, col])
+                by_type = {name: 0 for name in self.class_names}
+                for row in rows.tolist():
+                    if track_classes[row] in by_type:
+                        by_type[track_classes[row]] += 1
+                zones[polygon.name] = {
+                    'occupancy': len(rows),
+                    'by_type': by_type,
+                    'entered': [int(t) for t in track_ids[entered[:, col]]],
+                    'exited': [int(t) for t in track_ids[exited[:, col]]],
+                }
+            if not predicted:
+                for track_id, row in zip(track_ids.tolist(), inside):
+                    self.inside[track_id] = row
+        return new_crossings, zones
+
+    def forget(self, is_live):
+        """Drop state of tracks for which is_live(track_id) is False"""
+        self.counted.remove_if(lambda key: not is_live(key[0]))
+        for track_id in [t for t in self.inside if not is_live(t)]:
+            del self.inside[track_id]
+
+    def expire(self, now):
+        """Forget counted crossings older than the TTL (frame time, ms)"""
+        return self.counted.expire(now)
+
+    def totals(self):
+        """Crossings summed over all lines: (total_up, total_down, by_type_up, by_type_down)"""
+        by_type_up = {name: 0 for name in self.class_names}
+        by_type_down = {name: 0 for name in self.class_names}
+        total_up = total_down = 0
+        for counts in self.line_counts.values():
+            total_up += counts['up']
+            total_down += counts['down']
+            for name in self.class_names:
+                by_type_up[name] += counts['by_type_up'][name]
+                by_type_down[name] += counts['by_type_down'][name]
+        return total_up, total_down, by_type_up, by_type_down